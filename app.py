@@ -1,17 +1,20 @@
 import streamlit as st
 import streamlit_authenticator as stauth
 import os
-from google.cloud import bigquery
-import pandas as pd
-import pandas_gbq
+import copy
+import logging
 import datetime
+from dateutil.relativedelta import relativedelta
+from functools import partial
 import yaml
 from yaml.loader import SafeLoader
-from utils import connect_bigquery
-from queries import query_estoque, query_inadimplencia, query_contatos
-from pages import PageManager, Relatorio_Estoque_Page, Relatorio_Inadimplencia_Page, Relatorio_Contatos_Page, Relatorio_ContatosAgregados_Page, Relatorio_Vendas_Page
-from dateutil.relativedelta import relativedelta
-from utils import transform_df_estoque, transform_df_inadimplencia, transform_df_contatos, transform_df_contatosagregados, transform_df_comissao, transform_df_comissao_agregado, transform_df_vendas
+from utils import connect_bigquery, commission_of_month
+from ingestion import SCHEMA_VERSION
+from datasets import DiskSnapshotCache
+from prewarm import build_dataset_store, attach_dataset_store
+from indexes import seller_frame, contact_totals_of, commission_cube_of
+from summaries import summary_of, card_windows
+from pages import PageManager, Relatorio_Estoque_Page, Relatorio_Inadimplencia_Page, Relatorio_Contatos_Page, Relatorio_ContatosAgregados_Page, Relatorio_Comissao_Page, Relatorio_ComissaoAgregados_Page, Relatorio_Vendas_Page, Relatorio_Desempenho_Page
 
 
 
@@ -21,14 +24,29 @@ thirty_days_ago = today - datetime.timedelta(days=30)
 six_months_ago = today - datetime.timedelta(days=180)
 first_day_of_current_month = today.replace(day=1)
 last_day_of_previous_month = first_day_of_current_month - datetime.timedelta(days=1)
+# Primeiro mês da janela do relatório de comissão agregado
+first_day_six_months_ago = first_day_of_current_month - relativedelta(months=6)
 
 project_id = 'manchester-ai'
 
-with open('config.yaml') as file:
-    config = yaml.load(file, Loader=SafeLoader)
+# Logs estruturados das medições (metrics) e das atualizações dos datasets no stdout do container
+logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s %(message)s')
+for logger_name in ('metrics', 'datasets'):
+    logging.getLogger(logger_name).setLevel(logging.INFO)
+
+# O config.yaml é lido uma vez por processo (de novo só se o arquivo mudar). O Authenticate
+# continua sendo criado a cada execução: ele guarda o estado do login na sessão e lê os cookies
+# do navegador de quem está acessando, então não pode ser compartilhado entre as sessões
+@st.cache_resource
+def load_config(path, modified):
+    with open(path) as file:
+        return yaml.load(file, Loader=SafeLoader)
+
+config = load_config('config.yaml', os.path.getmtime('config.yaml'))
 
 authenticator = stauth.Authenticate(
-    credentials=config['credentials'],
+    # Cópia por execução: o autenticador anota tentativas e logins nas credenciais
+    credentials=copy.deepcopy(config['credentials']),
     cookie_name=config['cookie']['name'],
     cookie_key=config['cookie']['key'],
     cookie_expiry_days=config['cookie']['expiry_days'],
@@ -37,18 +55,19 @@ authenticator = stauth.Authenticate(
 
 name, authentication_status, username = authenticator.login()
 
-# Funções com cache para evitar consultas repetidas
-@st.cache_data(ttl=600)
-def get_estoque_data():
-    return pandas_gbq.read_gbq(query_estoque, project_id=project_id)
-
-@st.cache_data(ttl=600)
-def get_inadimplencia_data():
-    return pandas_gbq.read_gbq(query_inadimplencia, project_id=project_id)
+# Cliente BigQuery único do processo, criado só na primeira consulta do store
+@st.cache_resource
+def get_bigquery_client():
+    return connect_bigquery()
 
-@st.cache_data(ttl=600)
-def get_contatos_data():
-    return pandas_gbq.read_gbq(query_contatos, project_id=project_id)
+# Store de datasets do processo (prewarm.py); com DATASET_MODE=worker, só lê as versões publicadas
+@st.cache_resource
+def get_dataset_store():
+    directory = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+    if os.environ.get('DATASET_MODE') == 'worker':
+        return attach_dataset_store(directory)
+    disk_cache = DiskSnapshotCache(directory, schema_version=SCHEMA_VERSION)
+    return build_dataset_store(get_bigquery_client(), disk_cache=disk_cache, ttl=600)
 
 # Inicializa o estado da página, caso não esteja definido
 if 'selected_page' not in st.session_state:
@@ -63,10 +82,10 @@ def pagina_inicial(page_manager):
     cols = st.columns(3)  # Três colunas para distribuir os cards
 
     # Lista de relatórios
-    for i, (page_name, page_obj) in enumerate(page_manager.pages.items()):
+    for i, page_name in enumerate(page_manager.pages):
         with cols[i % 3]:  # Alterna entre as três colunas
             st.markdown(f"### {page_name}")
-            st.write(page_obj.get_description())
+            st.write(page_manager.get_description(page_name))
             # Botão que utiliza o callback `set_page` para atualizar `selected_page`
             st.button(f"Abrir {page_name}", on_click=set_page, args=(page_name,), key=page_name)
 
@@ -78,34 +97,70 @@ if authentication_status:
     st.sidebar.write(f"Bem-vindo(a), {name}!")
     
     authenticator.logout(location='sidebar')
-    # Conexão com BigQuery
-    cliente = connect_bigquery()
     
-    # Recuperando dados com cache
-    df_contatos = get_contatos_data()
+    # Recuperando dados do store compartilhado (sem cópia); vendedores recebem só a própria
+    # carteira, recortada pelo índice por vendedor de cada versão
+    dataset_store = get_dataset_store()
+    # Na carga a frio as quatro tabelas são consultadas ao mesmo tempo
+    app_datasets = ('contatos', 'estoque', 'inadimplencia', 'comissao')
+    dataset_store.warm(app_datasets)
+    contatos_snapshot = dataset_store.snapshot('contatos')
+    df_contatos = seller_frame(contatos_snapshot, 'contatos', name)
     
     # df_estoque = (
     # get_estoque_data()
     # .pipe(transform_df_estoque, start_date=thirty_days_ago, end_date=today, name=name))
     
-    df_estoque = get_estoque_data()
+    estoque_snapshot = dataset_store.snapshot('estoque')
+    df_estoque = seller_frame(estoque_snapshot, 'estoque', name)
+    
     
+    inadimplencia_snapshot = dataset_store.snapshot('inadimplencia')
+    df_inadimplencia = seller_frame(inadimplencia_snapshot, 'inadimplencia', name)
     
-    df_inadimplencia = get_inadimplencia_data()
     
+    comissao_snapshot = dataset_store.snapshot('comissao')
+    df_comissao = seller_frame(comissao_snapshot, 'comissao', name)
     
     # df_inadimplencia = (
     # get_inadimplencia_data()
     # .pipe(transform_df_inadimplencia, start_date=six_months_ago, end_date=last_day_of_previous_month, name=name))
     
-    # Criação e gerenciamento de páginas
-    page_manager = PageManager(thirty_days_ago, today, name)
+    # Janelas dos cards, as mesmas das tabelas de resumo montadas pelo prewarm.py
+    windows = card_windows(today)
+
+    # Criação e gerenciamento de páginas. A página selecionada é desenhada em um fragmento:
+    # mudar um filtro não reexecuta este script; só uma versão nova dos datasets (conferida
+    # pelo fragmento) ou a navegação entre páginas passam por aqui de novo
+    page_manager = PageManager(thirty_days_ago, today, name,
+                               data_versions=lambda: tuple(dataset_store.snapshot(dataset).version for dataset in app_datasets))
     
-    page_manager.add_page("Cotações com falta de Estoque", Relatorio_Estoque_Page(df_estoque, thirty_days_ago, today, name))
-    page_manager.add_page("Relatório de Inadimplência", Relatorio_Inadimplencia_Page(df_inadimplencia, six_months_ago, last_day_of_previous_month, name, checkbox_90_days=False))
-    page_manager.add_page("Relatório de Contatos", Relatorio_Contatos_Page(df_contatos, name))
-    page_manager.add_page("Relatório de Contatos - Agregado", Relatorio_ContatosAgregados_Page(df_contatos, name), allowed_users=["Gerência"])
-    page_manager.add_page("Relatório de Vendas", Relatorio_Vendas_Page(df_contatos, name))
+    # As páginas são registradas como fábricas e só são construídas quando selecionadas; as
+    # descrições dos cards vêm da tabela de resumo de cada snapshot (summaries.py)
+    page_manager.add_page("Cotações com falta de Estoque",
+                          partial(Relatorio_Estoque_Page, df_estoque, thirty_days_ago, today, name, data_version=estoque_snapshot.version),
+                          description=lambda: Relatorio_Estoque_Page.describe(summary_of(estoque_snapshot, 'estoque', name, **windows['estoque'])))
+    page_manager.add_page("Relatório de Inadimplência",
+                          partial(Relatorio_Inadimplencia_Page, df_inadimplencia, six_months_ago, last_day_of_previous_month, name, checkbox_90_days=False, data_version=inadimplencia_snapshot.version),
+                          description=lambda: Relatorio_Inadimplencia_Page.describe(summary_of(inadimplencia_snapshot, 'inadimplencia', name, **windows['inadimplencia'])))
+    page_manager.add_page("Relatório de Contatos",
+                          partial(Relatorio_Contatos_Page, df_contatos, name, data_version=contatos_snapshot.version),
+                          description=lambda: Relatorio_Contatos_Page.describe(summary_of(contatos_snapshot, 'contatos', name, **windows['contatos']), name))
+    page_manager.add_page("Relatório de Contatos - Agregado",
+                          lambda: Relatorio_ContatosAgregados_Page(df_contatos, name, totals=contact_totals_of(contatos_snapshot), data_version=contatos_snapshot.version),
+                          allowed_users=["Gerência"])
+    page_manager.add_page("Relatório de Vendas",
+                          partial(Relatorio_Vendas_Page, df_contatos, name, windows['contatos']['day'], data_version=contatos_snapshot.version),
+                          description=lambda: Relatorio_Vendas_Page.describe(summary_of(contatos_snapshot, 'contatos', name, **windows['contatos'])))
+    page_manager.add_page("Relatório de Comissão",
+                          lambda: Relatorio_Comissao_Page(df_comissao, name, six_months_ago, today, first_day_of_current_month, cube=commission_cube_of(comissao_snapshot), data_version=comissao_snapshot.version),
+                          description=lambda: Relatorio_Comissao_Page.describe(commission_of_month(commission_cube_of(comissao_snapshot), name, first_day_of_current_month), name))
+    page_manager.add_page("Relatório de Comissão - Agregado",
+                          lambda: Relatorio_ComissaoAgregados_Page(df_comissao, name, first_day_six_months_ago, cube=commission_cube_of(comissao_snapshot), data_version=comissao_snapshot.version))
+    page_manager.add_page("Desempenho do Painel",
+                          partial(Relatorio_Desempenho_Page, name),
+                          allowed_users=["Gerência"],
+                          description=Relatorio_Desempenho_Page.describe)
 
     # Renderiza a página selecionada
     if st.session_state['selected_page'] == "Painel de Relatórios":
@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from streamlit import config as streamlit_config, logger as streamlit_logger
+
+import synthetic
+from datasets import Snapshot
+from indexes import seller_frame, contact_totals_of, commission_cube_of
+from ingestion import ingest
+from queries import COLUMNS
+from sources import arrow_to_frame, ArrowSource, StreamingSource
+from utils import REPORT_ENGINES, set_report_engine, transform_df_estoque, transform_df_inadimplencia, transform_df_contatos, transform_df_contatosagregados, transform_df_comissao, transform_df_comissao_agregado, transform_df_vendas
+from pages import Relatorio_Estoque_Page, Relatorio_Inadimplencia_Page, Relatorio_Contatos_Page, Relatorio_ContatosAgregados_Page, Relatorio_Comissao_Page, Relatorio_ComissaoAgregados_Page, Relatorio_Vendas_Page
+
+# Benchmark offline dos relatórios: gera as tabelas robo.* sintéticas (synthetic.py), passa
+# pela mesma ingestão do app e mede tempo e pico de memória de cada transform_df_* e do
+# render() de cada página, para a Gerência e para um vendedor. Com --baseline, compara com
+# os números guardados e termina com código 1 se algum caso piorou além da tolerância.
+# Com --engine pandas duckdb, cada caso roda nos dois motores de relatório (utils.REPORT_ENGINES);
+# com --fixtures, as tabelas vêm dos Parquet gravados por `python synthetic.py --output DIR`.
+# Com --ingestion, mede a carga de cada tabela pelo FakeBigQueryClient, lida inteira
+# (ArrowSource) e em blocos (StreamingSource), e confere que as duas dão o mesmo DataFrame.
+#
+#   python benchmark.py --rows 10000 100000 --baseline benchmark_baseline.json
+#   python benchmark.py --rows 10000 100000 --baseline benchmark_baseline.json --update-baseline
+#   python benchmark.py --fixtures synthetic --engine pandas duckdb
+#   python benchmark.py --ingestion --rows 1000000
+
+BASELINE = 'benchmark_baseline.json'
+
+# Diferenças abaixo destes valores são ruído de medição, não regressão
+MIN_SECONDS = 0.02
+MIN_MB = 1.0
+
+
+def quiet_streamlit():
+    # Fora do `streamlit run` os comandos st.* funcionam em "bare mode" (widgets devolvem o
+    # valor padrão e nada é enviado ao navegador), mas avisam a cada chamada
+    warnings.filterwarnings('ignore')
+    streamlit_config.set_option('global.showWarningOnDirectExecution', False)
+    streamlit_config.set_option('logger.level', 'error')
+    streamlit_logger.set_log_level('error')
+
+
+def load(rows, sellers, seed):
+    # Snapshots como os do DatasetStore, já tipados pela ingestão
+    return {dataset: Snapshot(ingest(dataset, df), 1, time.time())
+            for dataset, df in synthetic.generate_all(rows, sellers=sellers, seed=seed).items()}
+
+
+def load_fixtures(directory):
+    # Mesmo caminho do ArrowSource: Parquet -> Arrow -> DataFrame -> ingestão
+    return {dataset: Snapshot(ingest(dataset, arrow_to_frame(pq.read_table(os.path.join(directory, f"{dataset}.parquet")))), 1, time.time())
+            for dataset in COLUMNS}
+
+
+def cases(snapshots, user_name):
+    # (nome, função) de cada medição, com os mesmos argumentos padrão que o app usa
+    today = date.today()
+    thirty_days_ago = today - timedelta(days=30)
+    six_months_ago = today - timedelta(days=180)
+    first_day_of_current_month = today.replace(day=1)
+    last_day_of_previous_month = first_day_of_current_month - timedelta(days=1)
+    first_day_six_months_ago = first_day_of_current_month - relativedelta(months=6)
+    estoque = seller_frame(snapshots['estoque'], 'estoque', user_name)
+    inadimplencia = seller_frame(snapshots['inadimplencia'], 'inadimplencia', user_name)
+    contatos = seller_frame(snapshots['contatos'], 'contatos', user_name)
+    comissao = seller_frame(snapshots['comissao'], 'comissao', user_name)
+    totals = contact_totals_of(snapshots['contatos']) if user_name == 'Gerência' else None
+    cube = commission_cube_of(snapshots['comissao'])
+    transforms = [
+        ('transform_df_estoque', lambda: transform_df_estoque(estoque, thirty_days_ago, today, user_name)),
+        ('transform_df_inadimplencia', lambda: transform_df_inadimplencia(inadimplencia, six_months_ago, last_day_of_previous_month, user_name, False)),
+        ('transform_df_contatos', lambda: transform_df_contatos(contatos, user_name, None, None, None, None)),
+        ('transform_df_contatosagregados', lambda: transform_df_contatosagregados(contatos, user_name)),
+        ('transform_df_comissao', lambda: transform_df_comissao(comissao, user_name, six_months_ago, today, True, None, first_day_of_current_month)),
+        ('transform_df_comissao_agregado', lambda: transform_df_comissao_agregado(comissao, user_name, first_day_six_months_ago, cube=cube)),
+        ('transform_df_vendas', lambda: transform_df_vendas(contatos, user_name, None, None, None, None, True, today.day)),
+    ]
+    pages = [
+        (Relatorio_Estoque_Page, lambda: Relatorio_Estoque_Page(estoque, thirty_days_ago, today, user_name)),
+        (Relatorio_Inadimplencia_Page, lambda: Relatorio_Inadimplencia_Page(inadimplencia, six_months_ago, last_day_of_previous_month, user_name, checkbox_90_days=False)),
+        (Relatorio_Contatos_Page, lambda: Relatorio_Contatos_Page(contatos, user_name)),
+        (Relatorio_ContatosAgregados_Page, lambda: Relatorio_ContatosAgregados_Page(contatos, user_name, totals=totals)),
+        (Relatorio_Comissao_Page, lambda: Relatorio_Comissao_Page(comissao, user_name, six_months_ago, today, first_day_of_current_month, cube=cube)),
+        (Relatorio_ComissaoAgregados_Page, lambda: Relatorio_ComissaoAgregados_Page(comissao, user_name, first_day_six_months_ago, cube=cube)),
+        (Relatorio_Vendas_Page, lambda: Relatorio_Vendas_Page(contatos, user_name, today.day)),
+    ]
+    return transforms + [(f"{page.__name__}.render", lambda factory=factory: factory().render()) for page, factory in pages]
+
+
+def measure(function, repeat):
+    # Tempo: melhor de `repeat` execuções. Memória: uma execução separada com tracemalloc,
+    # que deixaria a medição de tempo mais lenta
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(min(seconds), 5), 'peak_mb': round(peak / 2 ** 20, 2)}
+
+
+# Pools de medição do Arrow: o DataFrame medido continua usando os buffers alocados por eles,
+# então não podem ser destruídos antes do fim do processo
+_arrow_pools = []
+
+
+def measure_ingestion(function):
+    # Como measure, com uma execução só de cada (a carga é longa). O tracemalloc vê as alocações
+    # do Python e do NumPy; as do Arrow ficam no pool do pyarrow, medido por um proxy. O pico
+    # informado é a soma dos dois, um limite superior do pico real
+    started = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - started
+    default_pool = pa.default_memory_pool()
+    pool = pa.proxy_memory_pool(default_pool)
+    _arrow_pools.append(pool)
+    pa.set_memory_pool(pool)
+    tracemalloc.start()
+    try:
+        df = function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        pa.set_memory_pool(default_pool)
+    return df, {'seconds': round(seconds, 5), 'peak_mb': round((peak + pool.max_memory()) / 2 ** 20, 2)}
+
+
+def run_ingestion(rows_list, sellers, seed):
+    results = {}
+    for rows in rows_list:
+        client = synthetic.FakeBigQueryClient(synthetic.generate_all(rows, sellers=sellers, seed=seed))
+        for dataset in COLUMNS:
+            frames = {}
+            for mode, source in (('inteira', ArrowSource(client)), ('blocos', StreamingSource(client))):
+                key = f"{rows}/ingestao/{dataset}/{mode}"
+                frames[mode], results[key] = measure_ingestion(lambda: source.read(dataset))
+                output_mb = frames[mode].memory_usage(index=True, deep=True).sum() / 2 ** 20
+                print(f"{key:75s} {results[key]['seconds'] * 1000:10.1f} ms {results[key]['peak_mb']:10.1f} MiB (saída {output_mb:.1f} MiB)", flush=True)
+            # A leitura em blocos tem de dar exatamente a mesma tabela tipada
+            pd.testing.assert_frame_equal(frames['inteira'], frames['blocos'], check_index_type=False)
+    return results
+
+
+def run(datasets, sellers, repeat, engines=('pandas',)):
+    # datasets: pares (rótulo, função que carrega os snapshots). As chaves dos resultados do
+    # motor pandas não levam sufixo, para continuar comparáveis com as referências antigas
+    results = {}
+    for label, loader in datasets:
+        snapshots = loader()
+        seller = synthetic.seller_names(sellers)[0]
+        for engine in engines:
+            set_report_engine(engine)
+            suffix = '' if engine == 'pandas' else f"@{engine}"
+            for user_name in ('Gerência', seller):
+                role = 'gerencia' if user_name == 'Gerência' else 'vendedor'
+                for name, function in cases(snapshots, user_name):
+                    key = f"{label}/{role}/{name}{suffix}"
+                    results[key] = measure(function, repeat)
+                    print(f"{key:75s} {results[key]['seconds'] * 1000:10.1f} ms {results[key]['peak_mb']:10.1f} MiB", flush=True)
+    set_report_engine('pandas')
+    return results
+
+
+def regressions(results, baseline, tolerance, memory_tolerance):
+    found = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        seconds, base_seconds = result['seconds'], reference['seconds']
+        if seconds > base_seconds * (1 + tolerance) and seconds - base_seconds > MIN_SECONDS:
+            found.append(f"{key}: tempo {base_seconds * 1000:.1f} ms -> {seconds * 1000:.1f} ms")
+        peak, base_peak = result['peak_mb'], reference['peak_mb']
+        if peak > base_peak * (1 + memory_tolerance) and peak - base_peak > MIN_MB:
+            found.append(f"{key}: memória {base_peak:.1f} MiB -> {peak:.1f} MiB")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline dos relatórios com dados sintéticos.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000], help="tamanhos das tabelas (10 mil a 10 milhões)")
+    parser.add_argument('--sellers', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fixtures', default=None, help="diretório com os <dataset>.parquet de synthetic.py (ignora --rows e --seed)")
+    parser.add_argument('--engine', nargs='+', default=['pandas'], choices=REPORT_ENGINES, help="motores de relatório a medir")
+    parser.add_argument('--repeat', type=int, default=5, help="execuções por caso; vale a mais rápida")
+    parser.add_argument('--ingestion', action='store_true', help="mede a carga das tabelas (inteira e em blocos) em vez dos relatórios")
+    parser.add_argument('--baseline', default=None, help=f"arquivo de referência (ex.: {BASELINE})")
+    parser.add_argument('--update-baseline', action='store_true', help="grava os resultados como nova referência")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="piora de tempo aceita (0.5 = 50%%)")
+    parser.add_argument('--memory-tolerance', type=float, default=0.2, help="piora de memória aceita (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    quiet_streamlit()
+    if args.ingestion:
+        results = run_ingestion(args.rows, args.sellers, args.seed)
+    else:
+        if args.fixtures:
+            datasets = [('fixtures', lambda: load_fixtures(args.fixtures))]
+        else:
+            datasets = [(rows, lambda rows=rows: load(rows, args.sellers, args.seed)) for rows in args.rows]
+        results = run(datasets, args.sellers, args.repeat, args.engine)
+    if args.baseline is None:
+        return 0
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)['results']
+        baseline.update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump({'python': platform.python_version(), 'pandas': pd.__version__, 'machine': platform.machine(),
+                       'sellers': args.sellers, 'seed': args.seed, 'results': baseline}, file, indent=1, sort_keys=True)
+        print(f"Referência gravada em {args.baseline}")
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)['results']
+    found = regressions(results, baseline, args.tolerance, args.memory_tolerance)
+    for line in found:
+        print(f"REGRESSÃO {line}")
+    if found:
+        return 1
+    print("Nenhuma regressão em relação à referência.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,508 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import AsyncHTTPClient
+from tornado.websocket import websocket_connect
+
+import synthetic
+from benchmark_startup import USER, PASSWORD, write_config, write_service_account
+from prewarm import prewarm
+
+# Teste de carga offline: quantas sessões simultâneas um container atende antes de os reruns
+# entrarem em fila. Sobe o app com `streamlit run` (um servidor novo por etapa), com o mesmo
+# config.yaml de teste, a conta de serviço falsa e os snapshots sintéticos publicados pelo
+# prewarm.py que o benchmark_startup.py usa (DATASET_MODE=worker: nada vai ao BigQuery).
+# Cada sessão é um navegador sem interface (Session) que fala o protocolo do Streamlit pelo
+# websocket, como o frontend: faz login como a Gerência ou como um vendedor, abre cada página
+# da página inicial, muda um filtro, troca de página na tabela paginada, gera e baixa o relatório
+# e volta ao painel. O AppTest não serve aqui: ele troca o Runtime global a cada execução e não
+# roda sessões ao mesmo tempo.
+# Para cada número de sessões, mede a latência de cada interação (do envio do rerun até o
+# script_finished), a vazão (interações por segundo) e a memória do servidor: RSS depois de uma
+# sessão de aquecimento, RSS com todas as sessões ainda abertas (a diferença dividida pelas
+# sessões é a memória por sessão) e o pico durante a carga.
+# Com --baseline, compara com os números guardados e termina com código 1 se algum piorou além
+# da tolerância, como o benchmark.py. Cliente e servidor dividem a máquina; compare sempre
+# números medidos no mesmo host.
+#
+#   python benchmark_load.py --sessions 1 5 10 20
+#   python benchmark_load.py --sessions 10 --think 2 --rounds 3
+#   python benchmark_load.py --sessions 1 10 --baseline benchmark_load_baseline.json --update-baseline
+#   python benchmark_load.py --app /tmp/antes --sessions 10
+
+BASELINE = 'benchmark_load_baseline.json'
+
+# Diferenças abaixo destes valores são ruído de medição, não regressão
+MIN_MS = 50.0
+MIN_MB = 2.0
+
+# Widgets das páginas que não são filtros (tabela paginada e área de download)
+NOT_FILTERS = ('Formato do relatório', 'Ordenar por', 'Ordem', 'Linhas por página')
+
+WIDGETS = ('button', 'download_button', 'checkbox', 'selectbox', 'date_input', 'number_input', 'text_input')
+
+
+class Session:
+    # Navegador sem interface: guarda os elementos da tela por delta_path e os valores dos
+    # widgets mexidos pelo usuário, e manda o rerun com eles a cada interação, como o frontend
+    def __init__(self, base_url, username, seed, timeout):
+        self.base_url = base_url
+        self.username = username
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        # delta_path -> (execução, fragmento, tipo, proto)
+        self.elements = {}
+        # id do widget -> WidgetState com o valor escolhido
+        self.values = {}
+        # Mensagens já recebidas, por hash: na repetição o servidor manda só a referência
+        self.messages = {}
+        self.page_script_hash = ''
+        self.run = 0
+        self.fragments_this_run = []
+        self.action = None
+        self.connection = None
+        self.latencies = []
+        self.errors = []
+
+    async def open(self):
+        url = self.base_url.replace('http', 'ws', 1) + '/_stcore/stream'
+        self.connection = await websocket_connect(url, subprotocols=['streamlit'], max_message_size=512 * 2 ** 20)
+        await self.rerun('abrir_app')
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    async def rerun(self, action, fragment_id=''):
+        message = BackMsg()
+        client_state = message.rerun_script
+        client_state.page_script_hash = self.page_script_hash
+        client_state.fragment_id = fragment_id
+        present = {proto.id for _, _, _, proto in self.widgets()}
+        client_state.widget_states.widgets.extend(state for widget_id, state in self.values.items() if widget_id in present)
+        self.action = action
+        started = time.perf_counter()
+        await self.connection.write_message(message.SerializeToString(), binary=True)
+        await asyncio.wait_for(self.receive(), self.timeout)
+        self.latencies.append((action, time.perf_counter() - started))
+        # Botões valem uma execução só; widgets que saíram da tela voltam ao padrão quando voltam
+        present = {proto.id for _, _, _, proto in self.widgets()}
+        self.values = {widget_id: state for widget_id, state in self.values.items()
+                       if widget_id in present and state.WhichOneof('value') != 'trigger_value'}
+
+    async def receive(self):
+        while True:
+            payload = await self.connection.read_message()
+            if payload is None:
+                raise ConnectionError("conexão fechada pelo servidor")
+            message = ForwardMsg()
+            message.ParseFromString(payload)
+            message = await self.resolve(message)
+            kind = message.WhichOneof('type')
+            if kind == 'new_session':
+                self.run += 1
+                self.fragments_this_run = list(message.new_session.fragment_ids_this_run)
+                self.page_script_hash = message.new_session.page_script_hash
+            elif kind == 'delta':
+                self.apply(message)
+            elif kind == 'script_finished':
+                if message.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # st.rerun(): a próxima execução já vem em seguida
+                    continue
+                self.clear_stale()
+                if message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("erro de compilação no app")
+                return
+
+    async def resolve(self, message):
+        if message.WhichOneof('type') == 'ref_hash':
+            cached = self.messages.get(message.ref_hash)
+            if cached is None:
+                response = await AsyncHTTPClient().fetch(f"{self.base_url}/_stcore/message?hash={message.ref_hash}")
+                cached = ForwardMsg()
+                cached.ParseFromString(response.body)
+            # A referência traz o metadata (delta_path) desta execução
+            resolved = ForwardMsg()
+            resolved.CopyFrom(cached)
+            resolved.metadata.CopyFrom(message.metadata)
+            return resolved
+        if message.metadata.cacheable:
+            self.messages[message.hash] = message
+        return message
+
+    def apply(self, message):
+        delta = message.delta
+        kind = delta.WhichOneof('type')
+        if kind == 'new_element':
+            element_type = delta.new_element.WhichOneof('type')
+            proto = getattr(delta.new_element, element_type)
+            if element_type == 'exception':
+                self.errors.append((self.action, f"{proto.type}: {proto.message}"))
+            if getattr(proto, 'set_value', False):
+                # Valor definido pelo app (session_state): vale o do servidor
+                self.values.pop(proto.id, None)
+        elif kind == 'add_block':
+            element_type, proto = 'block', delta.add_block
+        else:
+            return
+        self.elements[tuple(message.metadata.delta_path)] = (self.run, delta.fragment_id, element_type, proto)
+
+    def clear_stale(self):
+        # Como o frontend: o que não foi redesenhado nesta execução sai da tela; no rerun de um
+        # fragmento, só o que pertence aos fragmentos que rodaram
+        self.elements = {path: entry for path, entry in self.elements.items()
+                         if entry[0] == self.run or (self.fragments_this_run and entry[1] not in self.fragments_this_run)}
+
+    def widgets(self, kind=None, label=''):
+        return [(path, fragment, element_type, proto) for path, (_, fragment, element_type, proto) in sorted(self.elements.items())
+                if element_type in WIDGETS and (kind is None or element_type == kind) and proto.label.startswith(label)]
+
+    def find(self, kind, label=''):
+        found = self.widgets(kind, label)
+        return found[0] if found else None
+
+    async def click(self, action, widget):
+        _, fragment, _, proto = widget
+        self.values[proto.id] = WidgetState(id=proto.id, trigger_value=True)
+        await self.rerun(action, fragment)
+
+    async def set_value(self, action, widget, **value):
+        _, fragment, _, proto = widget
+        self.values[proto.id] = WidgetState(id=proto.id, **value)
+        await self.rerun(action, fragment)
+
+    def current(self, widget, field):
+        # Valor na tela: o escolhido nesta sessão, o definido pelo app ou o padrão do widget
+        _, _, _, proto = widget
+        state = self.values.get(proto.id)
+        if state is None:
+            return proto.value if proto.set_value else proto.default
+        value = getattr(state, field)
+        return value.data if field == 'string_array_value' else value
+
+    async def login(self, password):
+        username, secret = self.widgets('text_input')[:2]
+        self.values[username[3].id] = WidgetState(id=username[3].id, string_value=self.username)
+        self.values[secret[3].id] = WidgetState(id=secret[3].id, string_value=password)
+        submit = next(widget for widget in self.widgets('button') if widget[3].is_form_submitter)
+        await self.click('login', submit)
+        if self.find('button', 'Abrir') is None:
+            raise RuntimeError(f"login de {self.username} falhou")
+
+    async def change_filter(self):
+        # Um dos filtros da página, escolhido ao acaso: marca/desmarca, escolhe uma opção ou
+        # encurta o período em uma semana
+        filters = [widget for widget in self.widgets() if widget[2] in ('checkbox', 'selectbox', 'date_input') and widget[3].label not in NOT_FILTERS]
+        if not filters:
+            return
+        widget = self.rng.choice(filters)
+        proto = widget[3]
+        if widget[2] == 'checkbox':
+            await self.set_value('filtro', widget, bool_value=not self.current(widget, 'bool_value'))
+        elif widget[2] == 'selectbox' and proto.options:
+            await self.set_value('filtro', widget, int_value=self.rng.randrange(len(proto.options)))
+        elif widget[2] == 'date_input':
+            dates = list(self.current(widget, 'string_array_value'))
+            if not dates:
+                return
+            dates[0] = (datetime.strptime(dates[0], '%Y/%m/%d') + timedelta(days=7)).strftime('%Y/%m/%d')
+            await self.set_value('filtro', widget, string_array_value={'data': dates})
+
+    async def next_page(self):
+        widget = self.find('number_input', 'Página')
+        if widget is not None and widget[3].has_max and widget[3].max > 1:
+            await self.set_value('paginar', widget, int_value=2)
+
+    async def download(self):
+        # Formato ao acaso; o arquivo é gerado sob pedido e baixado pela URL de mídia
+        widget = self.find('selectbox', 'Formato do relatório')
+        if widget is not None and len(widget[3].options) > 1:
+            index = self.rng.randrange(len(widget[3].options))
+            if index != self.current(widget, 'int_value'):
+                await self.set_value('formato', widget, int_value=index)
+        button = self.find('button', 'Gerar relatório')
+        if button is not None:
+            await self.click('gerar_relatorio', button)
+        link = self.find('download_button')
+        if link is not None:
+            started = time.perf_counter()
+            await AsyncHTTPClient().fetch(self.base_url + link[3].url, request_timeout=self.timeout)
+            self.latencies.append(('baixar', time.perf_counter() - started))
+
+    async def browse(self, password, rounds, think):
+        await self.open()
+        await self.pause(think)
+        await self.login(password)
+        pages = [widget[3].label for widget in self.widgets('button', 'Abrir')]
+        for _ in range(rounds):
+            for label in pages:
+                await self.pause(think)
+                await self.click('abrir_pagina', self.find('button', label))
+                for step in (self.change_filter, self.next_page, self.download):
+                    await self.pause(think)
+                    await step()
+                await self.pause(think)
+                await self.click('voltar', self.find('button', 'Voltar ao Painel'))
+
+    async def pause(self, think):
+        # Tempo de leitura do usuário entre as interações (exponencial, média think segundos)
+        if think:
+            await asyncio.sleep(self.rng.expovariate(1 / think))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_memory(pid):
+    # RSS atual e pico (VmHWM) do servidor em MiB (Linux); None onde /proc não existe
+    try:
+        with open(f'/proc/{pid}/status') as file:
+            fields = dict(line.split(':', 1) for line in file if ':' in line)
+        return int(fields['VmRSS'].split()[0]) / 1024, int(fields['VmHWM'].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def start_server(app, workdir, snapshots):
+    # workdir faz o papel do diretório do app no container, como no benchmark_startup.py
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=app, DATASET_MODE='worker', SNAPSHOT_DIR=snapshots)
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    process = subprocess.Popen([sys.executable, '-m', 'streamlit', 'run', os.path.join(app, 'app.py'),
+                                '--server.headless=true', '--server.address=127.0.0.1', f'--server.port={port}',
+                                '--server.fileWatcherType=none', '--browser.gatherUsageStats=false'],
+                               cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            with urllib.request.urlopen(base_url + '/_stcore/health', timeout=1) as response:
+                if response.status == 200:
+                    return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    stop_server(process)
+    with open(log.name) as file:
+        raise RuntimeError("servidor do Streamlit não subiu:\n" + file.read()[-2000:])
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_stage(base_url, pid, users, sessions, rounds, think, ramp, timeout, seed):
+    # Aquecimento: uma sessão da Gerência percorre tudo antes da medida (snapshots, derivados e
+    # caches do processo prontos), e o RSS depois dela é a base da memória por sessão
+    warmup = Session(base_url, USER, seed, timeout)
+    try:
+        await warmup.browse(PASSWORD, 1, 0)
+    finally:
+        warmup.close()
+    if warmup.errors:
+        raise RuntimeError(f"aquecimento falhou: {warmup.errors[0]}")
+    rss_before, _ = server_memory(pid)
+
+    samples = []
+
+    async def sample():
+        while True:
+            samples.append(server_memory(pid)[0])
+            await asyncio.sleep(0.1)
+
+    async def start(index, session):
+        # Entrada espaçada ao longo de ramp segundos
+        await asyncio.sleep(ramp * index / sessions)
+        try:
+            await session.browse(PASSWORD, rounds, think)
+        except Exception as error:
+            session.errors.append((session.action, repr(error)))
+
+    clients = [Session(base_url, users[index % len(users)], seed + 1 + index, timeout) for index in range(sessions)]
+    sampler = asyncio.ensure_future(sample())
+    started = time.perf_counter()
+    await asyncio.gather(*(start(index, session) for index, session in enumerate(clients)))
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+    # Todas as sessões ainda conectadas
+    rss_after, hwm = server_memory(pid)
+    for session in clients:
+        session.close()
+
+    latencies = {}
+    for session in clients:
+        for action, seconds in session.latencies:
+            latencies.setdefault(action, []).append(seconds * 1000)
+    everything = [ms for values in latencies.values() for ms in values]
+    result = {
+        'sessions': sessions,
+        'actions': len(everything),
+        'seconds': elapsed,
+        'actions_per_s': len(everything) / elapsed if elapsed else 0.0,
+        'errors': [f"{session.username} {action}: {message}" for session in clients for action, message in session.errors],
+        'latency_ms': {action: {'n': len(values), 'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95),
+                                'p99': percentile(values, 0.99), 'max': max(values)}
+                       for action, values in sorted(latencies.items())},
+    }
+    if everything:
+        result['latency_ms']['total'] = {'n': len(everything), 'p50': percentile(everything, 0.5), 'p95': percentile(everything, 0.95),
+                                         'p99': percentile(everything, 0.99), 'max': max(everything)}
+    if rss_before is not None:
+        peak = max([rss for rss in samples if rss is not None] + [rss_after])
+        result['memory_mb'] = {'rss_before': rss_before, 'rss_after': rss_after, 'peak': peak, 'hwm': hwm,
+                               'per_session': (rss_after - rss_before) / sessions}
+    return result
+
+
+def run(app, workdir, snapshots, users, args):
+    results = []
+    for sessions in args.sessions:
+        # Servidor novo por etapa: sessões desconectadas ficam guardadas por um tempo no
+        # processo e contariam na memória da etapa seguinte
+        process, base_url = start_server(app, workdir, snapshots)
+        try:
+            result = asyncio.run(run_stage(base_url, process.pid, users, sessions, args.rounds, args.think, args.ramp, args.timeout, args.seed))
+        finally:
+            stop_server(process)
+        report(result)
+        results.append(result)
+    return results
+
+
+def report(result):
+    total = result['latency_ms'].get('total', {})
+    memory = result.get('memory_mb')
+    print(f"\n{result['sessions']} sessões: {result['actions']} interações em {result['seconds']:.1f}s "
+          f"({result['actions_per_s']:.1f}/s), p50 {total.get('p50', 0):.0f} ms, p95 {total.get('p95', 0):.0f} ms, "
+          f"{len(result['errors'])} erros")
+    if memory:
+        print(f"memória do servidor: {memory['rss_before']:.0f} MiB depois do aquecimento, {memory['rss_after']:.0f} MiB "
+              f"com as sessões abertas ({memory['per_session']:.1f} MiB por sessão), pico {memory['peak']:.0f} MiB")
+    print(f"{'interação':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for action, stats in result['latency_ms'].items():
+        print(f"{action:<18}{stats['n']:>6}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+    for error in result['errors'][:10]:
+        print(f"ERRO {error}")
+
+
+def flatten(results):
+    # Chaves comparáveis entre execuções: <sessões>/<interação> com o p95, e <sessões>/memoria
+    flat = {}
+    for result in results:
+        for action, stats in result['latency_ms'].items():
+            flat[f"{result['sessions']}/{action}"] = {'p95_ms': round(stats['p95'], 1)}
+        if 'memory_mb' in result:
+            flat[f"{result['sessions']}/memoria"] = {'per_session_mb': round(result['memory_mb']['per_session'], 2)}
+    return flat
+
+
+def regressions(results, baseline, tolerance, memory_tolerance):
+    found = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        if 'p95_ms' in result:
+            ms, base_ms = result['p95_ms'], reference['p95_ms']
+            if ms > base_ms * (1 + tolerance) and ms - base_ms > MIN_MS:
+                found.append(f"{key}: p95 {base_ms:.1f} ms -> {ms:.1f} ms")
+        if 'per_session_mb' in result:
+            mb, base_mb = result['per_session_mb'], reference['per_session_mb']
+            if mb > base_mb * (1 + memory_tolerance) and mb - base_mb > MIN_MB:
+                found.append(f"{key}: memória por sessão {base_mb:.1f} MiB -> {mb:.1f} MiB")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga offline do app com sessões simultâneas.")
+    parser.add_argument('--app', default=os.path.dirname(os.path.abspath(__file__)), help="diretório do checkout a medir")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10], help="sessões simultâneas de cada etapa")
+    parser.add_argument('--rows', type=int, default=100_000, help="linhas das tabelas sintéticas publicadas")
+    parser.add_argument('--sellers', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rounds', type=int, default=1, help="voltas por todas as páginas em cada sessão")
+    parser.add_argument('--think', type=float, default=0.0, help="pausa média entre interações, em segundos (0 = sem pausa)")
+    parser.add_argument('--ramp', type=float, default=0.0, help="segundos para todas as sessões entrarem")
+    parser.add_argument('--timeout', type=float, default=120.0, help="tempo máximo de cada interação, em segundos")
+    parser.add_argument('--output', default=None, help="grava os resultados em JSON")
+    parser.add_argument('--baseline', default=None, help=f"arquivo de referência (ex.: {BASELINE})")
+    parser.add_argument('--update-baseline', action='store_true', help="grava os resultados como nova referência")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="piora de p95 aceita (0.5 = 50%%)")
+    parser.add_argument('--memory-tolerance', type=float, default=0.3, help="piora de memória por sessão aceita (0.3 = 30%%)")
+    args = parser.parse_args()
+
+    # Sessões alternam entre a Gerência e os vendedores (usuário = nome do vendedor em minúsculas)
+    users = [USER] + [seller.lower() for seller in synthetic.seller_names(args.sellers)]
+    with tempfile.TemporaryDirectory() as workdir:
+        snapshots = os.path.join(workdir, 'snapshots')
+        prewarm(synthetic.FakeBigQueryClient(synthetic.generate_all(args.rows, sellers=args.sellers, seed=args.seed)), snapshots)
+        write_config(os.path.join(workdir, 'config.yaml'), args.sellers)
+        write_service_account(os.path.join(workdir, 'googlecredentials.json'))
+        results = run(os.path.abspath(args.app), workdir, snapshots, users, args)
+
+    print(f"\n{'sessões':>8}{'interações/s':>14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'MiB/sessão':>12}{'pico MiB':>10}{'erros':>7}")
+    for result in results:
+        total = result['latency_ms'].get('total', {'p50': 0, 'p95': 0, 'p99': 0})
+        memory = result.get('memory_mb', {})
+        print(f"{result['sessions']:>8}{result['actions_per_s']:>14.1f}{total['p50']:>10.1f}{total['p95']:>10.1f}{total['p99']:>10.1f}"
+              f"{memory.get('per_session', float('nan')):>12.1f}{memory.get('peak', float('nan')):>10.0f}{len(result['errors']):>7}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1)
+
+    failed = any(result['errors'] for result in results)
+    if args.baseline is None:
+        return 1 if failed else 0
+    flat = flatten(results)
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)['results']
+        baseline.update(flat)
+        with open(args.baseline, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'rows': args.rows,
+                       'sellers': args.sellers, 'rounds': args.rounds, 'think': args.think, 'results': baseline},
+                      file, indent=1, sort_keys=True)
+        print(f"Referência gravada em {args.baseline}")
+        return 1 if failed else 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)['results']
+    found = regressions(flat, baseline, args.tolerance, args.memory_tolerance)
+    for line in found:
+        print(f"REGRESSÃO {line}")
+    if found or failed:
+        return 1
+    print("Nenhuma regressão em relação à referência.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import bcrypt
+import rsa
+import yaml
+
+import synthetic
+from prewarm import prewarm
+
+# Benchmark offline da inicialização do app. Cada medida roda em um processo Python novo, como
+# um container que acabou de subir:
+#  - import: tempo dos imports do topo do app.py (e quais módulos pesados eles carregam);
+#  - primeira execução: o app.py inteiro até a tela de login, incluindo os imports;
+#  - login: a execução que autentica e abre a página inicial com os snapshots;
+#  - rerun: custo fixo de cada rerun da página inicial de uma sessão já logada.
+# O app roda pelo AppTest do Streamlit com um config.yaml de teste (senhas em bcrypt), uma conta
+# de serviço falsa (o cliente BigQuery é criado de verdade, sem acessar a rede) e os snapshots
+# publicados por prewarm.py, lidos em DATASET_MODE=worker; nenhuma consulta vai ao BigQuery.
+# Para comparar antes e depois de uma mudança, meça os dois checkouts com os mesmos dados:
+#
+#   python benchmark_startup.py
+#   git worktree add /tmp/antes HEAD~1
+#   python benchmark_startup.py --app /tmp/antes --rows 100000 --repeat 5
+
+# Módulos cuja presença depois dos imports indica carga antecipada
+HEAVY_MODULES = ('google.cloud.bigquery', 'xlsxwriter', 'pyarrow.parquet', 'duckdb')
+
+USER = 'gerencia'
+PASSWORD = 'benchmark'
+
+
+def write_config(path, sellers):
+    # Credenciais como as do config.yaml de produção: a Gerência e um usuário por vendedor
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode()
+    usernames = {USER: {'name': 'Gerência', 'email': 'gerencia@example.com', 'password': hashed}}
+    for seller in synthetic.seller_names(sellers):
+        usernames[seller.lower()] = {'name': seller.title(), 'email': f"{seller.lower()}@example.com", 'password': hashed}
+    config = {'credentials': {'usernames': usernames},
+              'cookie': {'name': 'benchmark', 'key': 'benchmark', 'expiry_days': 1},
+              'pre-authorized': {'emails': []}}
+    with open(path, 'w') as file:
+        yaml.safe_dump(config, file, allow_unicode=True)
+
+
+def write_service_account(path):
+    # Conta de serviço com chave gerada na hora: suficiente para montar o bigquery.Client
+    _, private_key = rsa.newkeys(1024)
+    info = {'type': 'service_account', 'project_id': 'benchmark', 'private_key_id': '0',
+            'private_key': private_key.save_pkcs1().decode(), 'client_email': 'benchmark@benchmark.iam.gserviceaccount.com',
+            'client_id': '0', 'token_uri': 'https://oauth2.googleapis.com/token'}
+    with open(path, 'w') as file:
+        json.dump(info, file)
+
+
+def app_imports(app):
+    # Os imports do topo do app.py, como código executável
+    with open(os.path.join(app, 'app.py')) as file:
+        tree = ast.parse(file.read())
+    return '\n'.join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+{imports}
+print(json.dumps({{'import_s': time.perf_counter() - started, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+RUN_SCRIPT = """
+import json, time, warnings
+warnings.filterwarnings('ignore')
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=600)
+started = time.perf_counter()
+at.run()
+first = time.perf_counter() - started
+at.text_input[0].input({user!r})
+at.text_input[1].input({password!r})
+at.button[0].click()
+started = time.perf_counter()
+at.run()
+login = time.perf_counter() - started
+assert not at.exception, at.exception
+assert any(button.label.startswith('Abrir') for button in at.button), "login falhou"
+reruns = []
+for _ in range({reruns}):
+    started = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - started)
+assert not at.exception, at.exception
+print(json.dumps({{'first_run_s': first, 'login_s': login, 'reruns_s': reruns}}))
+"""
+
+
+def measure(script, workdir, app, env):
+    output = subprocess.run([sys.executable, '-c', script], cwd=workdir, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(app, workdir, snapshots, repeat, reruns):
+    # workdir faz o papel do diretório do app no container: config.yaml e googlecredentials.json
+    # são lidos de lá; os módulos do app vêm de `app` pelo PYTHONPATH
+    env = dict(os.environ, PYTHONPATH=app, DATASET_MODE='worker', SNAPSHOT_DIR=snapshots)
+    imports, runs = [], []
+    for _ in range(repeat):
+        imports.append(measure(IMPORT_SCRIPT.format(imports=app_imports(app), heavy=HEAVY_MODULES), workdir, app, env))
+        runs.append(measure(RUN_SCRIPT.format(app=os.path.join(app, 'app.py'), user=USER, password=PASSWORD, reruns=reruns),
+                            workdir, app, env))
+    rerun_times = sorted(seconds for result in runs for seconds in result['reruns_s'])
+    return {
+        'import_ms': statistics.median(result['import_s'] for result in imports) * 1000,
+        'first_run_ms': statistics.median(result['first_run_s'] for result in runs) * 1000,
+        'login_ms': statistics.median(result['login_s'] for result in runs) * 1000,
+        'rerun_p50_ms': statistics.median(rerun_times) * 1000,
+        'rerun_p95_ms': rerun_times[min(len(rerun_times) - 1, int(len(rerun_times) * 0.95))] * 1000,
+        'heavy_modules': imports[-1]['heavy'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline da inicialização e do custo fixo por rerun do app.")
+    parser.add_argument('--app', default=os.path.dirname(os.path.abspath(__file__)), help="diretório do checkout a medir")
+    parser.add_argument('--rows', type=int, default=10_000, help="linhas das tabelas sintéticas publicadas")
+    parser.add_argument('--sellers', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3, help="processos novos por medida; vale a mediana")
+    parser.add_argument('--reruns', type=int, default=20, help="reruns medidos por processo")
+    parser.add_argument('--output', default=None, help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        snapshots = os.path.join(workdir, 'snapshots')
+        prewarm(synthetic.FakeBigQueryClient(synthetic.generate_all(args.rows, sellers=args.sellers)), snapshots)
+        write_config(os.path.join(workdir, 'config.yaml'), args.sellers)
+        write_service_account(os.path.join(workdir, 'googlecredentials.json'))
+        result = run(os.path.abspath(args.app), workdir, snapshots, args.repeat, args.reruns)
+
+    print(f"{'medida':<28}{'ms':>10}")
+    for key, label in (('import_ms', 'imports do app.py'), ('first_run_ms', 'primeira execução (login)'),
+                       ('login_ms', 'execução do login'), ('rerun_p50_ms', 'rerun (p50)'), ('rerun_p95_ms', 'rerun (p95)')):
+        print(f"{label:<28}{result[key]:>10.1f}")
+    print(f"módulos pesados carregados nos imports: {', '.join(result['heavy_modules']) or 'nenhum'}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
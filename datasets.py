@@ -0,0 +1,396 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+from metrics import span, count_cache
+from queries import TABLES
+
+logger = logging.getLogger(__name__)
+
+
+class Changes:
+    # Linhas que saíram e que entraram no snapshot em uma atualização incremental
+    def __init__(self, removed, added):
+        self.removed = removed
+        self.added = added
+
+
+class Snapshot:
+    # Última versão boa de um dataset, compartilhada entre todas as sessões.
+    # Quando a versão veio de uma atualização incremental, changes traz as linhas alteradas
+    # e os valores derivados da versão anterior ficam disponíveis para atualização parcial.
+    # base_version é a versão a partir da qual as changes foram calculadas.
+    def __init__(self, data, version, fetched_at, previous=None, changes=None):
+        self.data = data
+        self.version = version
+        self.fetched_at = fetched_at
+        self.changes = changes
+        self.base_version = previous.version if previous is not None and changes is not None else None
+        self.derived = {}
+        # Cópia: o snapshot anterior continua sendo lido por sessões que ainda estão nele
+        self._previous_derived = dict(previous.derived) if previous is not None and changes is not None else {}
+        self._derived_lock = threading.Lock()
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def derive(self, key, builder, update=None):
+        # Valor derivado dos dados (índices, agregados), calculado uma única vez por versão.
+        # Como fica guardado no próprio snapshot, uma nova versão descarta os valores antigos.
+        # Com update(anterior, dados, changes), a versão incremental parte do valor anterior
+        # em vez de recalcular tudo com builder(dados).
+        with self._derived_lock:
+            count_cache('derivados', key in self.derived)
+            if key not in self.derived:
+                previous = self._previous_derived.pop(key, None)
+                if update is not None and previous is not None:
+                    self.derived[key] = update(previous, self.data, self.changes)
+                else:
+                    self.derived[key] = builder(self.data)
+            return self.derived[key]
+
+
+class DatasetStore:
+    # Guarda um snapshot por dataset para o processo inteiro. Depois da primeira carga,
+    # snapshot() sempre devolve o último snapshot bom, sem cópia, e dispara a atualização
+    # em uma thread de fundo quando ele passa do ttl. Cada dataset tem no máximo uma
+    # atualização em andamento, então várias sessões expirando juntas geram uma só consulta.
+    # Com um disk_cache, um processo recém-iniciado serve o último snapshot salvo em disco
+    # e só então vai ao BigQuery, em segundo plano. As atualizações rodam em um pool de
+    # threads, então datasets diferentes são buscados ao mesmo tempo (ver warm()).
+    # Com read_only=True o store não consulta nada: segue as versões que outro processo
+    # (prewarm.py --watch) publica no disk_cache, conferindo o manifesto a cada watch_interval
+    # segundos e trocando o snapshot em memória quando aparece uma versão nova.
+    def __init__(self, ttl=600, disk_cache=None, max_workers=4, read_only=False, watch_interval=5, publish_timeout=300):
+        self.ttl = ttl
+        self.disk_cache = disk_cache
+        self.read_only = read_only
+        self.watch_interval = watch_interval
+        self.publish_timeout = publish_timeout
+        self._checked = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='refresh')
+        self._loaders = {}
+        self._snapshots = {}
+        self._inflight = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._restore_locks = {}
+
+    def register(self, dataset, loader):
+        # loader é qualquer função sem argumentos que devolve o DataFrame do dataset
+        self._loaders[dataset] = loader
+
+    def snapshot(self, dataset):
+        with self._lock:
+            snapshot = self._snapshots.get(dataset)
+            checked = self._checked.get(dataset, 0)
+        # Acerto: havia um snapshot em memória para servir sem esperar o disco ou o BigQuery
+        count_cache('snapshot', snapshot is not None)
+        if self.read_only:
+            if snapshot is None or time.time() - checked > self.watch_interval:
+                snapshot = self._follow(dataset)
+            return snapshot
+        if snapshot is None and self.disk_cache is not None:
+            snapshot = self._restore(dataset)
+        if snapshot is None:
+            # Primeira carga do processo: não há o que servir, então espera a consulta
+            self.refresh(dataset).wait()
+            with self._lock:
+                snapshot = self._snapshots.get(dataset)
+            if snapshot is None:
+                raise self._errors[dataset]
+        elif snapshot.age > self.ttl:
+            self.refresh(dataset)
+        return snapshot
+
+    def warm(self, datasets):
+        # Primeira carga de vários datasets de uma vez: dispara todas as consultas que faltam
+        # em paralelo e espera todas, então a carga a frio leva o tempo da tabela mais lenta
+        # e não a soma delas. Datasets já em memória (ou no disco) não geram consulta.
+        if self.read_only:
+            for dataset in datasets:
+                self.snapshot(dataset)
+            return
+        events = []
+        for dataset in datasets:
+            with self._lock:
+                snapshot = self._snapshots.get(dataset)
+            if snapshot is None and self.disk_cache is not None:
+                snapshot = self._restore(dataset)
+            if snapshot is None:
+                events.append(self.refresh(dataset))
+        for event in events:
+            event.wait()
+
+    def _restore_lock(self, dataset):
+        # Um lock por dataset: esperar a publicação de um dataset não trava a leitura dos outros
+        with self._lock:
+            return self._restore_locks.setdefault(dataset, threading.Lock())
+
+    def _restore(self, dataset):
+        with self._restore_lock(dataset):
+            with self._lock:
+                snapshot = self._snapshots.get(dataset)
+            if snapshot is not None:
+                return snapshot
+            try:
+                snapshot = self.disk_cache.load(dataset)
+            except Exception:
+                logger.exception("Falha ao ler o snapshot em disco do dataset %s", dataset)
+                return None
+            if snapshot is None:
+                return None
+            restore = getattr(self._loaders[dataset], 'restore', None)
+            if restore is not None:
+                restore(snapshot.data)
+            with self._lock:
+                self._snapshots.setdefault(dataset, snapshot)
+                snapshot = self._snapshots[dataset]
+            logger.info("Dataset %s restaurado do disco (versão %s)", dataset, snapshot.version)
+            return snapshot
+
+    def _follow(self, dataset):
+        # Troca para a última versão publicada no disco, se for mais nova que a da memória.
+        # Na primeira leitura, espera a publicação por até publish_timeout segundos
+        deadline = time.time() + self.publish_timeout
+        with self._restore_lock(dataset):
+            while True:
+                with self._lock:
+                    current = self._snapshots.get(dataset)
+                    self._checked[dataset] = time.time()
+                manifest = self.disk_cache.manifest(dataset)
+                if manifest is not None and (current is None or manifest['version'] > current.version):
+                    snapshot = self.disk_cache.load(dataset)
+                    if snapshot is not None:
+                        with self._lock:
+                            self._snapshots[dataset] = snapshot
+                        logger.info("Dataset %s: versão %s publicada carregada", dataset, snapshot.version)
+                        return snapshot
+                if current is not None:
+                    return current
+                if time.time() > deadline:
+                    raise LookupError(f"Dataset {dataset} não publicado em {self.disk_cache.directory}")
+                time.sleep(1)
+
+    def refresh(self, dataset):
+        # Dispara a atualização em segundo plano, reaproveitando a que já estiver em andamento.
+        # Devolve o Event que é sinalizado quando a atualização termina.
+        with self._lock:
+            event = self._inflight.get(dataset)
+            if event is not None:
+                return event
+            event = threading.Event()
+            self._inflight[dataset] = event
+        self._executor.submit(self._refresh, dataset, event)
+        return event
+
+    def _refresh(self, dataset, event):
+        snapshot = None
+        try:
+            started = time.time()
+            loader = self._loaders[dataset]
+            with span('fetch', dataset=dataset) as record:
+                data = loader()
+                changes = getattr(loader, 'last_changes', None)
+                record['rows'] = len(data)
+                record['incremental'] = changes is not None
+            with self._lock:
+                previous = self._snapshots.get(dataset)
+                self._errors.pop(dataset, None)
+                if previous is not None and changes is not None and changes.added.empty and changes.removed.empty:
+                    # Nada mudou na origem: a versão atual continua valendo (e os resultados em
+                    # cache por versão também); só o horário da consulta é renovado
+                    previous.fetched_at = time.time()
+                else:
+                    version = previous.version + 1 if previous else 1
+                    snapshot = Snapshot(data, version, time.time(), previous=previous, changes=changes)
+                    self._snapshots[dataset] = snapshot
+            if snapshot is None:
+                logger.info("Dataset %s sem alterações desde a versão %s", dataset, previous.version)
+            else:
+                logger.info("Dataset %s atualizado para a versão %s em %.1fs", dataset, snapshot.version, time.time() - started)
+        except Exception as error:
+            # Mantém o último snapshot bom; a próxima leitura expirada tenta de novo
+            logger.exception("Falha ao atualizar o dataset %s", dataset)
+            with self._lock:
+                self._errors[dataset] = error
+        finally:
+            with self._lock:
+                del self._inflight[dataset]
+            event.set()
+        # Grava no disco depois de liberar quem estava esperando a consulta
+        if snapshot is not None and self.disk_cache is not None:
+            try:
+                self.disk_cache.save(dataset, snapshot)
+            except Exception:
+                logger.exception("Falha ao gravar o snapshot em disco do dataset %s", dataset)
+
+
+def _arrow_strings(arrow_type):
+    # Strings continuam no buffer Arrow do arquivo, sem virar objetos Python por processo
+    if arrow_type == pa.string():
+        return pd.ArrowDtype(pa.string())
+    return None
+
+
+def upsert(snapshot, delta, keys):
+    # Substitui as linhas do snapshot com a mesma chave natural e acrescenta as novas.
+    # O snapshot original não é alterado, pois pode estar sendo lido por outras sessões.
+    # Devolve o novo snapshot e as Changes (linhas substituídas e linhas novas).
+    delta = delta.drop_duplicates(subset=keys, keep='last')
+    replaced = pd.MultiIndex.from_frame(snapshot[keys]).isin(pd.MultiIndex.from_frame(delta[keys]))
+    # A marca d'água é inclusiva: as linhas que voltam iguais às do snapshot não são alterações
+    unchanged = pd.util.hash_pandas_object(delta, index=False).isin(
+        pd.util.hash_pandas_object(snapshot.loc[replaced, delta.columns], index=False))
+    if unchanged.any():
+        delta = delta[~unchanged.to_numpy()]
+        replaced = pd.MultiIndex.from_frame(snapshot[keys]).isin(pd.MultiIndex.from_frame(delta[keys]))
+    if delta.empty:
+        return snapshot, Changes(snapshot.iloc[0:0], delta)
+    merged = pd.concat([snapshot[~replaced], delta], ignore_index=True)
+    # concat de categorias diferentes vira object; refaz as colunas category do snapshot
+    categories = {column: merged[column].astype('category') for column in snapshot.select_dtypes('category').columns
+                  if merged[column].dtype != 'category'}
+    if categories:
+        merged = merged.assign(**categories)
+    return merged, Changes(snapshot[replaced], delta)
+
+
+class IncrementalLoader:
+    # Loader para o DatasetStore que mantém o snapshot local da tabela e, nas atualizações,
+    # busca apenas as linhas a partir da marca d'água (maior data já carregada).
+    # fetch(start_date) deve devolver as linhas com data >= start_date, ou a tabela inteira
+    # quando start_date for None. Uma recarga completa periódica remove linhas apagadas na origem.
+    def __init__(self, dataset, fetch, full_reload_interval=6 * 3600):
+        self.dataset = dataset
+        self.fetch = fetch
+        self.full_reload_interval = full_reload_interval
+        self.spec = TABLES[dataset]
+        self.snapshot = None
+        self.watermark = None
+        self.last_full_reload = None
+        self.last_changes = None
+
+    def __call__(self):
+        if self.snapshot is None or self.watermark is None or time.time() - self.last_full_reload > self.full_reload_interval:
+            data = self.fetch(None)
+            self.last_full_reload = time.time()
+            self.last_changes = None
+        else:
+            # Busca a partir da própria marca d'água (inclusive) para não perder linhas
+            # do mesmo dia que chegaram depois da última carga; o upsert remove duplicadas
+            delta = self.fetch(self.watermark)
+            logger.info("Dataset %s: %s linhas novas desde %s", self.dataset, len(delta), self.watermark)
+            data, self.last_changes = upsert(self.snapshot, delta, self.spec['keys'])
+        self.snapshot = data
+        self.watermark = self._watermark(data)
+        return data
+
+    def restore(self, data):
+        # Retoma a partir de um snapshot salvo em disco; a próxima carga já é incremental
+        self.snapshot = data
+        self.watermark = self._watermark(data)
+        self.last_full_reload = time.time()
+        self.last_changes = None
+
+    def _watermark(self, df):
+        column = df[self.spec['date_column']]
+        if self.spec['date_format']:
+            column = pd.to_datetime(column, format=self.spec['date_format'])
+        watermark = pd.to_datetime(column).max()
+        return None if pd.isna(watermark) else watermark.date()
+
+
+class DiskSnapshotCache:
+    # Snapshots dos datasets em Arrow IPC no disco local. O manifesto <dataset>.json guarda a
+    # versão, o horário da consulta e o arquivo de dados atual; cada versão é gravada em um
+    # arquivo próprio e o manifesto é trocado de forma atômica, então um leitor nunca vê um
+    # arquivo pela metade. A leitura usa memory map em vez de ler o arquivo inteiro.
+    # Snapshots gravados com outro schema_version (tipagem diferente) são ignorados.
+    # Os valores derivados já calculados (índices, cubos, resumos; ver prewarm.py) vão junto em
+    # um pickle da mesma versão, para o processo restaurado não precisar recalculá-los.
+    # Com shared=True a leitura evita cópias: números e datas apontam direto para o arquivo
+    # mapeado e as strings ficam em colunas Arrow (pd.ArrowDtype), então várias réplicas do app
+    # lendo o mesmo arquivo dividem as mesmas páginas do cache do sistema operacional.
+    def __init__(self, directory, schema_version=None, shared=False):
+        self.directory = directory
+        self.schema_version = schema_version
+        self.shared = shared
+        os.makedirs(directory, exist_ok=True)
+
+    def _manifest_path(self, dataset):
+        return os.path.join(self.directory, f"{dataset}.json")
+
+    def manifest(self, dataset):
+        try:
+            with open(self._manifest_path(dataset)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def load(self, dataset):
+        # O publicador pode trocar a versão e apagar o arquivo entre a leitura do manifesto e a
+        # abertura do arquivo; nesse caso o manifesto é lido de novo
+        for attempt in range(3):
+            manifest = self.manifest(dataset)
+            if manifest is None or manifest.get('schema_version') != self.schema_version:
+                return None
+            try:
+                source = pa.memory_map(os.path.join(self.directory, manifest['file']))
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+        table = pa.ipc.open_file(source).read_all()
+        if self.shared:
+            data = table.to_pandas(split_blocks=True, types_mapper=_arrow_strings)
+        else:
+            data = table.to_pandas()
+        snapshot = Snapshot(data, manifest['version'], manifest['fetched_at'])
+        if manifest.get('derived'):
+            try:
+                with open(os.path.join(self.directory, manifest['derived']), 'rb') as file:
+                    snapshot.derived.update(pickle.load(file))
+            except Exception:
+                # Derivados de outra versão do código: são recalculados quando pedidos
+                logger.exception("Derivados em disco do dataset %s ignorados", dataset)
+        return snapshot
+
+    def save(self, dataset, snapshot):
+        previous = self.manifest(dataset)
+        file_name = f"{dataset}-{snapshot.version}-{int(snapshot.fetched_at)}.arrow"
+        path = os.path.join(self.directory, file_name)
+        table = pa.Table.from_pandas(snapshot.data, preserve_index=False)
+        with pa.OSFile(path + '.tmp', 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(path + '.tmp', path)
+        derived_name = None
+        if snapshot.derived:
+            derived_name = f"{dataset}-{snapshot.version}-{int(snapshot.fetched_at)}.derived.pkl"
+            derived_path = os.path.join(self.directory, derived_name)
+            with open(derived_path + '.tmp', 'wb') as file:
+                pickle.dump(dict(snapshot.derived), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(derived_path + '.tmp', derived_path)
+        manifest = {'dataset': dataset, 'version': snapshot.version, 'fetched_at': snapshot.fetched_at,
+                    'rows': len(snapshot.data), 'file': file_name, 'derived': derived_name, 'schema_version': self.schema_version}
+        manifest_path = self._manifest_path(dataset)
+        with open(manifest_path + '.tmp', 'w') as file:
+            json.dump(manifest, file)
+        os.replace(manifest_path + '.tmp', manifest_path)
+        # Processos que ainda mapeiam o arquivo antigo continuam lendo normalmente após a remoção
+        if previous is not None:
+            for key, current in (('file', file_name), ('derived', derived_name)):
+                if previous.get(key) and previous[key] != current:
+                    try:
+                        os.remove(os.path.join(self.directory, previous[key]))
+                    except FileNotFoundError:
+                        pass
@@ -0,0 +1,99 @@
+import threading
+from io import BytesIO
+
+import cachetools
+import pyarrow as pa
+
+from metrics import count_cache
+
+# Formatos oferecidos no download: rótulo, extensão e mime
+EXPORT_FORMATS = {
+    'xlsx': ('Excel', 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('CSV', 'csv', 'text/csv'),
+    'parquet': ('Parquet', 'parquet', 'application/octet-stream'),
+}
+
+# Linhas serializadas por vez; a memória extra da exportação fica limitada a um bloco
+CHUNK_ROWS = 50_000
+
+
+def _chunks(df, size=CHUNK_ROWS):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+
+def write_xlsx(df, output):
+    # O ExcelWriter do pandas escreve coluna por coluna e mantém todas as células em memória
+    # até o fim; aqui as linhas vão em ordem com constant_memory, e o xlsxwriter descarrega
+    # cada linha assim que passa para a próxima. Os escritores de xlsx e parquet são importados
+    # só no primeiro download do formato
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'remove_timezone': True,
+                                            'default_date_format': 'dd/mm/yyyy'})
+    worksheet = workbook.add_worksheet('Relatório')
+    header = workbook.add_format({'bold': True})
+    worksheet.write_row(0, 0, [str(column) for column in df.columns], header)
+    row = 1
+    for chunk in _chunks(df):
+        # Valores ausentes (NaN, NaT, None) viram células vazias
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for record in values.itertuples(index=False, name=None):
+            worksheet.write_row(row, 0, record)
+            row += 1
+    workbook.close()
+
+
+def write_csv(df, output):
+    # Separador ';', vírgula decimal e BOM, para abrir direto no Excel em português
+    for index, chunk in enumerate(_chunks(df)):
+        chunk.to_csv(output, sep=';', decimal=',', index=False, header=index == 0,
+                     encoding='utf-8-sig' if index == 0 else 'utf-8', date_format='%d/%m/%Y')
+    if len(df) == 0:
+        df.to_csv(output, sep=';', index=False, encoding='utf-8-sig')
+
+
+def write_parquet(df, output):
+    # Um row group por bloco, convertendo para Arrow só o bloco da vez
+    import pyarrow.parquet as pq
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(output, schema) as writer:
+        for chunk in _chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+WRITERS = {'xlsx': write_xlsx, 'csv': write_csv, 'parquet': write_parquet}
+
+
+class ExportService:
+    # Arquivos de download gerados sob demanda e compartilhados entre as sessões do processo.
+    # A chave deve identificar o conteúdo exportado (página, usuário, versão do dataset e
+    # filtros): enquanto a versão não muda, o mesmo relatório não é serializado de novo.
+    # O cache é um LRU limitado pelo total de bytes guardados.
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self._cache = cachetools.LRUCache(maxsize=max_bytes, getsizeof=len)
+        self._lock = threading.Lock()
+
+    def get(self, key, file_format):
+        if key is None:
+            return None
+        with self._lock:
+            data = self._cache.get((key, file_format))
+        if data is not None:
+            count_cache('exportação', True)
+        return data
+
+    def export(self, key, df, file_format):
+        data = self.get(key, file_format)
+        if data is not None:
+            return data
+        output = BytesIO()
+        WRITERS[file_format](df, output)
+        data = output.getvalue()
+        # Sem chave (versão desconhecida) o arquivo é gerado, mas não guardado
+        if key is not None:
+            count_cache('exportação', False)
+            with self._lock:
+                # Arquivos maiores que o orçamento inteiro não entram no cache
+                if len(data) <= self._cache.maxsize:
+                    self._cache[(key, file_format)] = data
+        return data
@@ -0,0 +1,52 @@
+from functools import partial
+
+from queries import TABLES
+from utils import contact_totals, commission_cube
+
+
+class SellerIndex:
+    # Posições das linhas de cada vendedor, montadas uma vez por versão do dataset,
+    # para que filtrar a carteira de um vendedor custe O(k) em vez de varrer a tabela
+    def __init__(self, df, column):
+        self.positions = df.groupby(column, observed=True, sort=False).indices
+
+    def rows(self, df, name):
+        positions = self.positions.get(name.upper())
+        if positions is None:
+            return df.iloc[0:0]
+        return df.iloc[positions]
+
+
+def seller_index_of(snapshot, dataset):
+    # Índice por vendedor do snapshot, montado uma vez por versão
+    column = TABLES[dataset]['seller_column']
+    return snapshot.derive(('seller_index', column), partial(SellerIndex, column=column))
+
+
+def seller_frame(snapshot, dataset, name):
+    # Linhas do vendedor a partir do índice do snapshot; a Gerência recebe a tabela inteira.
+    # Dados e índice vêm do mesmo snapshot, então nunca se misturam versões diferentes.
+    if name == 'Gerência':
+        return snapshot.data
+    return seller_index_of(snapshot, dataset).rows(snapshot.data, name)
+
+
+def contact_totals_of(snapshot):
+    # Totais de contatos do snapshot, calculados uma vez por versão
+    return snapshot.derive('contact_totals', contact_totals)
+
+
+def update_commission_cube(previous, df, changes):
+    # Atualização incremental do cubo de comissão: as baixas novas somam e as substituídas
+    # descontam, só nas células (vendedor, mês) tocadas. Células sem nenhuma baixa saem do cubo
+    if changes.added.empty and changes.removed.empty:
+        return previous
+    delta = commission_cube(changes.added).sub(commission_cube(changes.removed), fill_value=0)
+    cube = previous.add(delta, fill_value=0)
+    cube = cube[cube['baixas'] > 0]
+    return cube.astype({'baixas': 'int64'})
+
+
+def commission_cube_of(snapshot):
+    # Cubo vendedor × mês do snapshot de comissão, calculado uma vez por versão
+    return snapshot.derive('commission_cube', commission_cube, update=update_commission_cube)
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+# Incrementar ao mudar SCHEMAS, para que snapshots antigos salvos em disco sejam descartados
+SCHEMA_VERSION = 3
+
+# Tipos de cada dataset, aplicados uma única vez a cada carga do BigQuery:
+# datas (com o formato do texto de origem), identificadores como texto, inteiros
+# e colunas de poucos valores distintos guardadas como category. day_masks gera, para as
+# listas de dias do mês em texto ("1,15,28"), uma coluna inteira com um bit por dia, e
+# indicators gera colunas booleanas (coluna de origem == valor) para agregações vetorizadas
+SCHEMAS = {
+    'estoque': {
+        'dates': {'data_cotada': '%d/%m/%Y'},
+        'strings': ['n_da_nota'],
+        'integers': [],
+        'categories': ['vendedor', 'empresa'],
+        'day_masks': {},
+        'indicators': {},
+    },
+    'inadimplencia': {
+        'dates': {'data_de_vencimento': '%d/%m/%Y'},
+        'strings': ['numero_da_nota', 'codigo_parceiro'],
+        'integers': ['dias_vencidos'],
+        'categories': ['vendedor', 'tipo_de_titulo'],
+        'day_masks': {},
+        'indicators': {},
+    },
+    'contatos': {
+        'dates': {'ult_venda': '%d/%m/%Y', 'ult_tele': '%Y/%m/%d'},
+        'strings': ['codparc'],
+        'integers': [],
+        'categories': ['apelido', 'contactou_ou_nao', 'telemarketing_feito', 'cotacao_feita', 'venda_feita'],
+        'day_masks': {'dias_preferidos_cotar': 'dias_cotar_mask', 'dias_preferidos_pedido': 'dias_pedido_mask'},
+        'indicators': {
+            'contato_feito': ('contactou_ou_nao', 'Contato feito'),
+            'fez_telemarketing': ('telemarketing_feito', 'Entrou em contato esse mês'),
+            'cotou': ('cotacao_feita', 'Cotou esse mês'),
+            'vendeu': ('venda_feita', 'Vendeu esse mês'),
+        },
+    },
+    'comissao': {
+        'dates': {'dhbaixa': None},
+        'strings': ['nufin', 'numnota', 'codparc'],
+        'integers': [],
+        'categories': ['apelido'],
+        'day_masks': {},
+        'indicators': {},
+    },
+}
+
+def ingest(dataset, df):
+    # Devolve um novo DataFrame já tipado; as transformações dos relatórios não fazem mais conversões
+    schema = SCHEMAS[dataset]
+    columns = {}
+    for column, date_format in schema['dates'].items():
+        if column in df.columns:
+            columns[column] = pd.to_datetime(df[column], format=date_format)
+    for column in schema['strings']:
+        if column in df.columns:
+            columns[column] = df[column].astype(str)
+    for column in schema['integers']:
+        if column in df.columns:
+            columns[column] = df[column].astype(int)
+    for column in schema['categories']:
+        if column in df.columns:
+            columns[column] = df[column].astype('category')
+    for column, mask_column in schema['day_masks'].items():
+        if column in df.columns:
+            columns[mask_column] = day_mask(df[column])
+    for indicator, (column, value) in schema['indicators'].items():
+        if column in df.columns:
+            columns[indicator] = (df[column] == value).to_numpy()
+    return df.assign(**columns)
+
+def day_mask(series):
+    # "1,15,28" -> bits 0, 14 e 27 ligados (bit dia - 1); valores vazios ou inválidos ficam em 0.
+    # Assim, "quem tem o dia de hoje na lista" vira um único teste bit a bit vetorizado.
+    days = series.reset_index(drop=True).dropna().astype(str).str.split(',').explode()
+    days = pd.to_numeric(days.str.strip(), errors='coerce')
+    days = days[(days >= 1) & (days <= 31)]
+    # Dias repetidos na mesma linha não podem somar o mesmo bit duas vezes
+    pairs = pd.DataFrame({'row': days.index, 'bit': np.left_shift(1, days.to_numpy(dtype='int64') - 1)}).drop_duplicates()
+    bits = pairs.groupby('row')['bit'].sum()
+    mask = np.zeros(len(series), dtype='uint32')
+    mask[bits.index.to_numpy()] = bits.to_numpy()
+    return pd.Series(mask, index=series.index)
+
+def has_day(mask, day):
+    # Testa se o dia (1 a 31) está ligado em uma coluna gerada por day_mask
+    return (mask & np.uint32(1 << (day - 1))) != 0
@@ -0,0 +1,109 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger('metrics')
+
+try:
+    import resource
+except ImportError:
+    # Windows não tem o módulo resource; as medições ficam só com o tempo
+    resource = None
+
+
+def _rss_mb():
+    # Memória residente atual do processo (Linux); None onde /proc não existe
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except (OSError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss vem em KiB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Recorder:
+    # Medições de tempo e memória das etapas do app (fetch, transform, export, dataframe...),
+    # guardadas em um buffer circular do processo e emitidas como log JSON no logger "metrics".
+    # Também conta acertos e falhas dos caches, para a página de desempenho da Gerência.
+    def __init__(self, capacity=5000):
+        self.spans = deque(maxlen=capacity)
+        self.caches = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, **tags):
+        # Uso: with span('transform', page=..., role=...) as record: ...; record['rows_out'] = n
+        record = {'stage': stage, **tags}
+        rss = _rss_mb()
+        peak = _peak_rss_mb()
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            record['error'] = True
+            raise
+        finally:
+            record['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            if rss is not None:
+                record['rss_delta_mb'] = round(_rss_mb() - rss, 2)
+            if peak is not None:
+                record['peak_growth_mb'] = round(_peak_rss_mb() - peak, 2)
+            record['at'] = time.time()
+            self.spans.append(record)
+            logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def count(self, cache, hit):
+        with self._lock:
+            counters = self.caches.setdefault(cache, [0, 0])
+            counters[0 if hit else 1] += 1
+
+    def records(self):
+        return list(self.spans)
+
+    def cache_ratios(self):
+        with self._lock:
+            caches = {cache: tuple(counters) for cache, counters in self.caches.items()}
+        rows = [{'Cache': cache, 'Acertos': hits, 'Falhas': misses,
+                 'Taxa de acerto (%)': round(hits / (hits + misses) * 100, 1) if hits + misses else 0.0}
+                for cache, (hits, misses) in sorted(caches.items())]
+        return pd.DataFrame(rows, columns=['Cache', 'Acertos', 'Falhas', 'Taxa de acerto (%)'])
+
+
+def stage_summary(records):
+    # p50/p95 de latência por etapa e página, a partir dos registros do buffer
+    columns = ['Etapa', 'Página', 'Execuções', 'p50 (ms)', 'p95 (ms)', 'Máximo (ms)', 'Linhas (mediana)']
+    if not records:
+        return pd.DataFrame(columns=columns)
+    # Etapas fora das páginas (fetch) são agrupadas pelo dataset
+    df = pd.DataFrame({
+        'stage': [record['stage'] for record in records],
+        'page': [record.get('page') or record.get('dataset') or '-' for record in records],
+        'duration_ms': [record['duration_ms'] for record in records],
+        'linhas': [record.get('rows_out', record.get('rows')) for record in records],
+    })
+    df['linhas'] = pd.to_numeric(df['linhas'])
+    summary = df.groupby(['stage', 'page']).agg(
+        Execuções=('duration_ms', 'size'),
+        p50=('duration_ms', lambda values: values.quantile(0.5)),
+        p95=('duration_ms', lambda values: values.quantile(0.95)),
+        Máximo=('duration_ms', 'max'),
+        Linhas=('linhas', 'median'),
+        ).round(1).reset_index()
+    summary.columns = columns
+    return summary.sort_values('p95 (ms)', ascending=False)
+
+
+recorder = Recorder()
+span = recorder.span
+count_cache = recorder.count
@@ -1,37 +1,102 @@
 import streamlit as st
 from utils import transform_df_estoque, transform_df_inadimplencia, transform_df_contatos, transform_df_contatosagregados, transform_df_comissao, transform_df_comissao_agregado, transform_df_vendas
-from io import BytesIO
+from utils import summary_contatos, commission_of_month
+from export import ExportService, EXPORT_FORMATS
+from metrics import span, recorder, stage_summary
+from results import ResultCache, cache_key
+from paging import PAGE_SIZES, column_label, totals, page_count, sorted_page
 import pandas as pd
+import os
 
 from datetime import datetime
 
 today = datetime.now()
 
+@st.cache_resource
+def get_export_service():
+    # Um único cache de arquivos de download para o processo, compartilhado entre as sessões
+    return ExportService(max_bytes=256 * 1024 * 1024)
+
+@st.cache_resource
+def get_result_cache():
+    # Resultados dos filtros já calculados, compartilhados entre as sessões do processo
+    return ResultCache(max_bytes=int(os.environ.get('RESULT_CACHE_MB', 256)) * 1024 * 1024)
+
+def user_role(user_name):
+    # As medições guardam o perfil, não o nome de quem usou
+    return 'gerencia' if user_name == 'Gerência' else 'vendedor'
+
+# Chaves da sessão lidas pelos fragmentos: a página selecionada e a área de download dela
+CURRENT_PAGE = 'pagina_atual'
+CURRENT_DOWNLOAD = 'download_atual'
+
+# Os fragmentos não recebem a página por argumento: o Streamlit guarda a função registrada na
+# primeira execução do fragmento, com os argumentos daquela vez, e é ela que roda nos reruns
+# do fragmento. Cada execução completa (e cada rerun da página) deixa na sessão a página e os
+# dados atuais, e os fragmentos leem de lá.
+
+@st.fragment
+def render_current_page():
+    # Filtros, tabela e download da página selecionada. Uma mudança de filtro reexecuta só
+    # este trecho, sem login, store e construção das páginas no app.py
+    current = st.session_state[CURRENT_PAGE]
+    if current['data_versions'] is not None and current['data_versions']() != current['versions']:
+        # Saiu uma versão nova dos dados: a execução completa reconstrói a página com ela
+        st.rerun()
+    with span('render', page=current['name'], role=current['role']):
+        current['page'].show()
+
+@st.fragment
+def render_download_area():
+    # Trocar o formato ou gerar o arquivo reexecuta só a área de download, sem refazer a tabela
+    page, df, file_prefix, filters = st.session_state[CURRENT_DOWNLOAD]
+    page.show_download_area(df, file_prefix, filters)
+
 class PageManager:
-    def __init__(self, start_date, end_date, user_name):
+    def __init__(self, start_date, end_date, user_name, data_versions=None):
         self.pages = {}
+        self.descriptions = {}
         self.start_date = start_date
         self.end_date = end_date
         self.user_name = user_name
+        # Função que devolve as versões atuais dos datasets; nos reruns do fragmento, uma versão
+        # diferente da usada para construir a página provoca uma execução completa
+        self.data_versions = data_versions
 
-    def add_page(self, name, page, allowed_users=None):
+    def add_page(self, name, page_factory, allowed_users=None, description=None):
+        # Guarda apenas a fábrica da página; ela só é construída quando for selecionada em render()
         if allowed_users is None or self.user_name in allowed_users:
-            self.pages[name] = page
+            self.pages[name] = page_factory
+            self.descriptions[name] = description
+
+    def get_description(self, page_name):
+        # A descrição do card vem de um resumo barato, sem construir a página
+        description = self.descriptions.get(page_name)
+        if callable(description):
+            with span('summary', page=page_name, role=user_role(self.user_name)):
+                return description()
+        return description or ""
 
     def render(self, page_name):
-        page = self.pages.get(page_name)
-        if page:
-            page.render()
+        page_factory = self.pages.get(page_name)
+        if page_factory:
+            st.session_state[CURRENT_PAGE] = {'name': page_name, 'page': page_factory(), 'role': user_role(self.user_name),
+                                              'data_versions': self.data_versions,
+                                              'versions': self.data_versions() if self.data_versions else None}
+            render_current_page()
         else:
             st.error(f"Página '{page_name}' não encontrada ou você não tem permissão para acessá-la.")
 
 class BasePage:
-    def __init__(self, title, start_date, end_date, user_name, description = ""):
+    def __init__(self, title, start_date, end_date, user_name, description = "", data_version=None):
         self.title = title
         self.start_date = start_date
         self.end_date = end_date
         self.user_name = user_name
         self.description = description
+        # Versão do snapshot de onde vieram os dados; identifica o arquivo no cache de download
+        self.data_version = data_version
+        self._filters = None
 
     def get_description(self):
         # Personalize a descrição com o nome do usuário
@@ -40,82 +105,143 @@ class BasePage:
     def render(self):
         raise NotImplementedError("Subclasses should implement this method.")
 
+    def show(self):
+        # Desenha a página dentro do fragmento (render_current_page)
+        self._filters = None
+        st.title(self.title)
+        self.render()
+
+    def filters(self):
+        # Os filtros ficam em um bloco no topo da página, criado no primeiro filtro, e não na
+        # barra lateral: um fragmento só desenha widgets dentro dele mesmo
+        if self._filters is None:
+            self._filters = st.expander("Filtros", expanded=True)
+        return self._filters
+
     def filter_dates(self):
-        return st.sidebar.date_input(label="Período", value=[self.start_date, self.end_date])
+        return self.filters().date_input(label="Período", value=[self.start_date, self.end_date])
     
     def select_box(self, label, options, placeholder):
-        return st.sidebar.selectbox(label = label, options = (options), index=None, placeholder = placeholder)
+        return self.filters().selectbox(label = label, options = (options), index=None, placeholder = placeholder)
 
     def checkbox(self, label, value):
-        return st.sidebar.checkbox(label = label, value = value)
+        return self.filters().checkbox(label = label, value = value)
+
+    def span(self, stage, **tags):
+        return span(stage, page=self.title, role=user_role(self.user_name), **tags)
+
+    def transform(self, transform, df, *args, **kwargs):
+        # Executa um transform_df_* medindo tempo, memória e linhas de entrada e saída. Com a
+        # versão dos dados conhecida, o resultado vem do cache quando os mesmos filtros já
+        # foram calculados para esta página e usuário
+        with self.span('transform', function=transform.__name__, rows_in=len(df)) as record:
+            if self.data_version is None:
+                result = transform(df, *args, **kwargs)
+            else:
+                key = cache_key(self.title, self.data_version, self.user_name, transform.__name__, args, kwargs)
+                result = get_result_cache().get_or_compute(key, lambda: transform(df, *args, **kwargs))
+            record['rows_out'] = len(result)
+        return result
+
+    def show_dataframe(self, df, **kwargs):
+        # As tabelas da Gerência trazem todos os vendedores; acima de uma página, vão paginadas
+        if self.user_name == 'Gerência' and len(df) > PAGE_SIZES[0]:
+            return self.paged_dataframe(df, **kwargs)
+        # A serialização do DataFrame para o navegador acontece dentro do st.dataframe
+        with self.span('dataframe', rows_out=len(df)):
+            st.dataframe(df, **kwargs)
+
+    def paged_dataframe(self, df, **kwargs):
+        # Ordenação e paginação no servidor (paging.py): o navegador recebe só a página atual,
+        # e os totais são calculados sobre a tabela filtrada inteira
+        column_config = kwargs.get('column_config')
+        rows, sums = totals(df, column_config)
+        sort_col, order_col, size_col, page_col = st.columns(4)
+        sort_column = sort_col.selectbox("Ordenar por", options=list(df.columns), index=None, placeholder="Ordem original",
+                                         format_func=lambda column: column_label(column, column_config), key=f"ordenar_{self.title}")
+        ascending = order_col.selectbox("Ordem", options=[True, False], format_func=lambda value: "Crescente" if value else "Decrescente",
+                                        key=f"ordem_{self.title}")
+        page_size = size_col.selectbox("Linhas por página", options=PAGE_SIZES, key=f"linhas_{self.title}")
+        pages = page_count(rows, page_size)
+        # O limite faz parte do widget: quando um filtro ou o tamanho da página muda o número de
+        # páginas, a tabela volta para a primeira página
+        page = page_col.number_input(f"Página (de {pages})", min_value=1, max_value=pages, step=1, key=f"pagina_{self.title}")
+        summary = [f"{rows} linhas"] + [f"{label}: R$ " + f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                                        for label, value in sums.items()]
+        st.caption(" · ".join(summary))
+        with self.span('dataframe', rows_total=rows) as record:
+            df_page = sorted_page(df, page, page_size, sort_column, ascending)
+            record['rows_out'] = len(df_page)
+            st.dataframe(df_page, **kwargs)
+
+    def download_area(self, df, file_prefix, filters=()):
+        # A área de download é um fragmento dentro da página (render_download_area)
+        st.session_state[CURRENT_DOWNLOAD] = (self, df, file_prefix, filters)
+        render_download_area()
+
+    def show_download_area(self, df, file_prefix, filters):
+        # O arquivo só é gerado quando o usuário pede, e não a cada rerun. Depois de gerado,
+        # fica no cache compartilhado pela versão dos dados e pelos filtros da tela
+        export_service = get_export_service()
+        file_format = st.selectbox("Formato do relatório", options=list(EXPORT_FORMATS),
+                                   format_func=lambda key: EXPORT_FORMATS[key][0], key=f"formato_{file_prefix}")
+        label, extension, mime = EXPORT_FORMATS[file_format]
+        key = None if self.data_version is None else (file_prefix, self.user_name, self.data_version, filters)
+        data = export_service.get(key, file_format)
+        if data is None and st.button(f"Gerar relatório em {label}", key=f"gerar_{file_prefix}"):
+            with self.span('export', format=file_format, rows_out=len(df)) as record:
+                data = export_service.export(key, df, file_format)
+                record['bytes'] = len(data)
+        if data is not None:
+            st.download_button(
+                label=f"Baixar relatório em {label}",
+                data=data,
+                file_name=f'{file_prefix}{today.year}{today.month}{today.day}.{extension}',
+                mime=mime
+            )
     
     
 class Relatorio_Estoque_Page(BasePage):
-    def __init__(self, df, start_date, end_date, user_name):
+    def __init__(self, df, start_date, end_date, user_name, data_version=None):
         self.original_df = df
-        self.df = transform_df_estoque(df, start_date=start_date, end_date=end_date, name=user_name)
-        num_cotacoes = len(self.df)
-        description = (f"Você tem {num_cotacoes} cotações com falta de estoque nos últimos 30 dias.")
-        super().__init__("Cotações com falta de Estoque", start_date, end_date, user_name, description=description)
-        
+        super().__init__("Cotações com falta de Estoque", start_date, end_date, user_name, data_version=data_version)
 
-    def to_excel(self, df):
-        # Criando um buffer de Bytes para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Relatório')
-        # Movendo o cursor para o início do buffer
-        output.seek(0)
-        return output
+    @staticmethod
+    def describe(summary):
+        # summary: métricas do usuário na tabela de resumo do snapshot (summaries.py)
+        return f"Você tem {summary['cotacoes']} cotações com falta de estoque nos últimos 30 dias."
 
     def render(self):
         start_date, end_date = self.filter_dates()
-        df_filtered = transform_df_estoque(self.original_df, start_date=start_date, end_date=end_date, name=self.user_name)
-        excel_data = self.to_excel(df_filtered)
-        st.title(self.title)
+        df_filtered = self.transform(transform_df_estoque, self.original_df, start_date=start_date, end_date=end_date, name=self.user_name)
         if self.user_name == 'Gerência':
             st.write("Abaixo está o relatório de estoque em nível gerencial:")
         else:
             st.write(f"Abaixo está o relatório de estoque para o(a) vendedor(a) {self.user_name}:")
-        st.dataframe(df_filtered, 
+        self.show_dataframe(df_filtered, 
                      column_config={
                         "Data Cotada": st.column_config.DateColumn(label="Data Cotada", format="DD/MM/YYYY"),
                         "Valor da Nota": st.column_config.NumberColumn(label="Valor da Nota", format="R$ %.0f")                            
                      },
                     hide_index=True)
-        st.download_button(
-            label="Baixar relatório em Excel",
-            data=excel_data,
-            file_name=f'relatorio_estoque{today.year}{today.month}{today.day}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        self.download_area(df_filtered, 'relatorio_estoque', filters=(start_date, end_date))
           
 class Relatorio_Inadimplencia_Page(BasePage):
-    def __init__(self, df, start_date, end_date, user_name, checkbox_90_days):
+    def __init__(self, df, start_date, end_date, user_name, checkbox_90_days, data_version=None):
         self.original_df = df
-        self.df = transform_df_inadimplencia(df, start_date=start_date, end_date=end_date, name=user_name, checkbox_90_days=False)
-        total_valor = round(self.df['Valor da Parcela'].sum(), 2)
-        total_valor_formatted = f"{total_valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        description = f"Você tem um total de {len(self.df)} notas inadimplentes, com um valor total de {total_valor_formatted} R$."
-        super().__init__("Relatório de Inadimplência", start_date, end_date, user_name, description=description)
-        
+        super().__init__("Relatório de Inadimplência", start_date, end_date, user_name, data_version=data_version)
 
-    def to_excel(self, df):
-        # Criando um buffer de Bytes para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Relatório')
-        # Movendo o cursor para o início do buffer
-        output.seek(0)
-        return output
+    @staticmethod
+    def describe(summary):
+        num_notas, total_valor = summary['notas'], summary['valor']
+        total_valor_formatted = f"{round(total_valor, 2):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        return f"Você tem um total de {num_notas} notas inadimplentes, com um valor total de {total_valor_formatted} R$."
 
     def render(self):
         start_date, end_date = self.filter_dates()
         checkbox_90_days = self.checkbox(label = 'Últimos 90 dias e fora do Serasa', value = False)
-        df_transformed = transform_df_inadimplencia(self.original_df, start_date, end_date, self.user_name, checkbox_90_days)
+        df_transformed = self.transform(transform_df_inadimplencia, self.original_df, start_date, end_date, self.user_name, checkbox_90_days)
         
-        excel_data = self.to_excel(df_transformed)
-        st.title(self.title)
         total_valor = round(df_transformed['Valor da Parcela'].sum(), 2)
         
         total_valor_formatted = f"{total_valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
@@ -124,51 +250,34 @@ class Relatorio_Inadimplencia_Page(BasePage):
         else:
             st.write(f"Abaixo está o relatório de inadimplência para a vendedora {self.user_name}:")
             st.write(f"Você tem um total de {len(df_transformed)} notas inadimplentes, com um valor total de {total_valor_formatted} R$.")
-        st.dataframe(df_transformed, 
+        self.show_dataframe(df_transformed, 
                      column_config={
                          "Data de Vencimento" : st.column_config.DateColumn(label="Data de Vencimento", format="DD/MM/YYYY"),
                          "Valor da Parcela": st.column_config.NumberColumn(label="Valor da Parcela", format="R$ %.0f")
                      },
                      hide_index=True)
-        st.download_button(
-            label="Baixar relatório em Excel",
-            data=excel_data,
-            file_name=f'relatorio_inadimplencia{today.year}{today.month}{today.day}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        self.download_area(df_transformed, 'relatorio_inadimplencia', filters=(start_date, end_date, checkbox_90_days))
 
 class Relatorio_Contatos_Page(BasePage):
-    def __init__(self, df, user_name):
+    def __init__(self, df, user_name, data_version=None):
         self.original_df = df
-        self.user_name = user_name
-        self.df = transform_df_contatos(df, name=user_name,selectbox_vendedor=False, selectbox_venda=False, selectbox_cotacao=False, selectbox_telemarketing=False )
-        if user_name != "Gerência":
-            contatos = round((len(self.original_df[(self.original_df['apelido'] == self.user_name.upper()) & (self.original_df['contactou_ou_nao'] == 'Contato feito')]))/(len(self.original_df[self.original_df['apelido'] == self.user_name.upper()])) * 100, 2)
-        else:
-            contatos = 'Vou ver depois'
-        description = f"Você contactou {contatos}% dos parceiros este mês. "
-        super().__init__("Relatório de Contatos", None, None, user_name, description=description)
-        
+        super().__init__("Relatório de Contatos", None, None, user_name, data_version=data_version)
 
-    def to_excel(self, df):
-        # Criando um buffer de Bytes para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Relatório')
-        # Movendo o cursor para o início do buffer
-        output.seek(0)
-        return output
+    @staticmethod
+    def describe(summary, user_name):
+        if user_name == "Gerência":
+            return f"A equipe contactou {summary['porcentagem']}% dos parceiros este mês. "
+        return f"Você contactou {summary['porcentagem']}% dos parceiros este mês. "
 
     def render(self):
-        st.title(self.title)
         if self.user_name == 'Gerência':
             st.write(f"Abaixo está o relatório de contatos em nível gerencial:")
 
             # Filtros para o usuário "Gerência"
-            selectbox_vendedor = self.select_box(label="Escolha um vendedor", options=self.df['apelido'].unique(), placeholder="Selecione o vendedor")
-            selectbox_telemarketing = self.select_box(label="Telemarketing?", options=self.df['telemarketing_feito'].unique(), placeholder="Selecione se houve telemarketing")
-            selectbox_cotacao = self.select_box(label="Cotou?", options=self.df['cotacao_feita'].unique(), placeholder="Selecione se houve cotação")
-            selectbox_venda = self.select_box(label="Vendeu?", options=self.df['venda_feita'].unique(), placeholder="Selecione se houve venda")
+            selectbox_vendedor = self.select_box(label="Escolha um vendedor", options=self.original_df['apelido'].unique(), placeholder="Selecione o vendedor")
+            selectbox_telemarketing = self.select_box(label="Telemarketing?", options=self.original_df['telemarketing_feito'].unique(), placeholder="Selecione se houve telemarketing")
+            selectbox_cotacao = self.select_box(label="Cotou?", options=self.original_df['cotacao_feita'].unique(), placeholder="Selecione se houve cotação")
+            selectbox_venda = self.select_box(label="Vendeu?", options=self.original_df['venda_feita'].unique(), placeholder="Selecione se houve venda")
         else:
             st.write(f"Abaixo está o relatório de contatos para a vendedora {self.user_name}:")
             selectbox_vendedor = None
@@ -176,16 +285,16 @@ class Relatorio_Contatos_Page(BasePage):
             selectbox_cotacao = None
             selectbox_venda = None
             # Adiciona o cálculo de métricas se o usuário não for "Gerência"
-            if round((len(self.original_df[(self.original_df['apelido'] == self.user_name.upper()) & (self.original_df['contactou_ou_nao'] == 'Contato feito')]))/(len(self.original_df[self.original_df['apelido'] == self.user_name.upper()])) * 100, 2) == 100:
+            contatos = summary_contatos(self.original_df, name=self.user_name)
+            if contatos == 100:
                 st.metric(label="", value="Parabéns, meta batida!")
             else:
-                st.metric(label="Contatos Feitos, em %", value=f"{round((len(self.original_df[(self.original_df['apelido'] == self.user_name.upper()) & (self.original_df['contactou_ou_nao'] == 'Contato feito')]))/(len(self.original_df[self.original_df['apelido'] == self.user_name.upper()])) * 100, 2)} %")
+                st.metric(label="Contatos Feitos, em %", value=f"{contatos} %")
         # Transforma o dataframe usando os filtros (se existirem)
-        df_transformed = transform_df_contatos(self.original_df, self.user_name, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda)
+        df_transformed = self.transform(transform_df_contatos, self.original_df, self.user_name, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda)
         
-        excel_data = self.to_excel(df_transformed)
         
-        st.dataframe(df_transformed,
+        self.show_dataframe(df_transformed,
                      column_config={
                          "ult_tele": st.column_config.DateColumn(label="Último Telemarketing", format="DD/MM/YYYY"),
                          "ult_cotacao": st.column_config.DateColumn(label="Última Cotação", format="DD/MM/YYYY"),
@@ -194,80 +303,67 @@ class Relatorio_Contatos_Page(BasePage):
                          "nomeparc": st.column_config.TextColumn(label="Nome do Parceiro"),
                      },
                      hide_index=True)
-        st.download_button(
-            label="Baixar relatório em Excel",
-            data=excel_data,
-            file_name=f'relatorio_contatos{today.year}{today.month}{today.day}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        self.download_area(df_transformed, 'relatorio_contatos', filters=(selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda))
         
 class Relatorio_ContatosAgregados_Page(BasePage):
-    def __init__(self, df, user_name):
-        super().__init__("Relatório de Contatos - Agregado", None, None, user_name)
+    def __init__(self, df, user_name, totals=None, data_version=None):
+        super().__init__("Relatório de Contatos - Agregado", None, None, user_name, data_version=data_version)
         self.df = df
-
-    def to_excel(self, df):
-        # Criando um buffer de Bytes para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Relatório')
-        # Movendo o cursor para o início do buffer
-        output.seek(0)
-        return output
+        self.totals = totals
 
     def render(self):
-        df_transformed = transform_df_contatosagregados(self.df, self.user_name)
-        st.title(self.title)
+        df_transformed = self.transform(transform_df_contatosagregados, self.df, self.user_name, totals=self.totals)
         if self.user_name == 'Gerência':
             st.write(f"Abaixo está o relatório de contatos agregados em nível gerencial:")
         else:
             st.write(f"Abaixo está o relatório de contatos agregados para a vendedora {self.user_name}:")
-        st.dataframe(df_transformed,
+        self.show_dataframe(df_transformed,
                      hide_index=True)
         
-        excel_data = self.to_excel(df_transformed)
         
-        st.download_button(
-            label="Baixar relatório em Excel",
-            data=excel_data,
-            file_name=f'relatorio_contatos_agregados{today.year}{today.month}{today.day}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        self.download_area(df_transformed, 'relatorio_contatos_agregados', filters=())
         
 class Relatorio_Comissao_Page(BasePage):
-    def __init__(self, df, user_name, start_date, end_date):
-        super().__init__("Relatório de Comissão", start_date, end_date, user_name)
+    def __init__(self, df, user_name, start_date, end_date, month_start, cube=None, data_version=None):
+        super().__init__("Relatório de Comissão", start_date, end_date, user_name, data_version=data_version)
         self.df = df
+        # Primeiro dia do mês vigente, calculado a cada execução do app
+        self.month_start = month_start
+        # Cubo vendedor × mês do snapshot (indexes.commission_cube_of)
+        self.cube = cube
 
-    def to_excel(self, df):
-        # Criando um buffer de Bytes para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Relatório')
-        # Movendo o cursor para o início do buffer
-        output.seek(0)
-        return output
+    @staticmethod
+    def describe(total_mes, user_name):
+        total_formatted = f"{total_mes:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        if user_name == 'Gerência':
+            return f"A equipe tem {total_formatted} R$ em comissões no mês vigente."
+        return f"Você tem {total_formatted} R$ em comissões no mês vigente."
 
     def render(self):
         start_date, end_date = self.filter_dates()
         mes_vigente = self.checkbox(label="Mês Vigente", value = True)
-        st.title(self.title)
         
         selectbox_vendedor = None
+        if self.user_name == 'Gerência':
+            # O vendedor é escolhido antes da transformação, para o filtro valer já neste rerun
+            selectbox_vendedor = self.select_box(label="Escolha um vendedor", options=self.df['apelido'].unique(), placeholder="Selecione o vendedor")
         
-        df_transformed = transform_df_comissao(self.df, self.user_name, start_date, end_date, mes_vigente, selectbox_vendedor)
+        df_transformed = self.transform(transform_df_comissao, self.df, self.user_name, start_date, end_date, mes_vigente, selectbox_vendedor, self.month_start)
         # df_transformed['Comissão'] = df_transformed['Comissão'].str.replace('.', '').str.replace(',', '.').astype(float)
         total_valor = df_transformed['Comissão'].sum()
         total_valor_formatted = f"{total_valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
         if self.user_name == 'Gerência':
-            selectbox_vendedor = self.select_box(label="Escolha um vendedor", options=self.df['apelido'].unique(), placeholder="Selecione o vendedor")
             st.write(f"Abaixo está o relatório de comissão em nível gerencial:")
         else:
             st.write(f"Abaixo está o relatório de comissão para a vendedora {self.user_name}:")
             st.write(f"No período selecionado, você tem comissões que totalizam o valor de {total_valor_formatted} R$.")
+        if mes_vigente and self.cube is not None:
+            # O total do mês vigente é um recorte do cubo, sem somar as linhas de novo
+            total_mes = commission_of_month(self.cube, selectbox_vendedor or self.user_name, self.month_start)
+            st.metric(label="Comissão do mês vigente", value="R$ " + f"{total_mes:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
             
             
-        st.dataframe(df_transformed,
+        self.show_dataframe(df_transformed,
                      column_config={
                          "Data Faturada" : st.column_config.DateColumn(label="Data Faturada", format="DD/MM/YYYY"),
                          "Data de Vencimento" : st.column_config.DateColumn(label="Data de Vencimento", format="DD/MM/YYYY"),
@@ -277,76 +373,54 @@ class Relatorio_Comissao_Page(BasePage):
                      },
                      hide_index=True)
         
-        excel_data = self.to_excel(df_transformed)
         
-        st.download_button(
-            label="Baixar relatório em Excel",
-            data=excel_data,
-            file_name=f'relatorio_comissao{today.year}{today.month}{today.day}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        self.download_area(df_transformed, 'relatorio_comissao', filters=(start_date, end_date, mes_vigente, selectbox_vendedor, self.month_start))
             
 class Relatorio_ComissaoAgregados_Page(BasePage):
-    def __init__(self, df, user_name):
-        super().__init__("Relatório de Comissão - Agregado", None, None, user_name)
+    def __init__(self, df, user_name, window_start, cube=None, data_version=None):
+        super().__init__("Relatório de Comissão - Agregado", None, None, user_name, data_version=data_version)
         self.df = df
-
-    def to_excel(self, df):
-        # Criando um buffer de Bytes para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Relatório')
-        # Movendo o cursor para o início do buffer
-        output.seek(0)
-        return output
+        # Primeiro mês da janela de 6 meses
+        self.window_start = window_start
+        self.cube = cube
 
     def render(self):
-        df_transformed = transform_df_comissao_agregado(self.df, self.user_name)
-        st.title(self.title)
+        # Com o cubo do snapshot, a janela de 6 meses é um recorte e não um novo agrupamento
+        df_transformed = self.transform(transform_df_comissao_agregado, self.df, self.user_name, self.window_start, cube=self.cube)
+        # O vendedor vem no índice do pivot; vira coluna para aparecer também no arquivo baixado,
+        # que só grava as colunas
+        df_transformed = df_transformed.reset_index().rename(columns={'apelido': 'Vendedor'})
         # if self.user_name == 'Gerência':
         #     st.write(f"Abaixo está o relatório de contatos agregados em nível gerencial:")
         # else:
         #     st.write(f"Abaixo está o relatório de contatos agregados para a vendedora {self.user_name}:")
-        st.dataframe(df_transformed)
+        self.show_dataframe(df_transformed, hide_index=True)
         
-        excel_data = self.to_excel(df_transformed)
         
-        st.download_button(
-            label="Baixar relatório em Excel",
-            data=excel_data,
-            file_name=f'relatorio_comissao_agregados{today.year}{today.month}{today.day}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        self.download_area(df_transformed, 'relatorio_comissao_agregados', filters=(self.window_start,))
 
 class Relatorio_Vendas_Page(BasePage):
-    def __init__(self, df, user_name):
+    def __init__(self, df, user_name, day, data_version=None):
         self.original_df = df
-        self.df = transform_df_vendas(df, name=user_name,selectbox_vendedor=False, selectbox_venda=False, selectbox_cotacao=False, selectbox_telemarketing=False, melhor_dia=True) 
-        parceiros_hoje = len(self.df)
-        description = f"Você tem {parceiros_hoje} parceiros para entrar em contato hoje."
-        super().__init__("Relatório de Vendas", None, None, user_name, description=description)
-        
+        # Dia do mês do filtro "Melhor Dia para Contato", o mesmo da janela do card
+        self.day = day
+        super().__init__("Relatório de Vendas", None, None, user_name, data_version=data_version)
 
-    def to_excel(self, df):
-        # Criando um buffer de Bytes para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Relatório')
-        # Movendo o cursor para o início do buffer
-        output.seek(0)
-        return output
+    @staticmethod
+    def describe(summary):
+        parceiros_hoje = summary['ligar_hoje']
+        return f"Você tem {parceiros_hoje} parceiros para entrar em contato hoje."
 
     def render(self):
-        st.title(self.title)
         melhor_dia = self.checkbox(label="Melhor Dia para Contato", value = True)
         if self.user_name == 'Gerência':
             st.write(f"Abaixo está o relatório de vendas em nível gerencial:")
 
             # Filtros para o usuário "Gerência"
-            selectbox_vendedor = self.select_box(label="Escolha um vendedor", options=self.df['apelido'].unique(), placeholder="Selecione o vendedor")
-            selectbox_telemarketing = self.select_box(label="Telemarketing?", options=self.df['telemarketing_feito'].unique(), placeholder="Selecione se houve telemarketing")
-            selectbox_cotacao = self.select_box(label="Cotou?", options=self.df['cotacao_feita'].unique(), placeholder="Selecione se houve cotação")
-            selectbox_venda = self.select_box(label="Vendeu?", options=self.df['venda_feita'].unique(), placeholder="Selecione se houve venda")
+            selectbox_vendedor = self.select_box(label="Escolha um vendedor", options=self.original_df['apelido'].unique(), placeholder="Selecione o vendedor")
+            selectbox_telemarketing = self.select_box(label="Telemarketing?", options=self.original_df['telemarketing_feito'].unique(), placeholder="Selecione se houve telemarketing")
+            selectbox_cotacao = self.select_box(label="Cotou?", options=self.original_df['cotacao_feita'].unique(), placeholder="Selecione se houve cotação")
+            selectbox_venda = self.select_box(label="Vendeu?", options=self.original_df['venda_feita'].unique(), placeholder="Selecione se houve venda")
         else:
             st.write(f"Abaixo está o relatório de vendas para a vendedora {self.user_name}:")
             selectbox_vendedor = None
@@ -354,11 +428,10 @@ class Relatorio_Vendas_Page(BasePage):
             selectbox_cotacao = None
             selectbox_venda = None
            # Transforma o dataframe usando os filtros (se existirem)
-        df_transformed = transform_df_vendas(self.df, self.user_name, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda, melhor_dia)
+        df_transformed = self.transform(transform_df_vendas, self.original_df, self.user_name, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda, melhor_dia, self.day)
         
-        excel_data = self.to_excel(df_transformed)
         
-        st.dataframe(df_transformed,
+        self.show_dataframe(df_transformed,
                      column_config={
                          "ult_tele": st.column_config.DateColumn(label="Último Telemarketing", format="DD/MM/YYYY"),
                          "ult_cotacao": st.column_config.DateColumn(label="Última Cotação", format="DD/MM/YYYY"),
@@ -392,9 +465,27 @@ class Relatorio_Vendas_Page(BasePage):
                          "perfil" : st.column_config.Column(label = "Perfil"),
                      },
                      hide_index=True)
-        st.download_button(
-            label="Baixar relatório em Excel",
-            data=excel_data,
-            file_name=f'relatorio_vendas{today.year}{today.month}{today.day}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        self.download_area(df_transformed, 'relatorio_vendas', filters=(selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda, melhor_dia, self.day))
+
+class Relatorio_Desempenho_Page(BasePage):
+    def __init__(self, user_name):
+        super().__init__("Desempenho do Painel", None, None, user_name)
+
+    @staticmethod
+    def describe():
+        return f"Latência por etapa e uso dos caches, a partir das últimas {len(recorder.spans)} medições."
+
+    def render(self):
+        records = recorder.records()
+        role = self.select_box(label="Perfil", options=['gerencia', 'vendedor'], placeholder="Todos os perfis")
+        if role:
+            records = [record for record in records if record.get('role') in (role, None)]
+        st.write(f"Medições em memória neste processo: {len(records)} (as mais antigas são descartadas).")
+        st.subheader("Latência por etapa")
+        # Aqui st.dataframe é chamado direto, para a própria página não entrar nas medições
+        st.dataframe(stage_summary(records), hide_index=True)
+        st.subheader("Caches")
+        st.dataframe(recorder.cache_ratios(), hide_index=True)
+        st.write("Cache de resultados: " + ", ".join(f"{label}: {value}" for label, value in get_result_cache().usage().items()))
+        st.subheader("Últimas medições")
+        st.dataframe(pd.DataFrame(records[-200:][::-1]).drop(columns=['at'], errors='ignore'), hide_index=True)
@@ -0,0 +1,49 @@
+import math
+
+# Tabelas paginadas no servidor: a ordenação, o recorte da página e os totais são calculados
+# aqui, e só as linhas da página vão para o navegador. O tamanho do que é enviado depende do
+# tamanho da página, não do tamanho da tabela.
+
+PAGE_SIZES = (50, 100, 250, 500)
+
+
+def column_label(column, column_config=None):
+    # Rótulo da coluna como aparece na tabela (o label do column_config, se houver)
+    config = (column_config or {}).get(column)
+    if isinstance(config, dict) and config.get('label'):
+        return config['label']
+    if isinstance(config, str):
+        return config
+    return str(column)
+
+
+def money_columns(df, column_config=None):
+    # Colunas configuradas como NumberColumn em reais ("R$ ..."): são as que entram nos totais
+    columns = []
+    for column, config in (column_config or {}).items():
+        if column not in df.columns or not isinstance(config, dict):
+            continue
+        type_config = config.get('type_config') or {}
+        if type_config.get('type') == 'number' and str(type_config.get('format') or '').startswith('R$'):
+            columns.append(column)
+    return columns
+
+
+def totals(df, column_config=None):
+    # Número de linhas e soma das colunas em reais da tabela inteira (não só da página)
+    return len(df), {column_label(column, column_config): float(df[column].sum()) for column in money_columns(df, column_config)}
+
+
+def page_count(rows, page_size):
+    return max(1, math.ceil(rows / page_size))
+
+
+def sorted_page(df, page, page_size, sort_column=None, ascending=True):
+    # Só a coluna de ordenação é ordenada; as demais colunas são lidas apenas nas posições da
+    # página, sem montar a tabela inteira reordenada. page começa em 1
+    start = (page - 1) * page_size
+    stop = start + page_size
+    if sort_column is None:
+        return df.iloc[start:stop]
+    order = df[sort_column].reset_index(drop=True).sort_values(ascending=ascending, kind='stable', na_position='last')
+    return df.iloc[order.index[start:stop]]
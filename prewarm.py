@@ -0,0 +1,158 @@
+import argparse
+import datetime
+import logging
+import os
+import sys
+import time
+from functools import partial
+
+from datasets import DatasetStore, IncrementalLoader, DiskSnapshotCache, Snapshot
+from indexes import seller_index_of, contact_totals_of, commission_cube_of
+from ingestion import SCHEMA_VERSION
+from queries import TABLES
+from sources import StreamingSource
+from summaries import card_windows, summary_table_of
+from utils import connect_bigquery
+
+# Pré-aquecimento do armazenamento de snapshots: busca todas as tabelas robo.* com os mesmos
+# loaders e a mesma ingestão do app, monta os índices por vendedor, os totais de contatos, o
+# cubo de comissão e as tabelas de resumo dos cards, e grava tudo no diretório de snapshots.
+# O processo do Streamlit que sobe depois restaura os snapshots já com os derivados, sem
+# consultar o BigQuery nem recalcular nada na primeira sessão. Pode rodar agendado antes do
+# expediente ou como etapa de inicialização do container.
+#
+# Com --watch, fica rodando como publicador para várias réplicas do app no mesmo host: a cada
+# intervalo atualiza as tabelas (incrementalmente, como o app) e publica a nova versão com troca
+# atômica do manifesto. As réplicas sobem com DATASET_MODE=worker, não consultam o BigQuery e
+# leem os arquivos mapeados em memória (attach_dataset_store), então os dados ocupam a memória
+# do host uma vez só, e não uma vez por réplica.
+#
+#   python prewarm.py                          # BigQuery, grava em $SNAPSHOT_DIR (snapshots/)
+#   python prewarm.py --fixtures synthetic     # Parquet gravados por `python synthetic.py`
+#   python prewarm.py --synthetic 100000       # tabelas sintéticas geradas na hora
+#   python prewarm.py --watch 600              # publicador contínuo para as réplicas
+
+logger = logging.getLogger('prewarm')
+
+DATASETS = tuple(TABLES)
+
+# Tabelas que só crescem: nas atualizações do app buscam apenas as linhas novas
+INCREMENTAL_DATASETS = ('estoque', 'inadimplencia', 'comissao')
+
+
+def build_dataset_store(client, disk_cache=None, ttl=600, windows=None):
+    # Store com os loaders do app sobre um cliente BigQuery (ou qualquer objeto com a mesma
+    # interface de query(), como synthetic.FakeBigQueryClient). As tabelas são lidas em blocos
+    # (StreamingSource), com a janela de datas opcional por dataset
+    source = StreamingSource(client, windows=windows)
+    store = DatasetStore(ttl=ttl, disk_cache=disk_cache)
+    for dataset in DATASETS:
+        loader = partial(source.read, dataset)
+        store.register(dataset, IncrementalLoader(dataset, loader) if dataset in INCREMENTAL_DATASETS else loader)
+    return store
+
+
+def attach_dataset_store(directory, watch_interval=5):
+    # Store de uma réplica: só lê as versões publicadas, sem cópia por processo
+    disk_cache = DiskSnapshotCache(directory, schema_version=SCHEMA_VERSION, shared=True)
+    return DatasetStore(disk_cache=disk_cache, read_only=True, watch_interval=watch_interval)
+
+
+def build_derived(snapshot, dataset, today):
+    # Os mesmos valores derivados que as páginas e os cards pedem ao snapshot
+    seller_index_of(snapshot, dataset)
+    if dataset == 'contatos':
+        contact_totals_of(snapshot)
+    if dataset == 'comissao':
+        commission_cube_of(snapshot)
+    window = card_windows(today).get(dataset)
+    if window is not None:
+        summary_table_of(snapshot, dataset, **window)
+
+
+class Publisher:
+    # Busca as tabelas, monta os derivados e grava cada versão no disco. O store (e os
+    # IncrementalLoader) continua vivo entre as execuções, então a partir da segunda só as
+    # linhas novas são buscadas e os derivados são atualizados a partir da versão anterior.
+    def __init__(self, client, directory, datasets=DATASETS):
+        self.datasets = datasets
+        self.disk_cache = DiskSnapshotCache(directory, schema_version=SCHEMA_VERSION)
+        # O store não grava no disco sozinho: cada snapshot é gravado uma vez, já com os derivados.
+        # Sem ttl, snapshot() nunca dispara uma atualização por conta própria entre as publicações
+        self.store = build_dataset_store(client, ttl=float('inf'))
+        self.published = {}
+        # Versão do store de onde veio cada snapshot publicado
+        self.fetched_versions = {}
+
+    def publish(self, today=None):
+        today = today or datetime.date.today()
+        started = time.time()
+        for event in [self.store.refresh(dataset) for dataset in self.datasets]:
+            event.wait()
+        for dataset in self.datasets:
+            fetched = self.store.snapshot(dataset)
+            previous = self.published.get(dataset)
+            if previous is not None and previous.data is fetched.data:
+                # Nada novo para publicar: a atualização não trouxe linhas ou falhou
+                continue
+            # As changes só valem sobre o snapshot publicado se partirem da mesma versão do store;
+            # se o store avançou mais de uma atualização desde a publicação, os derivados são
+            # recalculados inteiros, para não perder as linhas da atualização do meio
+            changes = fetched.changes if fetched.base_version is not None and fetched.base_version == self.fetched_versions.get(dataset) else None
+            # A versão continua a do disco, para não voltar a 1 a cada execução
+            manifest = self.disk_cache.manifest(dataset)
+            version = (manifest['version'] if manifest else 0) + 1
+            snapshot = Snapshot(fetched.data, version, fetched.fetched_at, previous=previous, changes=changes)
+            build_derived(snapshot, dataset, today)
+            self.disk_cache.save(dataset, snapshot)
+            self.published[dataset] = snapshot
+            self.fetched_versions[dataset] = fetched.version
+            logger.info("Dataset %s gravado na versão %s: %s linhas, %s derivados", dataset, version, len(snapshot.data), len(snapshot.derived))
+        logger.info("Pré-aquecimento concluído em %.1fs", time.time() - started)
+
+
+def prewarm(client, directory, today=None, datasets=DATASETS):
+    Publisher(client, directory, datasets).publish(today)
+
+
+def fixture_client(directory):
+    # Cliente falso sobre os <dataset>.parquet gravados por synthetic.py
+    import pyarrow.parquet as pq
+    import synthetic
+    return synthetic.FakeBigQueryClient({dataset: pq.read_table(os.path.join(directory, f"{dataset}.parquet")).to_pandas()
+                                         for dataset in DATASETS})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca as tabelas, monta os snapshots e os derivados e grava no diretório de snapshots.")
+    parser.add_argument('--output', default=os.environ.get('SNAPSHOT_DIR', 'snapshots'), help="diretório de snapshots do app")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--fixtures', default=None, help="diretório com os <dataset>.parquet de synthetic.py")
+    source.add_argument('--synthetic', type=int, default=None, metavar='ROWS', help="gera tabelas sintéticas com ROWS linhas")
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=DATASETS)
+    parser.add_argument('--watch', type=int, default=None, metavar='SECONDS', help="continua publicando novas versões a cada SECONDS segundos")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s %(message)s', level=logging.INFO)
+    if args.fixtures:
+        client = fixture_client(args.fixtures)
+    elif args.synthetic:
+        import synthetic
+        client = synthetic.FakeBigQueryClient(synthetic.generate_all(args.synthetic))
+    else:
+        client = connect_bigquery()
+    publisher = Publisher(client, args.output, args.datasets)
+    while True:
+        try:
+            publisher.publish()
+        except Exception:
+            logger.exception("Falha no pré-aquecimento; os snapshots anteriores continuam no disco")
+            if args.watch is None:
+                return 1
+        if args.watch is None:
+            return 0
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,74 @@
-query_estoque = """
-    select * from robo.estoque
-"""
+from datetime import date, datetime
 
-query_inadimplencia = """   
-    select * from robo.inadimplencia
-"""
+# Tabelas do dataset robo: coluna de data usada nos filtros de período (e o formato,
+# quando a data vem como texto), a coluna com o vendedor responsável e a chave natural
+# de cada linha, usada na carga incremental
+TABLES = {
+    'estoque': {'table': 'robo.estoque', 'date_column': 'data_cotada', 'date_format': '%d/%m/%Y', 'seller_column': 'vendedor', 'keys': ['n_da_nota', 'produto']},
+    'inadimplencia': {'table': 'robo.inadimplencia', 'date_column': 'data_de_vencimento', 'date_format': '%d/%m/%Y', 'seller_column': 'vendedor', 'keys': ['numero_da_nota', 'numero_parcela']},
+    'contatos': {'table': 'robo.contatos', 'date_column': None, 'date_format': None, 'seller_column': 'apelido', 'keys': ['codparc']},
+    'comissao': {'table': 'robo.comissao', 'date_column': 'dhbaixa', 'date_format': None, 'seller_column': 'apelido', 'keys': ['nufin']},
+}
 
-query_contatos = """
-    select * from robo.contatos
-"""
+# Colunas que os relatórios realmente utilizam
+COLUMNS = {
+    'estoque': ['n_da_nota', 'valor_da_nota', 'data_cotada', 'cliente', 'vendedor', 'empresa', 'produto', 'caracteristica', 'cotado', 'estoque', 'pos_cotacao'],
+    'inadimplencia': ['codigo_parceiro', 'nome_parceiro', 'vendedor', 'data_de_vencimento', 'numero_da_nota', 'descricao_oper', 'numero_parcela', 'tipo_de_titulo', 'dias_vencidos', 'valor_parcela', 'historico', 'codemp'],
+    'contatos': ['codparc', 'apelido', 'nomeparc', 'telemarketing_feito', 'cotacao_feita', 'contactou_ou_nao', 'ult_tele', 'ult_cotacao', 'ult_venda', 'venda_feita', 'tempo_ultima_venda',
+                 'dias_preferidos_cotar', 'qtd_compras', 'vlr_compras', 'dias_preferidos_pedido', 'vlr_gasto_mes_passado', 'vlr_gasto_mes_atual', 'elasticidade',
+                 'vergalhao', 'cd', 'arame', 'prego', 'estribo', 'coluna', 'tela_soldada', 'trelica', 'radier', 'bba', 'cercamento', 'perfil'],
+    'comissao': ['nufin', 'numnota', 'dhbaixa', 'dtfatur', 'dtvenc', 'diaatraso', 'parcela', 'codparc', 'nomeparc', 'vlrdesdob', 'comissao', 'comiss', 'apelido', 'codvend'],
+}
+
+def _date_expression(spec, dialect):
+    # Expressão SQL que converte a coluna de data do relatório para DATE em cada dialeto
+    column = spec['date_column']
+    if dialect == 'bigquery':
+        if spec['date_format']:
+            return f"PARSE_DATE('{spec['date_format']}', {column})"
+        return f"DATE({column})"
+    if dialect == 'sqlite':
+        if spec['date_format'] == '%d/%m/%Y':
+            return f"(substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2))"
+        return f"date({column})"
+    raise ValueError(f"Dialeto '{dialect}' não suportado.")
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def build_query(dataset, columns=None, start_date=None, end_date=None, user_name=None, dialect='bigquery'):
+    # Monta a consulta parametrizada com as colunas e os filtros de período e de vendedor
+    # aplicados no servidor. Retorna o SQL e o dicionário de parâmetros nomeados (@nome),
+    # que o SQLite também aceita, permitindo testar a consulta offline.
+    spec = TABLES[dataset]
+    columns = columns or COLUMNS[dataset]
+    conditions = []
+    params = {}
+    if start_date is not None or end_date is not None:
+        if spec['date_column'] is None:
+            raise ValueError(f"A tabela '{dataset}' não possui coluna de data para filtrar.")
+        date_expression = _date_expression(spec, dialect)
+        if start_date is not None:
+            conditions.append(f"{date_expression} >= @start_date")
+            params['start_date'] = _to_date(start_date)
+        if end_date is not None:
+            conditions.append(f"{date_expression} <= @end_date")
+            params['end_date'] = _to_date(end_date)
+    if user_name is not None and user_name != 'Gerência':
+        conditions.append(f"{spec['seller_column']} = @vendedor")
+        params['vendedor'] = user_name.upper()
+    query = f"select {', '.join(columns)} from {spec['table']}"
+    if conditions:
+        query += " where " + " and ".join(conditions)
+    if dialect == 'sqlite':
+        params = {key: value.isoformat() if isinstance(value, date) else value for key, value in params.items()}
+    return query, params
+
+def query_parameters(params):
+    # Os mesmos parâmetros nomeados, no formato do QueryJobConfig do google-cloud-bigquery
+    from google.cloud import bigquery
+    return [bigquery.ScalarQueryParameter(key, 'DATE' if isinstance(value, date) else 'STRING', value)
+            for key, value in params.items()]
 
-query_comissao = """
-select * from robo.comissao
-"""
\ No newline at end of file
@@ -0,0 +1,61 @@
+import threading
+
+import cachetools
+import pandas as pd
+
+from metrics import count_cache
+
+
+def frame_size(df):
+    # Bytes do resultado, contando o conteúdo das strings. Um resultado que reaproveita as colunas
+    # do snapshot (filtro que não remove linhas) é contado inteiro, mesmo sem ocupar memória nova
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def cache_key(page, version, user_name, function, args, kwargs):
+    # Os filtros da tela (datas, checkboxes, selectboxes) identificam o resultado; DataFrames
+    # passados junto (ex.: totais pré-calculados) vêm do mesmo snapshot e já estão na versão
+    values = tuple(arg for arg in args if not isinstance(arg, pd.DataFrame))
+    options = tuple(sorted((name, value) for name, value in kwargs.items() if not isinstance(value, pd.DataFrame)))
+    return (page, version, user_name, function, values, options)
+
+
+class ResultCache:
+    # Resultados dos transform_df_* compartilhados entre as sessões do processo, em um LRU
+    # limitado pelo total de bytes. A chave começa por (página, versão do snapshot): quando uma
+    # versão mais nova de uma página aparece, os resultados das versões anteriores saem do cache.
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self._cache = cachetools.LRUCache(maxsize=max_bytes, getsizeof=frame_size)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        page, version = key[0], key[1]
+        with self._lock:
+            current = self._versions.get(page)
+            if current is None or version > current:
+                self._invalidate(page, version)
+            # Uma sessão que ainda renderiza a versão anterior calcula o resultado, mas não o guarda
+            result = self._cache.get(key)
+        count_cache('resultados', result is not None)
+        if result is not None:
+            return result
+        result = compute()
+        with self._lock:
+            if self._versions.get(page) == version:
+                try:
+                    self._cache[key] = result
+                except ValueError:
+                    # Resultados maiores que o orçamento inteiro não entram no cache
+                    pass
+        return result
+
+    def _invalidate(self, page, version):
+        for key in [key for key in self._cache if key[0] == page]:
+            del self._cache[key]
+        self._versions[page] = version
+
+    def usage(self):
+        with self._lock:
+            return {'Resultados guardados': len(self._cache), 'Uso (MiB)': round(self._cache.currsize / 2 ** 20, 1),
+                    'Limite (MiB)': round(self._cache.maxsize / 2 ** 20, 1)}
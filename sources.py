@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.api.types import union_categoricals
+
+from ingestion import ingest
+from queries import COLUMNS, TABLES, build_query, query_parameters
+
+# Linhas convertidas e tipadas por vez na leitura em blocos (StreamingSource)
+CHUNK_ROWS = 100_000
+
+
+def arrow_to_frame(table):
+    # Conversão colunar direto dos buffers Arrow, sem passar por linhas Python. Com
+    # self_destruct cada coluna Arrow é liberada logo depois de convertida, então o pico de
+    # memória não soma as duas cópias inteiras; a tabela não pode ser usada depois
+    return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
+
+
+def rechunk(batches, chunk_rows=CHUNK_ROWS):
+    # Agrupa os record batches na ordem em que chegam em tabelas de ~chunk_rows linhas; o
+    # tamanho dos batches depende da API (páginas REST ou streams da Storage Read API)
+    pending, pending_rows = [], 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= chunk_rows:
+            yield pa.Table.from_batches(pending)
+            pending, pending_rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending)
+
+
+def share_strings(df, pool):
+    # O to_pandas usa um único objeto str para cada valor repetido, mas só dentro do bloco
+    # convertido; pool guarda um objeto por valor entre os blocos, como na conversão da tabela
+    # inteira. Colunas sem nenhum valor repetido no bloco (chaves) ficam de fora, para o pool
+    # não crescer com elas
+    columns = {}
+    for column in df.columns[df.dtypes == object]:
+        codes, uniques = pd.factorize(df[column])
+        if len(uniques) == len(df):
+            continue
+        # O código -1 (ausente) pega o None do fim
+        values = np.array([pool.setdefault(value, value) for value in uniques] + [None], dtype=object)
+        columns[column] = values.take(codes)
+    return df.assign(**columns) if columns else df
+
+
+def concat_chunks(frames):
+    # Junta os blocos já tipados coluna por coluna, tirando cada coluna dos blocos logo depois
+    # de copiada: o pico fica na saída mais uma coluna, e não na saída em dobro. Categorias de
+    # blocos diferentes têm valores diferentes e o concat as transformaria em object; são unidas
+    # com union_categoricals, em ordem alfabética como o astype('category') da tabela inteira
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for column in list(frames[0].columns):
+        pieces = [frame.pop(column) for frame in frames]
+        if isinstance(pieces[0].dtype, pd.CategoricalDtype):
+            columns[column] = pd.Series(union_categoricals(pieces, sort_categories=True), name=column)
+        else:
+            columns[column] = pd.concat(pieces, ignore_index=True)
+    # copy=False: cada coluna fica no próprio bloco, sem consolidar em uma nova cópia
+    return pd.DataFrame(columns, copy=False)
+
+
+class ArrowSource:
+    # Lê as tabelas robo.* pelo caminho Arrow do cliente BigQuery. Com o pacote
+    # google-cloud-bigquery-storage instalado, to_arrow baixa o resultado pela Storage Read API,
+    # em vários streams lidos em paralelo; sem ele, cai na paginação REST, ainda em Arrow.
+    # Qualquer objeto com a mesma interface de query() serve como client (ver
+    # synthetic.FakeBigQueryClient, usado para rodar offline).
+    def __init__(self, client, bqstorage_client=None):
+        self.client = client
+        self.bqstorage_client = bqstorage_client
+
+    def _result(self, dataset, start_date=None):
+        from google.cloud import bigquery
+        query, params = build_query(dataset, start_date=start_date)
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters(params))
+        return self.client.query(query, job_config=job_config).result()
+
+    def read_arrow(self, dataset, start_date=None):
+        rows = self._result(dataset, start_date)
+        return rows.to_arrow(bqstorage_client=self.bqstorage_client, create_bqstorage_client=self.bqstorage_client is None)
+
+    def read(self, dataset, start_date=None):
+        # Mesmo contrato do loader do DatasetStore/IncrementalLoader: DataFrame já tipado
+        return ingest(dataset, arrow_to_frame(self.read_arrow(dataset, start_date)))
+
+
+class StreamingSource(ArrowSource):
+    # Leitura em blocos: o resultado chega como record batches (to_arrow_iterable) e cada
+    # bloco de chunk_rows linhas passa pela projeção, pela tipagem (ingest) e pela janela de
+    # datas antes de o próximo ser convertido. Só as linhas tipadas que sobram ficam guardadas,
+    # então o pico da carga é o bloco mais a saída, e não a tabela inteira em Arrow, mais a
+    # cópia em pandas, mais a tipada.
+    # windows (dataset -> dias) descarta as linhas com data mais antiga que a janela. Sem
+    # janela a tabela vem inteira: os filtros de período das páginas aceitam qualquer data.
+    def __init__(self, client, bqstorage_client=None, chunk_rows=CHUNK_ROWS, windows=None):
+        super().__init__(client, bqstorage_client)
+        self.chunk_rows = chunk_rows
+        self.windows = windows or {}
+        for dataset in self.windows:
+            if TABLES[dataset]['date_column'] is None:
+                raise ValueError(f"A tabela '{dataset}' não possui coluna de data para filtrar.")
+
+    def read_batches(self, dataset, start_date=None):
+        rows = self._result(dataset, start_date)
+        return rows.to_arrow_iterable(bqstorage_client=self._bqstorage_client())
+
+    def _bqstorage_client(self):
+        # O to_arrow_iterable não cria o cliente da Storage Read API sozinho; usa o mesmo que o
+        # to_arrow criaria. Clientes sem ele (como o FakeBigQueryClient) ficam na paginação
+        if self.bqstorage_client is None:
+            ensure = getattr(self.client, '_ensure_bqstorage_client', None)
+            self.bqstorage_client = ensure() if ensure else None
+        return self.bqstorage_client
+
+    def chunks(self, dataset, start_date=None):
+        # Pipeline de geradores: batches -> blocos -> projeção -> tipagem -> janela de datas
+        columns = COLUMNS[dataset]
+        strings = {}
+        for table in rechunk(self.read_batches(dataset, start_date), self.chunk_rows):
+            table = table.select([column for column in columns if column in table.column_names])
+            yield share_strings(self._window(dataset, ingest(dataset, arrow_to_frame(table))), strings)
+
+    def _window(self, dataset, df):
+        days = self.windows.get(dataset)
+        if days is None:
+            return df
+        # A data já vem tipada pela ingestão, no mesmo formato dos filtros dos relatórios
+        mask = df[TABLES[dataset]['date_column']] >= pd.Timestamp.today().normalize() - pd.Timedelta(days=days)
+        return df if mask.all() else df[mask]
+
+    def read(self, dataset, start_date=None):
+        frames = list(self.chunks(dataset, start_date))
+        if not frames:
+            # Resultado sem nenhum batch: DataFrame vazio com as colunas da consulta
+            return ingest(dataset, pd.DataFrame(columns=COLUMNS[dataset]))
+        return concat_chunks(frames)
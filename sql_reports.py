@@ -0,0 +1,186 @@
+import threading
+from datetime import datetime
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils import LABELS_ESTOQUE, LABELS_INADIMPLENCIA, LABELS_COMISSAO, INTERNAL_COLUMNS, commission_slice
+
+# Os mesmos relatórios de utils.py expressos em SQL sobre um DuckDB em processo. Os DataFrames
+# dos snapshots são registrados como views (o DuckDB lê a memória do pandas sem copiar) e o
+# resultado volta como tabela Arrow. As funções têm a mesma assinatura dos transform_df_* e
+# são escolhidas por utils.set_report_engine('duckdb') ou REPORT_ENGINE=duckdb.
+
+_local = threading.local()
+
+
+def connection():
+    # Conexões DuckDB não devem ser compartilhadas entre threads; cada sessão do Streamlit
+    # roda na sua, então cada thread tem a sua conexão com o banco em memória
+    con = getattr(_local, 'connection', None)
+    if con is None:
+        con = _local.connection = duckdb.connect()
+    return con
+
+
+def query(sql, params=None, **frames):
+    # Executa o SQL com os DataFrames passados registrados pelo nome (ex.: df=...)
+    con = connection()
+    for name, frame in frames.items():
+        con.register(name, frame)
+    try:
+        return con.execute(sql, params or {}).fetch_arrow_table()
+    finally:
+        for name in frames:
+            con.unregister(name)
+
+
+def to_frame(table, index=None):
+    # Categorias voltam do DuckDB (ENUM) como dicionários de índice sem sinal, que o pandas
+    # não converte; o resto é a conversão colunar normal, com datas em datetime64[ns]
+    fields = [pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type)) if pa.types.is_dictionary(field.type) else field
+              for field in table.schema]
+    df = table.cast(pa.schema(fields)).to_pandas(coerce_temporal_nanoseconds=True)
+    return df.set_index(index) if index else df
+
+
+def _identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _select_list(columns, labels=None, exclude=()):
+    # Lista de colunas na ordem do DataFrame, sem as excluídas e com os rótulos dos relatórios
+    labels = labels or {}
+    return ', '.join(f"{_identifier(column)} as {_identifier(labels.get(column, column))}"
+                     for column in columns if column not in exclude)
+
+
+def _manager_conditions(selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda):
+    # Equivalente SQL de utils.manager_filter_mask
+    conditions, params = [], {}
+    for column, value in (('apelido', selectbox_vendedor), ('telemarketing_feito', selectbox_telemarketing),
+                          ('cotacao_feita', selectbox_cotacao), ('venda_feita', selectbox_venda)):
+        if value:
+            conditions.append(f"{column} = ${column}")
+            params[column] = value
+    return conditions, params
+
+
+def _where(conditions):
+    return f" where {' and '.join(conditions)}" if conditions else ""
+
+
+def transform_df_estoque(df, start_date, end_date, name):
+    conditions = ["data_cotada >= $start_date", "data_cotada <= $end_date", "pos_cotacao < 0"]
+    params = {'start_date': _timestamp(start_date), 'end_date': _timestamp(end_date)}
+    exclude = ()
+    if name != 'Gerência':
+        conditions.append("vendedor = $vendedor")
+        params['vendedor'] = name.upper()
+        exclude = ('vendedor',)
+    return query(f"select {_select_list(df.columns, LABELS_ESTOQUE, exclude)} from df{_where(conditions)}", params, df=df)
+
+
+def transform_df_inadimplencia(df, start_date, end_date, name, checkbox_90_days):
+    conditions = ["data_de_vencimento >= $start_date", "data_de_vencimento <= $end_date"]
+    params = {'start_date': _timestamp(start_date), 'end_date': _timestamp(end_date)}
+    if checkbox_90_days:
+        # "is distinct from" mantém, como o != do pandas, os títulos sem tipo
+        conditions += ["dias_vencidos <= 90", "tipo_de_titulo is distinct from 'INCLUIDO NO SERASA'", "tipo_de_titulo is distinct from 'PROTESTO'"]
+    exclude = ['valor_da_nota']
+    if name != 'Gerência':
+        conditions.append("vendedor = $vendedor")
+        params['vendedor'] = name.upper()
+        exclude.append('vendedor')
+    return query(f"select {_select_list(df.columns, LABELS_INADIMPLENCIA, exclude)} from df{_where(conditions)}", params, df=df)
+
+
+def transform_df_contatos(df, name, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda):
+    if name != 'Gerência':
+        return query("select codparc, nomeparc, ult_tele, ult_cotacao, ult_venda from df "
+                     "where contactou_ou_nao = 'Não contactou' and apelido = $vendedor", {'vendedor': name.upper()}, df=df)
+    conditions, params = _manager_conditions(selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda)
+    return query(f"select {_select_list(df.columns, exclude=INTERNAL_COLUMNS)} from df{_where(conditions)}", params, df=df)
+
+
+def transform_df_contatosagregados(df, name, totals=None):
+    # Com os totais prontos do snapshot, só o pós-processamento roda em SQL
+    if totals is None:
+        grouped = """select apelido, count(*) as Carteira, count_if(contato_feito)::bigint as Contatos,
+                            count_if(fez_telemarketing)::bigint as Fez_telemarketing, count_if(cotou)::bigint as Cotou,
+                            count_if(vendeu)::bigint as Vendeu, min(tempo_ultima_venda) as Ultima_Venda
+                     from df where apelido is not null group by apelido"""
+        frames = {'df': df}
+    else:
+        grouped = "select * from totals"
+        frames = {'totals': totals.reset_index()}
+    # No pandas, a condição sobre Ultima_Venda é sempre verdadeira; sobra Contatos != 0
+    return query(f"""with grouped as ({grouped})
+                     select apelido as Vendedor, Carteira, Contatos, Fez_telemarketing as "Fez telemarketing", Cotou, Vendeu,
+                            Carteira - Contatos as "Faltam contatos", Contatos / Carteira * 100 as Porcentagem
+                     from grouped where Contatos <> 0
+                     order by Porcentagem desc""", **frames)
+
+
+def transform_df_comissao(df, name, start_date, end_date, mes_vigente, selectbox_vendedor, month_start):
+    conditions = ["dhbaixa >= $start_date", "dhbaixa <= $end_date"]
+    params = {'start_date': _timestamp(start_date), 'end_date': _timestamp(end_date)}
+    if mes_vigente:
+        conditions.append("dhbaixa > $month_start")
+        params['month_start'] = _timestamp(month_start)
+    exclude = ['numnota2']
+    if name != 'Gerência':
+        conditions.append("apelido = $vendedor")
+        params['vendedor'] = name.upper()
+        exclude += ['apelido', 'codvend']
+    elif selectbox_vendedor:
+        conditions.append("apelido = $vendedor")
+        params['vendedor'] = selectbox_vendedor
+    return query(f"select {_select_list(df.columns, LABELS_COMISSAO, exclude)} from df{_where(conditions)}", params, df=df)
+
+
+def transform_df_comissao_agregado(df, name, window_start, cube=None):
+    # Comissão por vendedor (linhas) e mês (colunas 'AAAA-MM') desde window_start;
+    # meses sem baixa ficam com 0, como o fill_value do unstack no pandas. Com o cubo do
+    # snapshot (utils.commission_cube), o recorte de vendedor e meses é feito antes no pandas
+    # e só as células da janela entram no SQL
+    if cube is None:
+        # PIVOT com colunas vindas dos dados não aceita parâmetros; a data de corte é calculada
+        # pelo app (não vem do usuário) e entra como literal. Agrupa por mês antes de formatar,
+        # para o strftime rodar uma vez por vendedor e mês e não por linha
+        cells = f"""select apelido, date_trunc('month', dhbaixa) as month, sum(comiss) as comiss
+                    from df where dhbaixa >= timestamp '{_timestamp(window_start).isoformat(sep=' ')}' and apelido is not null
+                    group by all"""
+        frames = {'df': df}
+    else:
+        cells = "select apelido, month, comiss from cube"
+        frames = {'cube': commission_slice(cube, name, start=window_start).reset_index()}
+    table = query(f"""pivot (select apelido, strftime(month, '%Y-%m') as year_month, comiss from ({cells}))
+                      on year_month using sum(comiss) group by apelido order by apelido""", **frames)
+    for position, field in enumerate(table.schema):
+        if field.name != 'apelido':
+            table = table.set_column(position, field.name, pc.fill_null(table.column(position), 0.0))
+    return table
+
+
+def transform_df_vendas(df, name, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda, melhor_dia, day):
+    conditions, params = [], {}
+    if melhor_dia:
+        conditions.append("dias_cotar_mask & $dia_bit <> 0")
+        params['dia_bit'] = 1 << (day - 1)
+    if name != 'Gerência':
+        conditions.append("apelido = $vendedor")
+        params['vendedor'] = name.upper()
+    else:
+        manager_conditions, manager_params = _manager_conditions(selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda)
+        conditions += manager_conditions
+        params.update(manager_params)
+    return query(f"select {_select_list(df.columns, exclude=INTERNAL_COLUMNS)} from df{_where(conditions)}", params, df=df)
+
+
+def _timestamp(value):
+    # Datas dos filtros como datetime, comparáveis com as colunas TIMESTAMP
+    if isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day)
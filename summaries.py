@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from ingestion import has_day
+
+# Métricas dos cards da página inicial para todos os vendedores e para a empresa inteira
+# ('Gerência'), calculadas em uma única passada agrupada por versão do dataset. Com a tabela
+# pronta no snapshot, a descrição de cada card é só uma consulta ao dicionário.
+
+EMPTY = {
+    'estoque': {'cotacoes': 0},
+    'inadimplencia': {'notas': 0, 'valor': 0.0},
+    'contatos': {'porcentagem': 0.0, 'ligar_hoje': 0},
+}
+
+
+def _with_total(grouped):
+    # Uma linha por vendedor mais a linha 'Gerência' com a soma da tabela inteira (inclusive
+    # linhas sem vendedor, como nos relatórios gerenciais)
+    rows = grouped.groupby(level=0, observed=True).sum()
+    summary = {seller: row for seller, row in rows.to_dict('index').items()}
+    summary['Gerência'] = grouped.sum().to_dict()
+    return summary
+
+
+def estoque_summary(df, start_date, end_date):
+    data_cotada = df['data_cotada']
+    shortfalls = (df['pos_cotacao'] < 0) & (data_cotada >= pd.to_datetime(start_date)) & (data_cotada <= pd.to_datetime(end_date))
+    grouped = pd.DataFrame({'cotacoes': shortfalls.astype('int64')}).set_index(df['vendedor'])
+    return {seller: {'cotacoes': int(row['cotacoes'])} for seller, row in _with_total(grouped).items()}
+
+
+def inadimplencia_summary(df, start_date, end_date):
+    data_de_vencimento = df['data_de_vencimento']
+    overdue = (data_de_vencimento >= pd.to_datetime(start_date)) & (data_de_vencimento <= pd.to_datetime(end_date))
+    grouped = pd.DataFrame({'notas': overdue.astype('int64'), 'valor': df['valor_parcela'].where(overdue, 0.0)}).set_index(df['vendedor'])
+    return {seller: {'notas': int(row['notas']), 'valor': float(row['valor'])} for seller, row in _with_total(grouped).items()}
+
+
+def contatos_summary(df, day):
+    # Porcentagem da carteira já contactada no mês e parceiros com hoje entre os dias preferidos
+    grouped = pd.DataFrame({'carteira': 1, 'contatos': df['contato_feito'].astype('int64'),
+                            'ligar_hoje': has_day(df['dias_cotar_mask'], day).astype('int64')}).set_index(df['apelido'])
+    return {seller: {'porcentagem': round(row['contatos'] / row['carteira'] * 100, 2) if row['carteira'] else 0.0,
+                     'ligar_hoje': int(row['ligar_hoje'])}
+            for seller, row in _with_total(grouped).items()}
+
+
+BUILDERS = {'estoque': estoque_summary, 'inadimplencia': inadimplencia_summary, 'contatos': contatos_summary}
+
+
+def card_windows(today):
+    # Janelas de datas dos cards da página inicial. App e prewarm.py usam as mesmas, para que
+    # as tabelas montadas antes do expediente sejam encontradas pelo app no mesmo dia
+    last_day_of_previous_month = today.replace(day=1) - timedelta(days=1)
+    return {
+        'estoque': {'start_date': today - timedelta(days=30), 'end_date': today},
+        'inadimplencia': {'start_date': today - timedelta(days=180), 'end_date': last_day_of_previous_month},
+        'contatos': {'day': today.day},
+    }
+
+
+def summary_table_of(snapshot, dataset, **window):
+    # Tabela de resumo do snapshot, montada uma vez por versão e janela de datas
+    return snapshot.derive(('summary', dataset, tuple(sorted(window.items()))),
+                           lambda df: BUILDERS[dataset](df, **window))
+
+
+def summary_of(snapshot, dataset, name, **window):
+    # Métricas do usuário; vendedor sem linhas no dataset recebe as métricas zeradas
+    summary = summary_table_of(snapshot, dataset, **window)
+    return summary.get(name if name == 'Gerência' else name.upper(), EMPTY[dataset])
@@ -0,0 +1,253 @@
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from queries import COLUMNS, TABLES
+
+# Gera DataFrames sintéticos com as mesmas colunas e tipos que o BigQuery devolve para as
+# tabelas robo.* (datas em texto onde a origem é texto, identificadores inteiros etc.), para
+# medir e testar os relatórios sem acesso ao BigQuery. Tudo é vetorizado a partir de pools
+# de valores, então 10 milhões de linhas saem em poucos segundos.
+
+PRODUTOS = ['vergalhao', 'cd', 'arame', 'prego', 'estribo', 'coluna', 'tela_soldada', 'trelica', 'radier', 'bba', 'cercamento', 'perfil']
+
+
+def seller_names(sellers):
+    # Mesmo formato do login em maiúsculas, que os relatórios comparam com name.upper()
+    return np.array([f"VENDEDOR{i:02d}" for i in range(1, sellers + 1)], dtype=object)
+
+
+class _Generator:
+    def __init__(self, rows, sellers, seed, today):
+        self.rows = rows
+        self.rng = np.random.default_rng(seed)
+        self.today = pd.Timestamp(today).normalize()
+        self.sellers = seller_names(sellers)
+        # Carteiras de tamanhos diferentes, como na prática: poucos vendedores concentram mais linhas
+        weights = 1 / np.arange(1, sellers + 1) ** 0.7
+        self.seller_weights = weights / weights.sum()
+
+    def choice(self, values, p=None):
+        values = np.asarray(values, dtype=object)
+        return values[self.rng.choice(len(values), self.rows, p=p)]
+
+    def seller(self):
+        return self.choice(self.sellers, p=self.seller_weights)
+
+    def integers(self, low, high):
+        return self.rng.integers(low, high, self.rows)
+
+    def money(self, scale):
+        return np.round(self.rng.gamma(2.0, scale / 2, self.rows), 2)
+
+    def days_ago(self, days):
+        return self.today - pd.to_timedelta(self.rng.integers(0, days, self.rows), unit='D')
+
+    def date_text(self, date_format, days, missing=0.0):
+        # Sorteia índices em um pool de datas já formatadas em vez de formatar linha a linha
+        pool = (self.today - pd.to_timedelta(np.arange(days), unit='D')).strftime(date_format).to_numpy(dtype=object)
+        values = pool[self.rng.integers(0, days, self.rows)]
+        if missing:
+            values[self.rng.random(self.rows) < missing] = None
+        return values
+
+    def day_lists(self, missing=0.2):
+        # Listas de dias preferidos no formato da origem: "3,15,28"
+        pool = []
+        for _ in range(512):
+            days = np.sort(self.rng.choice(np.arange(1, 32), self.rng.integers(1, 5), replace=False))
+            pool.append(','.join(map(str, days)))
+        values = np.asarray(pool, dtype=object)[self.rng.integers(0, len(pool), self.rows)]
+        values[self.rng.random(self.rows) < missing] = None
+        return values
+
+    def labels(self, prefix, count):
+        return self.choice([f"{prefix} {i}" for i in range(1, count + 1)])
+
+    def estoque(self):
+        return pd.DataFrame({
+            'n_da_nota': self.integers(100000, 999999),
+            'valor_da_nota': self.money(5000),
+            'data_cotada': self.date_text('%d/%m/%Y', 120),
+            'cliente': self.labels('CLIENTE', 5000),
+            'vendedor': self.seller(),
+            'empresa': self.choice(['MANCHESTER', 'MANCHESTER FILIAL']),
+            'produto': self.labels('PRODUTO', 800),
+            'caracteristica': self.choice(['CA-50', 'CA-60', 'RECOZIDO', 'GALVANIZADO', '']),
+            'cotado': self.rng.integers(1, 500, self.rows).astype(float),
+            'estoque': self.rng.integers(0, 500, self.rows).astype(float),
+            'pos_cotacao': self.rng.normal(0, 100, self.rows).round(),
+        })
+
+    def inadimplencia(self):
+        return pd.DataFrame({
+            'codigo_parceiro': self.integers(1, 50000),
+            'nome_parceiro': self.labels('PARCEIRO', 20000),
+            'vendedor': self.seller(),
+            'data_de_vencimento': self.date_text('%d/%m/%Y', 365),
+            'numero_da_nota': self.integers(100000, 999999),
+            'descricao_oper': self.choice(['VENDA', 'VENDA FUTURA', 'BONIFICACAO']),
+            'numero_parcela': self.integers(1, 7),
+            'tipo_de_titulo': self.choice(['BOLETO', 'PROTESTO', 'INCLUIDO NO SERASA', 'CHEQUE'], p=[0.7, 0.1, 0.1, 0.1]),
+            'dias_vencidos': self.integers(1, 365),
+            'valor_parcela': self.money(1500),
+            'historico': self.choice(['', 'RENEGOCIADO', 'EM COBRANCA']),
+            'codemp': self.integers(1, 3),
+        })
+
+    def contatos(self):
+        data = {
+            # codparc é a chave natural da tabela, então não se repete
+            'codparc': self.rng.permutation(self.rows) + 1,
+            'apelido': self.seller(),
+            'nomeparc': self.labels('PARCEIRO', 20000),
+            'telemarketing_feito': self.choice(['Entrou em contato esse mês', 'Não entrou em contato esse mês']),
+            'cotacao_feita': self.choice(['Cotou esse mês', 'Não cotou esse mês']),
+            'contactou_ou_nao': self.choice(['Contato feito', 'Não contactou'], p=[0.6, 0.4]),
+            'ult_tele': self.date_text('%Y/%m/%d', 365, missing=0.1),
+            'ult_cotacao': self.date_text('%Y-%m-%d', 365, missing=0.1),
+            'ult_venda': self.date_text('%d/%m/%Y', 365, missing=0.1),
+            'venda_feita': self.choice(['Vendeu esse mês', 'Não vendeu esse mês']),
+            'tempo_ultima_venda': np.where(self.rng.random(self.rows) < 0.1, np.nan, self.integers(0, 365).astype(float)),
+            'dias_preferidos_cotar': self.day_lists(),
+            'qtd_compras': self.integers(0, 30),
+            'vlr_compras': self.money(20000),
+            'dias_preferidos_pedido': self.day_lists(),
+            'vlr_gasto_mes_passado': self.money(3000),
+            'vlr_gasto_mes_atual': self.money(3000),
+            'elasticidade': self.rng.normal(0, 1, self.rows).round(2),
+        }
+        for produto in PRODUTOS:
+            data[produto] = self.money(2000)
+        return pd.DataFrame(data)
+
+    def comissao(self):
+        return pd.DataFrame({
+            # nufin é a chave natural da tabela, então não se repete
+            'nufin': self.rng.permutation(self.rows) + 1,
+            'numnota': self.integers(100000, 999999),
+            'dhbaixa': self.days_ago(365),
+            'dtfatur': self.days_ago(420),
+            'dtvenc': self.days_ago(400),
+            'diaatraso': self.integers(0, 60),
+            'parcela': self.integers(1, 7),
+            'codparc': self.integers(1, 50000),
+            'nomeparc': self.labels('PARCEIRO', 20000),
+            'vlrdesdob': self.money(1500),
+            'comissao': self.rng.choice([1.0, 1.5, 2.0, 3.0], self.rows),
+            'comiss': self.money(30),
+            'apelido': self.seller(),
+            'codvend': self.integers(1, 100),
+        })
+
+
+def generate(dataset, rows, sellers=20, seed=0, today=None):
+    # Uma tabela robo.<dataset> com as colunas consultadas pelo app (queries.COLUMNS)
+    generator = _Generator(rows, sellers, seed, today if today is not None else pd.Timestamp.today())
+    return getattr(generator, dataset)()[COLUMNS[dataset]]
+
+
+def generate_all(rows, sellers=20, seed=0, today=None):
+    return {dataset: generate(dataset, rows, sellers=sellers, seed=seed + index, today=today)
+            for index, dataset in enumerate(COLUMNS)}
+
+
+class FakeBigQueryClient:
+    # Substituto local do bigquery.Client para rodar o app e os testes de carga offline.
+    # Responde às consultas montadas por queries.build_query (projeção de colunas e filtros
+    # @start_date, @end_date e @vendedor) com tabelas Arrow em memória, como o
+    # RowIterator.to_arrow do cliente real, ou em record batches de batch_rows linhas da tabela
+    # de origem, montados um de cada vez, como o to_arrow_iterable. latency simula o tempo de
+    # ida e volta de cada job.
+    def __init__(self, tables, latency=0.0, batch_rows=10_000):
+        # tables: dataset -> DataFrame no formato de generate()
+        self.tables = {TABLES[dataset]['table']: (dataset, df) for dataset, df in tables.items()}
+        self.latency = latency
+        self.batch_rows = batch_rows
+        self.queries = []
+
+    def query(self, query, job_config=None):
+        self.queries.append(query)
+        params = {parameter.name: parameter.value for parameter in getattr(job_config, 'query_parameters', None) or []}
+        return _FakeQueryJob(self, query, params)
+
+    def _parse(self, query):
+        match = re.match(r"select (?P<columns>.+?) from (?P<table>\S+)", query)
+        dataset, df = self.tables[match.group('table')]
+        return TABLES[dataset], df, [column.strip() for column in match.group('columns').split(',')]
+
+    def _mask(self, df, spec, params):
+        mask = pd.Series(True, index=df.index)
+        if 'start_date' in params or 'end_date' in params:
+            dates = pd.to_datetime(df[spec['date_column']], format=spec['date_format']).dt.normalize()
+            if 'start_date' in params:
+                mask &= dates >= pd.Timestamp(params['start_date'])
+            if 'end_date' in params:
+                mask &= dates <= pd.Timestamp(params['end_date'])
+        if 'vendedor' in params:
+            mask &= df[spec['seller_column']] == params['vendedor']
+        return mask
+
+    def _execute(self, query, params):
+        spec, df, columns = self._parse(query)
+        mask = self._mask(df, spec, params)
+        if self.latency:
+            time.sleep(self.latency)
+        return pa.Table.from_pandas(df.loc[mask, columns], preserve_index=False)
+
+    def _execute_batches(self, query, params):
+        spec, df, columns = self._parse(query)
+        # Um schema só para todos os batches, inferido do primeiro trecho da tabela (e não da
+        # tabela inteira, que converteria todas as colunas de uma vez)
+        schema = pa.Schema.from_pandas(df.iloc[:self.batch_rows][columns], preserve_index=False)
+        if self.latency:
+            time.sleep(self.latency)
+        sent = False
+        for start in range(0, len(df), self.batch_rows):
+            part = df.iloc[start:start + self.batch_rows]
+            part = part.loc[self._mask(part, spec, params), columns]
+            if len(part):
+                sent = True
+                yield pa.RecordBatch.from_pandas(part, schema=schema, preserve_index=False)
+        if not sent:
+            # Como o BigQuery, um resultado vazio ainda traz o schema
+            yield pa.RecordBatch.from_pylist([], schema=schema)
+
+
+class _FakeQueryJob:
+    def __init__(self, client, query, params):
+        self.client = client
+        self.query = query
+        self.params = params
+
+    def result(self):
+        return self
+
+    def to_arrow(self, **kwargs):
+        return self.client._execute(self.query, self.params)
+
+    def to_arrow_iterable(self, **kwargs):
+        return self.client._execute_batches(self.query, self.params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera as tabelas robo.* sintéticas em Parquet.")
+    parser.add_argument('--rows', type=int, default=100_000, help="linhas por tabela")
+    parser.add_argument('--sellers', type=int, default=20, help="quantidade de vendedores")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='synthetic', help="diretório de saída (<dataset>.parquet)")
+    args = parser.parse_args()
+    os.makedirs(args.output, exist_ok=True)
+    for dataset, df in generate_all(args.rows, sellers=args.sellers, seed=args.seed).items():
+        path = os.path.join(args.output, f"{dataset}.parquet")
+        df.to_parquet(path, index=False)
+        print(f"{path}: {len(df)} linhas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import synthetic
+import utils
+from datasets import IncrementalLoader, Snapshot
+from indexes import commission_cube_of
+from ingestion import ingest
+from sources import ArrowSource
+from utils import commission_cube, commission_of_month, transform_df_comissao, transform_df_comissao_agregado
+
+TODAY = date(2026, 3, 15)
+
+
+def assert_same_cube(cube, expected):
+    pd.testing.assert_frame_equal(cube.sort_index(), expected.sort_index(), check_exact=False)
+
+
+def test_incremental_commission_cube_matches_full_rebuild():
+    comissao = synthetic.generate('comissao', 4000, sellers=5, seed=4, today=TODAY).sort_values('dhbaixa', ignore_index=True)
+    watermark = comissao['dhbaixa'].iloc[3000].normalize()
+    client = synthetic.FakeBigQueryClient({'comissao': comissao[comissao['dhbaixa'] < watermark]})
+    loader = IncrementalLoader('comissao', lambda start_date: ArrowSource(client).read('comissao', start_date))
+    snapshot = Snapshot(loader(), 1, 0)
+    commission_cube_of(snapshot)
+    for version, changed in enumerate([
+        # Linhas novas, e uma baixa do mesmo dia corrigida (troca de vendedor e de valor)
+        comissao[comissao['dhbaixa'] < watermark + pd.Timedelta(days=5)],
+        comissao.assign(comiss=comissao['comiss'].where(comissao.index != len(comissao) - 1, 0.5),
+                        apelido=comissao['apelido'].where(comissao.index != len(comissao) - 2, 'VENDEDOR09')),
+    ], start=2):
+        client.tables['robo.comissao'] = ('comissao', changed)
+        data = loader()
+        snapshot = Snapshot(data, version, 0, previous=snapshot, changes=loader.last_changes)
+        assert not loader.last_changes.added.empty
+        assert_same_cube(commission_cube_of(snapshot), commission_cube(data))
+
+
+def test_commission_cube_drops_emptied_cells():
+    comissao = synthetic.generate('comissao', 500, sellers=3, seed=5, today=TODAY).sort_values('dhbaixa', ignore_index=True)
+    last = comissao.iloc[-1]
+    # Uma célula (vendedor novo, último mês) com uma baixa só, que depois muda de vendedor
+    comissao.loc[comissao.index[-1], 'apelido'] = 'VENDEDOR99'
+    client = synthetic.FakeBigQueryClient({'comissao': comissao})
+    loader = IncrementalLoader('comissao', lambda start_date: ArrowSource(client).read('comissao', start_date))
+    snapshot = Snapshot(loader(), 1, 0)
+    assert 'VENDEDOR99' in commission_cube_of(snapshot).index.get_level_values('apelido')
+    client.tables['robo.comissao'] = ('comissao', comissao.assign(apelido=comissao['apelido'].where(comissao.index != len(comissao) - 1, last['apelido'])))
+    data = loader()
+    snapshot = Snapshot(data, 2, 0, previous=snapshot, changes=loader.last_changes)
+    cube = commission_cube_of(snapshot)
+    assert 'VENDEDOR99' not in cube.index.get_level_values('apelido')
+    assert_same_cube(cube, commission_cube(data))
+
+
+@pytest.fixture
+def engine(request):
+    previous = utils.REPORT_ENGINE
+    utils.set_report_engine(request.param)
+    yield request.param
+    utils.set_report_engine(previous)
+
+
+@pytest.fixture(scope='module')
+def comissao():
+    return ingest('comissao', synthetic.generate('comissao', 2000, sellers=4, seed=9, today=TODAY))
+
+
+def test_commission_of_month_takes_the_month(comissao):
+    cube = commission_cube(comissao)
+    for month in (date(2026, 3, 1), date(2026, 1, 1)):
+        in_month = comissao['dhbaixa'].dt.to_period('M') == pd.Period(month, 'M')
+        assert commission_of_month(cube, 'Gerência', month) == pytest.approx(comissao.loc[in_month, 'comiss'].sum())
+        seller = in_month & (comissao['apelido'] == 'VENDEDOR01')
+        assert commission_of_month(cube, 'vendedor01', month) == pytest.approx(comissao.loc[seller, 'comiss'].sum())
+
+
+@pytest.mark.parametrize('engine', utils.REPORT_ENGINES, indirect=True)
+def test_comissao_month_start_comes_from_the_caller(comissao, engine):
+    start, end = date(2025, 9, 15), TODAY
+    all_rows = transform_df_comissao(comissao, 'Gerência', start, end, False, None, date(2026, 3, 1))
+    for month_start in (date(2026, 3, 1), date(2026, 2, 1)):
+        result = transform_df_comissao(comissao, 'Gerência', start, end, True, None, month_start)
+        expected = all_rows['Data da Baixa'] > pd.Timestamp(month_start)
+        assert len(result) == expected.sum()
+        assert result['Data da Baixa'].min() > pd.Timestamp(month_start)
+
+
+@pytest.mark.parametrize('engine', utils.REPORT_ENGINES, indirect=True)
+@pytest.mark.parametrize('with_cube', [True, False])
+def test_comissao_agregado_window_comes_from_the_caller(comissao, engine, with_cube):
+    cube = commission_cube(comissao) if with_cube else None
+    result = transform_df_comissao_agregado(comissao, 'Gerência', date(2025, 10, 1), cube=cube)
+    assert list(result.columns) == ['2025-10', '2025-11', '2025-12', '2026-01', '2026-02', '2026-03']
+    window = comissao[comissao['dhbaixa'] >= pd.Timestamp(2025, 10, 1)]
+    assert result.to_numpy().sum() == pytest.approx(window['comiss'].sum())
+    assert list(transform_df_comissao_agregado(comissao, 'Gerência', date(2026, 2, 1), cube=cube).columns) == ['2026-02', '2026-03']
@@ -0,0 +1,103 @@
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import export
+from export import CHUNK_ROWS, ExportService, write_csv, write_parquet, write_xlsx
+
+
+@pytest.fixture(scope='module')
+def report():
+    # Mais de um bloco de CHUNK_ROWS, com valores ausentes em cada tipo de coluna
+    rows = CHUNK_ROWS * 2 + 7
+    return pd.DataFrame({
+        'Cliente': pd.Series(['Cliente A', None, 'Cliente Ç']).repeat(rows // 3 + 1).iloc[:rows].tolist(),
+        'Valor da Nota': [1234.5, float('nan'), 10.0] * (rows // 3) + [1.0] * (rows % 3),
+        'Data Cotada': pd.to_datetime(['2026-03-15', None, '2026-01-02'] * (rows // 3) + ['2026-02-01'] * (rows % 3)),
+    })
+
+
+def test_csv_is_excel_friendly(report):
+    output = BytesIO()
+    write_csv(report, output)
+    data = output.getvalue()
+    assert data.startswith('\ufeff'.encode('utf-8'))
+    # O BOM vai só uma vez, no primeiro bloco, e o cabeçalho também
+    assert data.count('\ufeff'.encode('utf-8')) == 1
+    lines = data.decode('utf-8-sig').splitlines()
+    assert lines[0] == 'Cliente;Valor da Nota;Data Cotada'
+    assert lines[1] == 'Cliente A;1234,5;15/03/2026'
+    assert len(lines) == len(report) + 1
+    result = pd.read_csv(BytesIO(data), sep=';', decimal=',', encoding='utf-8-sig')
+    assert result['Valor da Nota'].sum() == pytest.approx(report['Valor da Nota'].sum())
+
+
+def test_csv_of_empty_report_has_header():
+    output = BytesIO()
+    write_csv(pd.DataFrame(columns=['Cliente', 'Valor da Nota']), output)
+    assert output.getvalue().decode('utf-8-sig').strip() == 'Cliente;Valor da Nota'
+
+
+def test_parquet_round_trip_in_row_groups(report):
+    output = BytesIO()
+    write_parquet(report, output)
+    output.seek(0)
+    parquet = pq.ParquetFile(output)
+    assert parquet.metadata.num_row_groups == 3
+    pd.testing.assert_frame_equal(parquet.read().to_pandas(), report, check_dtype=False)
+
+
+def test_xlsx_writes_every_row():
+    df = pd.DataFrame({'Cliente': ['Cliente A', 'Cliente B'], 'Valor': [1.5, float('nan')],
+                       'Data': pd.to_datetime(['2026-03-15', None])})
+    output = BytesIO()
+    write_xlsx(df, output)
+    with zipfile.ZipFile(output) as workbook:
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert sheet.count('<row ') == 3
+    assert 'Cliente B' in sheet and '<v>1.5</v>' in sheet
+    # A data vira número de série do Excel e os ausentes viram células vazias
+    assert '<v>46096</v>' in sheet
+    assert sheet.count('<c ') == 3 + 3 + 1
+
+
+def test_export_service_reuses_the_file_for_the_same_key(monkeypatch):
+    calls = []
+
+    def writer(df, output):
+        calls.append(len(df))
+        output.write(b'relatorio')
+
+    monkeypatch.setitem(export.WRITERS, 'csv', writer)
+    service = ExportService()
+    df = pd.DataFrame({'a': [1]})
+    key = ('relatorio_estoque', 'VENDEDOR01', 3, ('2026-02-13', '2026-03-15'))
+    assert service.get(key, 'csv') is None
+    first = service.export(key, df, 'csv')
+    assert service.export(key, df, 'csv') is first
+    assert service.get(key, 'csv') is first
+    assert len(calls) == 1
+    # Outra versão dos dados, outro formato ou outro usuário geram o arquivo de novo
+    service.export(key[:2] + (4,) + key[3:], df, 'csv')
+    service.export(('relatorio_estoque', 'VENDEDOR02', 3, key[3]), df, 'csv')
+    assert len(calls) == 3
+
+
+def test_export_service_without_key_does_not_cache(monkeypatch):
+    calls = []
+    monkeypatch.setitem(export.WRITERS, 'csv', lambda df, output: calls.append(output.write(b'x')))
+    service = ExportService()
+    service.export(None, pd.DataFrame(), 'csv')
+    service.export(None, pd.DataFrame(), 'csv')
+    assert len(calls) == 2
+    assert service.get(None, 'csv') is None
+
+
+def test_export_service_skips_files_over_the_budget(monkeypatch):
+    monkeypatch.setitem(export.WRITERS, 'csv', lambda df, output: output.write(b'x' * 100))
+    service = ExportService(max_bytes=50)
+    assert service.export('grande', pd.DataFrame(), 'csv') == b'x' * 100
+    assert service.get('grande', 'csv') is None
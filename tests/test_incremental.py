@@ -0,0 +1,84 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import synthetic
+from datasets import DatasetStore, IncrementalLoader, upsert
+from ingestion import ingest
+from sources import ArrowSource
+
+TODAY = date(2026, 3, 15)
+
+
+def test_upsert_replaces_by_key_and_keeps_categories():
+    snapshot = pd.DataFrame({'nufin': ['1', '2'], 'comiss': [10.0, 20.0], 'apelido': pd.Categorical(['A', 'B'])})
+    delta = pd.DataFrame({'nufin': ['2', '3', '3'], 'comiss': [25.0, 30.0, 31.0], 'apelido': pd.Categorical(['B', 'C', 'C'])})
+    merged, changes = upsert(snapshot, delta, ['nufin'])
+    assert merged.set_index('nufin')['comiss'].to_dict() == {'1': 10.0, '2': 25.0, '3': 31.0}
+    assert merged['apelido'].dtype == 'category'
+    assert list(merged['apelido']) == ['A', 'B', 'C']
+    assert list(changes.removed['nufin']) == ['2']
+    assert list(changes.added['nufin']) == ['2', '3']
+    # O snapshot original continua igual para quem ainda o lê
+    assert snapshot['comiss'].tolist() == [10.0, 20.0]
+
+
+@pytest.fixture
+def comissao():
+    return synthetic.generate('comissao', 3000, sellers=5, seed=2, today=TODAY).sort_values('dhbaixa', ignore_index=True)
+
+
+def test_incremental_loader_fetches_from_inclusive_watermark(comissao):
+    watermark = comissao['dhbaixa'].iloc[2000].normalize()
+    before = comissao[comissao['dhbaixa'] <= watermark]
+    loaded = before.iloc[:-3]
+    client = synthetic.FakeBigQueryClient({'comissao': loaded})
+    source = ArrowSource(client)
+    requested = []
+
+    def fetch(start_date):
+        requested.append(start_date)
+        return source.read('comissao', start_date)
+
+    loader = IncrementalLoader('comissao', fetch)
+    loader()
+    assert loader.watermark == watermark.date()
+    # Chegam linhas do mesmo dia da marca d'água, linhas novas e uma baixa corrigida
+    current = comissao.copy()
+    current.loc[current.index[0], 'comiss'] += 100
+    current.loc[current.index[-1], 'comiss'] += 100
+    client.tables['robo.comissao'] = ('comissao', current)
+    data = loader()
+    assert requested == [None, watermark.date()]
+    # As linhas do dia da marca d'água que voltam iguais não contam como alteração
+    assert len(loader.last_changes.added) == (current['dhbaixa'] >= watermark).sum() - (loaded['dhbaixa'] >= watermark).sum()
+    # A primeira linha é anterior à marca d'água: a correção dela só entra na recarga completa
+    expected = ingest('comissao', pd.concat([comissao.iloc[:1], current.iloc[1:]]))
+    pd.testing.assert_frame_equal(data.sort_values('nufin', ignore_index=True), expected.sort_values('nufin', ignore_index=True),
+                                  check_categorical=False)
+    assert data['apelido'].dtype == 'category'
+    assert not data['nufin'].duplicated().any()
+
+
+def test_incremental_loader_restore_continues_incrementally(comissao):
+    client = synthetic.FakeBigQueryClient({'comissao': comissao})
+    loader = IncrementalLoader('comissao', lambda start_date: ArrowSource(client).read('comissao', start_date))
+    loader.restore(ingest('comissao', comissao))
+    loader()
+    assert loader.last_changes is not None
+    assert "@start_date" in client.queries[-1]
+
+
+def test_refresh_without_changes_keeps_snapshot(comissao):
+    client = synthetic.FakeBigQueryClient({'comissao': comissao})
+    store = DatasetStore(ttl=float('inf'))
+    store.register('comissao', IncrementalLoader('comissao', lambda start_date: ArrowSource(client).read('comissao', start_date)))
+    snapshot = store.snapshot('comissao')
+    fetched_at = snapshot.fetched_at
+    store.refresh('comissao').wait(5)
+    # A consulta incremental trouxe de volta só as linhas já carregadas
+    assert "@start_date" in client.queries[-1]
+    assert store.snapshot('comissao') is snapshot
+    assert snapshot.version == 1
+    assert snapshot.fetched_at > fetched_at
@@ -0,0 +1,17 @@
+from datetime import date
+
+import synthetic
+from datasets import Snapshot
+from indexes import seller_frame
+from ingestion import ingest
+
+TODAY = date(2026, 3, 15)
+
+
+def test_seller_frame():
+    snapshot = Snapshot(ingest('estoque', synthetic.generate('estoque', 500, sellers=3, seed=6, today=TODAY)), 1, 0)
+    rows = seller_frame(snapshot, 'estoque', 'vendedor02')
+    assert len(rows) == (snapshot.data['vendedor'] == 'VENDEDOR02').sum()
+    assert set(rows['vendedor']) == {'VENDEDOR02'}
+    assert seller_frame(snapshot, 'estoque', 'Gerência') is snapshot.data
+    assert seller_frame(snapshot, 'estoque', 'ninguem').empty
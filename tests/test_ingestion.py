@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from ingestion import day_mask, has_day
+
+
+def test_day_mask_sets_one_bit_per_day():
+    mask = day_mask(pd.Series(['1,15,31', '2', None, '', 'x,3', '15, 15', '0,32']))
+    assert mask.dtype == np.uint32
+    assert mask.tolist() == [1 | 1 << 14 | 1 << 30, 1 << 1, 0, 0, 1 << 2, 1 << 14, 0]
+
+
+def test_day_mask_keeps_the_index():
+    series = pd.Series(['5', '6'], index=[10, 20])
+    assert day_mask(series).index.tolist() == [10, 20]
+
+
+def test_has_day():
+    mask = day_mask(pd.Series(['1,15,31', '2', None]))
+    assert has_day(mask, 15).tolist() == [True, False, False]
+    assert has_day(mask, 31).tolist() == [True, False, False]
+    assert has_day(mask, 2).tolist() == [False, True, False]
@@ -0,0 +1,56 @@
+import pytest
+
+from metrics import Recorder, stage_summary
+
+
+def test_span_records_duration_and_tags():
+    recorder = Recorder()
+    with recorder.span('transform', page='Relatório de Estoque', rows_in=10) as record:
+        record['rows_out'] = 4
+    [record] = recorder.records()
+    assert record['stage'] == 'transform' and record['page'] == 'Relatório de Estoque'
+    assert record['rows_in'] == 10 and record['rows_out'] == 4
+    assert record['duration_ms'] >= 0 and 'at' in record
+
+
+def test_span_marks_errors_and_reraises():
+    recorder = Recorder()
+    with pytest.raises(RuntimeError):
+        with recorder.span('fetch', dataset='estoque'):
+            raise RuntimeError("BigQuery fora do ar")
+    assert recorder.records()[0]['error'] is True
+
+
+def test_buffer_keeps_the_latest_records():
+    recorder = Recorder(capacity=3)
+    for rows in range(5):
+        with recorder.span('export', rows_out=rows):
+            pass
+    assert [record['rows_out'] for record in recorder.records()] == [2, 3, 4]
+
+
+def test_cache_ratios():
+    recorder = Recorder()
+    for hit in (True, True, False):
+        recorder.count('resultados', hit)
+    recorder.count('exportação', False)
+    ratios = recorder.cache_ratios().set_index('Cache')
+    assert ratios.loc['resultados'].tolist() == [2, 1, 66.7]
+    assert ratios.loc['exportação'].tolist() == [0, 1, 0.0]
+
+
+def test_stage_summary_groups_by_stage_and_page():
+    records = [{'stage': 'transform', 'page': 'Estoque', 'duration_ms': float(ms), 'rows_out': 10} for ms in range(1, 101)]
+    records += [{'stage': 'fetch', 'dataset': 'comissao', 'duration_ms': 500.0, 'rows': 1000}]
+    summary = stage_summary(records)
+    assert summary['Etapa'].tolist() == ['fetch', 'transform']
+    fetch, transform = summary.to_dict('records')
+    # Etapas fora das páginas aparecem pelo dataset
+    assert fetch['Página'] == 'comissao' and fetch['Linhas (mediana)'] == 1000
+    assert transform['Execuções'] == 100
+    assert transform['p50 (ms)'] == 50.5 and transform['p95 (ms)'] == 95.0 and transform['Máximo (ms)'] == 100.0
+
+
+def test_stage_summary_without_records():
+    summary = stage_summary([])
+    assert summary.empty and 'p95 (ms)' in summary.columns
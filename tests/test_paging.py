@@ -0,0 +1,43 @@
+import pandas as pd
+import streamlit as st
+
+from paging import column_label, page_count, sorted_page, totals
+
+
+def test_sorted_page_without_sort_slices_in_order():
+    df = pd.DataFrame({'a': range(10)}, index=range(100, 110))
+    assert sorted_page(df, 1, 4)['a'].tolist() == [0, 1, 2, 3]
+    assert sorted_page(df, 3, 4)['a'].tolist() == [8, 9]
+    assert sorted_page(df, 4, 4).empty
+
+
+def test_sorted_page_matches_full_sort():
+    df = pd.DataFrame({'valor': [3.0, None, 1.0, 3.0, 2.0, None, 5.0], 'nome': list('abcdefg')},
+                      index=[10, 5, 7, 1, 3, 9, 2])
+    for ascending in (True, False):
+        expected = df.sort_values('valor', ascending=ascending, kind='stable', na_position='last')
+        pages = [sorted_page(df, page, 3, 'valor', ascending) for page in range(1, page_count(len(df), 3) + 1)]
+        pd.testing.assert_frame_equal(pd.concat(pages), expected)
+
+
+def test_page_count():
+    assert page_count(0, 50) == 1
+    assert page_count(50, 50) == 1
+    assert page_count(51, 50) == 2
+
+
+def test_totals_sum_money_columns_of_the_whole_table():
+    df = pd.DataFrame({'Valor da Parcela': [10.0, 20.5], 'Dias Vencidos': [3, 4], 'Cliente': ['A', 'B']})
+    column_config = {
+        'Valor da Parcela': st.column_config.NumberColumn(label="Valor (R$)", format="R$ %.2f"),
+        'Dias Vencidos': st.column_config.NumberColumn(label="Dias Vencidos", format="%d"),
+        'Ausente': st.column_config.NumberColumn(format="R$ %.2f"),
+    }
+    assert totals(df, column_config) == (2, {'Valor (R$)': 30.5})
+    assert totals(df) == (2, {})
+
+
+def test_column_label():
+    assert column_label('codparc', {'codparc': st.column_config.TextColumn(label="Cód. Parceiro")}) == "Cód. Parceiro"
+    assert column_label('codparc', {'codparc': "Parceiro"}) == "Parceiro"
+    assert column_label('codparc') == 'codparc'
@@ -0,0 +1,61 @@
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import synthetic
+from indexes import commission_cube_of
+from prewarm import Publisher, attach_dataset_store
+from utils import commission_cube
+
+TODAY = date(2026, 3, 15)
+
+
+def test_publisher_rebuilds_derived_when_store_skips_a_version(tmp_path):
+    comissao = synthetic.generate('comissao', 3000, sellers=5, seed=7, today=TODAY).sort_values('dhbaixa', ignore_index=True)
+    client = synthetic.FakeBigQueryClient({'comissao': comissao.iloc[:1000]})
+    publisher = Publisher(client, str(tmp_path), datasets=('comissao',))
+    publisher.publish(TODAY)
+    # Duas atualizações do store entre uma publicação e outra: as changes da última não
+    # cobrem as linhas da primeira
+    for rows in (2000, 3000):
+        client.tables['robo.comissao'] = ('comissao', comissao.iloc[:rows])
+        publisher.store.refresh('comissao').wait()
+    publisher.publish(TODAY)
+    published = publisher.published['comissao']
+    assert len(published.data) == 3000
+    assert published.changes is None
+    pd.testing.assert_frame_equal(commission_cube_of(published).sort_index(), commission_cube(published.data).sort_index())
+    # Próxima publicação a partir da versão publicada: volta a ser incremental
+    client.tables['robo.comissao'] = ('comissao', pd.concat([comissao, comissao.iloc[-5:].assign(nufin=comissao['nufin'].iloc[-5:] + 10 ** 6)]))
+    publisher.publish(TODAY)
+    published = publisher.published['comissao']
+    assert published.changes is not None
+    pd.testing.assert_frame_equal(commission_cube_of(published).sort_index(), commission_cube(published.data).sort_index(), check_exact=False)
+
+
+def test_replica_reads_published_version(tmp_path):
+    client = synthetic.FakeBigQueryClient(synthetic.generate_all(500, sellers=3, seed=8, today=TODAY))
+    publisher = Publisher(client, str(tmp_path))
+    publisher.publish(TODAY)
+    store = attach_dataset_store(str(tmp_path))
+    snapshot = store.snapshot('comissao')
+    assert snapshot.version == 1 and len(snapshot.data) == 500
+    assert 'commission_cube' in snapshot.derived
+
+
+def test_replica_waiting_for_one_dataset_serves_the_others(tmp_path):
+    client = synthetic.FakeBigQueryClient(synthetic.generate_all(500, sellers=3, seed=8, today=TODAY))
+    Publisher(client, str(tmp_path), datasets=('comissao',)).publish(TODAY)
+    store = attach_dataset_store(str(tmp_path))
+    store.publish_timeout = 3
+    # Uma sessão espera o estoque, que ainda não foi publicado
+    waiting = threading.Thread(target=lambda: pytest.raises(LookupError, store.snapshot, 'estoque'))
+    waiting.start()
+    time.sleep(0.2)
+    started = time.time()
+    assert store.snapshot('comissao').version == 1
+    assert time.time() - started < 1
+    waiting.join(5)
@@ -0,0 +1,81 @@
+import sqlite3
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import synthetic
+from queries import COLUMNS, TABLES, build_query
+
+TODAY = date(2026, 3, 15)
+
+
+@pytest.fixture(scope='module')
+def tables():
+    return synthetic.generate_all(600, sellers=5, seed=1, today=TODAY)
+
+
+@pytest.fixture(scope='module')
+def connection(tables):
+    # Tabelas robo.* em um banco SQLite em memória, com os valores como vêm da origem
+    connection = sqlite3.connect(':memory:')
+    connection.execute("attach database ':memory:' as robo")
+    for dataset, df in tables.items():
+        df = df.assign(**{column: df[column].dt.strftime('%Y-%m-%d %H:%M:%S') for column in df.columns if df[column].dtype.kind == 'M'})
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        connection.execute(f"create table {TABLES[dataset]['table']} ({', '.join(df.columns)})")
+        connection.executemany(f"insert into {TABLES[dataset]['table']} values ({', '.join('?' * len(df.columns))})", rows)
+    yield connection
+    connection.close()
+
+
+def run(connection, dataset, **kwargs):
+    query, params = build_query(dataset, dialect='sqlite', **kwargs)
+    cursor = connection.execute(query, params)
+    return pd.DataFrame(cursor.fetchall(), columns=[column[0] for column in cursor.description])
+
+
+@pytest.mark.parametrize('dataset', ['estoque', 'inadimplencia', 'comissao'])
+def test_sqlite_date_range_matches_pandas(connection, tables, dataset):
+    # Datas em texto dd/mm/aaaa (estoque, inadimplência) e timestamp (comissão), com os dois
+    # limites inclusivos
+    spec = TABLES[dataset]
+    start, end = date(2025, 12, 1), date(2026, 2, 10)
+    dates = pd.to_datetime(tables[dataset][spec['date_column']], format=spec['date_format']).dt.date
+    expected = tables[dataset][(dates >= start) & (dates <= end)]
+    result = run(connection, dataset, start_date=start, end_date=end)
+    assert 0 < len(result) < len(tables[dataset])
+    assert sorted(result[spec['keys'][0]]) == sorted(expected[spec['keys'][0]])
+
+
+def test_sqlite_seller_filter(connection, tables):
+    result = run(connection, 'comissao', user_name='vendedor02')
+    assert set(result['apelido']) == {'VENDEDOR02'}
+    assert len(result) == (tables['comissao']['apelido'] == 'VENDEDOR02').sum()
+
+
+def test_gerencia_reads_every_seller(connection, tables):
+    query, params = build_query('estoque', user_name='Gerência', dialect='sqlite')
+    assert 'where' not in query and params == {}
+    assert len(run(connection, 'estoque', user_name='Gerência')) == len(tables['estoque'])
+
+
+def test_projection_and_default_columns(connection):
+    assert list(run(connection, 'contatos', columns=['codparc', 'apelido']).columns) == ['codparc', 'apelido']
+    assert list(run(connection, 'contatos').columns) == COLUMNS['contatos']
+
+
+def test_sqlite_params_are_iso_strings():
+    _, params = build_query('estoque', start_date=date(2026, 1, 5), user_name='vendedor01', dialect='sqlite')
+    assert params == {'start_date': '2026-01-05', 'vendedor': 'VENDEDOR01'}
+
+
+def test_bigquery_dialect_parses_text_dates():
+    query, params = build_query('inadimplencia', start_date=date(2026, 1, 5))
+    assert "PARSE_DATE('%d/%m/%Y', data_de_vencimento) >= @start_date" in query
+    assert params == {'start_date': date(2026, 1, 5)}
+
+
+def test_date_filter_requires_date_column():
+    with pytest.raises(ValueError):
+        build_query('contatos', start_date=date(2026, 1, 5))
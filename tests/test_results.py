@@ -0,0 +1,78 @@
+import pandas as pd
+
+from results import ResultCache, cache_key, frame_size
+
+
+def frame(rows):
+    return pd.DataFrame({'valor': [1.0] * rows})
+
+
+class Counter:
+    # compute() que conta as chamadas e devolve sempre o mesmo DataFrame
+    def __init__(self, df):
+        self.df = df
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.df
+
+
+def test_same_key_computes_once():
+    cache = ResultCache()
+    compute = Counter(frame(10))
+    key = cache_key('Estoque', 1, 'VENDEDOR01', 'transform_df_estoque', ('2026-02-13', '2026-03-15'), {})
+    assert cache.get_or_compute(key, compute) is compute.df
+    assert cache.get_or_compute(key, compute) is compute.df
+    assert compute.calls == 1
+
+
+def test_cache_key_ignores_dataframes_and_kwarg_order():
+    totals = frame(3)
+    first = cache_key('Contatos', 2, 'Gerência', 'transform_df_contatosagregados', (totals, None), {'a': 1, 'totals': totals, 'b': 2})
+    second = cache_key('Contatos', 2, 'Gerência', 'transform_df_contatosagregados', (frame(5), None), {'b': 2, 'a': 1})
+    assert first == second
+
+
+def test_newer_version_drops_older_results():
+    cache = ResultCache()
+    old = ('Estoque', 1, 'Gerência', 'transform_df_estoque', (), ())
+    other_page = ('Comissão', 1, 'Gerência', 'transform_df_comissao', (), ())
+    cache.get_or_compute(old, Counter(frame(10)))
+    cache.get_or_compute(other_page, Counter(frame(10)))
+    cache.get_or_compute(old[:1] + (2,) + old[2:], Counter(frame(10)))
+    assert cache.usage()['Resultados guardados'] == 2
+    # Uma sessão ainda na versão 1 recebe o resultado, mas ele não volta ao cache
+    stale = Counter(frame(10))
+    cache.get_or_compute(old, stale)
+    cache.get_or_compute(old, stale)
+    assert stale.calls == 2
+    # As outras páginas não são afetadas
+    compute = Counter(frame(10))
+    cache.get_or_compute(other_page, compute)
+    assert compute.calls == 0
+
+
+def test_byte_budget_evicts_least_recently_used():
+    size = frame_size(frame(1000))
+    cache = ResultCache(max_bytes=size * 2)
+    keys = [('Estoque', 1, 'Gerência', 'transform_df_estoque', (day,), ()) for day in range(3)]
+    cache.get_or_compute(keys[0], Counter(frame(1000)))
+    cache.get_or_compute(keys[1], Counter(frame(1000)))
+    cache.get_or_compute(keys[0], Counter(frame(1000)))
+    cache.get_or_compute(keys[2], Counter(frame(1000)))
+    assert cache.usage()['Resultados guardados'] == 2
+    # keys[1] foi o menos usado recentemente e saiu
+    compute = Counter(frame(1000))
+    cache.get_or_compute(keys[1], compute)
+    assert compute.calls == 1
+
+
+def test_result_over_the_budget_is_not_cached():
+    cache = ResultCache(max_bytes=100)
+    key = ('Estoque', 1, 'Gerência', 'transform_df_estoque', (), ())
+    compute = Counter(frame(1000))
+    assert cache.get_or_compute(key, compute) is compute.df
+    cache.get_or_compute(key, compute)
+    assert compute.calls == 2
+    assert cache.usage()['Resultados guardados'] == 0
@@ -0,0 +1,14 @@
+import pandas as pd
+
+from datasets import Changes, Snapshot
+
+
+def test_derive_does_not_touch_previous_snapshot():
+    previous = Snapshot(pd.DataFrame({'a': [1, 2]}), 1, 0)
+    previous.derive('total', lambda df: df['a'].sum())
+    added = pd.DataFrame({'a': [3]})
+    snapshot = Snapshot(pd.concat([previous.data, added], ignore_index=True), 2, 0, previous=previous,
+                        changes=Changes(previous.data.iloc[0:0], added))
+    assert snapshot.derive('total', lambda df: df['a'].sum(), update=lambda total, df, changes: total + changes.added['a'].sum()) == 6
+    assert previous.derived == {'total': 3}
+    assert snapshot.base_version == 1
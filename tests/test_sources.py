@@ -0,0 +1,52 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import synthetic
+from queries import COLUMNS
+from sources import ArrowSource, StreamingSource
+
+TODAY = date(2026, 3, 15)
+
+
+@pytest.fixture(scope='module')
+def client():
+    # Batches e blocos pequenos, para o resultado passar por vários blocos de tamanhos diferentes
+    return synthetic.FakeBigQueryClient(synthetic.generate_all(5000, sellers=5, seed=3, today=TODAY), batch_rows=700)
+
+
+@pytest.mark.parametrize('dataset', list(COLUMNS))
+def test_streaming_matches_whole_table(client, dataset):
+    expected = ArrowSource(client).read(dataset)
+    result = StreamingSource(client, chunk_rows=1500).read(dataset)
+    pd.testing.assert_frame_equal(result, expected, check_index_type=False)
+
+
+@pytest.mark.parametrize('dataset', ['estoque', 'inadimplencia', 'comissao'])
+def test_streaming_incremental_read_matches(client, dataset):
+    start_date = date(2026, 1, 1)
+    expected = ArrowSource(client).read(dataset, start_date)
+    result = StreamingSource(client, chunk_rows=1500).read(dataset, start_date)
+    assert 0 < len(result) < 5000
+    pd.testing.assert_frame_equal(result, expected, check_index_type=False)
+
+
+def test_streaming_empty_result_has_typed_columns(client):
+    expected = ArrowSource(client).read('comissao', date(2030, 1, 1))
+    result = StreamingSource(client).read('comissao', date(2030, 1, 1))
+    assert result.empty and list(result.columns) == list(expected.columns)
+    assert result.dtypes.equals(expected.dtypes)
+
+
+def test_streaming_window_drops_old_rows(client):
+    result = StreamingSource(client, chunk_rows=1500, windows={'estoque': 30}).read('estoque')
+    full = ArrowSource(client).read('estoque')
+    limit = pd.Timestamp.today().normalize() - pd.Timedelta(days=30)
+    assert (result['data_cotada'] >= limit).all()
+    assert len(result) == (full['data_cotada'] >= limit).sum()
+
+
+def test_window_requires_date_column(client):
+    with pytest.raises(ValueError):
+        StreamingSource(client, windows={'contatos': 30})
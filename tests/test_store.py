@@ -0,0 +1,77 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from datasets import DatasetStore
+
+
+class BlockingLoader:
+    # Loader que só termina quando o teste libera, contando as chamadas
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_concurrent_first_load_runs_one_query():
+    loader = BlockingLoader([pd.DataFrame({'a': [1]})])
+    store = DatasetStore(ttl=600)
+    store.register('estoque', loader)
+    snapshots = []
+    threads = [threading.Thread(target=lambda: snapshots.append(store.snapshot('estoque'))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    assert store.refresh('estoque') is store.refresh('estoque')
+    loader.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert loader.calls == 1
+    assert len(snapshots) == 5 and all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert snapshots[0].version == 1
+
+
+def test_failed_refresh_keeps_serving_stale_snapshot():
+    first = pd.DataFrame({'a': [1]})
+    loader = BlockingLoader([first, RuntimeError("BigQuery fora do ar"), pd.DataFrame({'a': [2]})])
+    loader.release.set()
+    store = DatasetStore(ttl=float('inf'))
+    store.register('estoque', loader)
+    stale = store.snapshot('estoque')
+
+    def expire():
+        # Leitura expirada: devolve o snapshot atual na hora e atualiza em segundo plano
+        loader.release.clear()
+        store.ttl = 0
+        snapshot = store.snapshot('estoque')
+        store.ttl = float('inf')
+        event = store.refresh('estoque')
+        loader.release.set()
+        event.wait(5)
+        return snapshot
+
+    assert expire() is stale
+    assert loader.calls == 2
+    assert store.snapshot('estoque') is stale
+    # A atualização que falhou não trava as próximas: a leitura seguinte tenta de novo
+    assert expire() is stale
+    assert loader.calls == 3
+    assert store.snapshot('estoque').version == 2
+    assert store.snapshot('estoque').data['a'].tolist() == [2]
+
+
+def test_failed_first_load_raises():
+    loader = BlockingLoader([RuntimeError("BigQuery fora do ar")])
+    loader.release.set()
+    store = DatasetStore()
+    store.register('estoque', loader)
+    with pytest.raises(RuntimeError, match="fora do ar"):
+        store.snapshot('estoque')
@@ -0,0 +1,67 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import synthetic
+from datasets import Snapshot
+from ingestion import has_day, ingest
+from summaries import EMPTY, card_windows, contatos_summary, estoque_summary, inadimplencia_summary, summary_of
+
+TODAY = date(2026, 3, 15)
+
+
+@pytest.fixture(scope='module')
+def tables():
+    return {dataset: ingest(dataset, df) for dataset, df in synthetic.generate_all(1500, sellers=4, seed=11, today=TODAY).items()}
+
+
+def test_card_windows():
+    windows = card_windows(date(2026, 3, 15))
+    assert windows['estoque'] == {'start_date': date(2026, 2, 13), 'end_date': date(2026, 3, 15)}
+    assert windows['inadimplencia'] == {'start_date': date(2025, 9, 16), 'end_date': date(2026, 2, 28)}
+    assert windows['contatos'] == {'day': 15}
+
+
+def test_estoque_summary_matches_filter(tables):
+    df = tables['estoque']
+    window = card_windows(TODAY)['estoque']
+    summary = estoque_summary(df, **window)
+    in_window = (df['pos_cotacao'] < 0) & (df['data_cotada'] >= pd.Timestamp(window['start_date'])) & (df['data_cotada'] <= pd.Timestamp(window['end_date']))
+    assert summary['Gerência'] == {'cotacoes': int(in_window.sum())}
+    assert summary['VENDEDOR01'] == {'cotacoes': int((in_window & (df['vendedor'] == 'VENDEDOR01')).sum())}
+    assert sum(row['cotacoes'] for seller, row in summary.items() if seller != 'Gerência') <= summary['Gerência']['cotacoes']
+
+
+def test_inadimplencia_summary_matches_filter(tables):
+    df = tables['inadimplencia']
+    window = card_windows(TODAY)['inadimplencia']
+    summary = inadimplencia_summary(df, **window)
+    overdue = (df['data_de_vencimento'] >= pd.Timestamp(window['start_date'])) & (df['data_de_vencimento'] <= pd.Timestamp(window['end_date']))
+    seller = overdue & (df['vendedor'] == 'VENDEDOR02')
+    assert summary['Gerência']['notas'] == overdue.sum()
+    assert summary['Gerência']['valor'] == pytest.approx(df.loc[overdue, 'valor_parcela'].sum())
+    assert summary['VENDEDOR02']['notas'] == seller.sum()
+    assert summary['VENDEDOR02']['valor'] == pytest.approx(df.loc[seller, 'valor_parcela'].sum())
+
+
+def test_contatos_summary_matches_filter(tables):
+    df = tables['contatos']
+    summary = contatos_summary(df, 15)
+    seller = df[df['apelido'] == 'VENDEDOR03']
+    assert summary['VENDEDOR03']['porcentagem'] == round(seller['contato_feito'].sum() / len(seller) * 100, 2)
+    assert summary['VENDEDOR03']['ligar_hoje'] == has_day(seller['dias_cotar_mask'], 15).sum()
+    assert summary['Gerência']['ligar_hoje'] == has_day(df['dias_cotar_mask'], 15).sum()
+
+
+def test_summary_of_is_built_once_per_window(tables):
+    snapshot = Snapshot(tables['estoque'], 1, 0)
+    window = card_windows(TODAY)['estoque']
+    assert summary_of(snapshot, 'estoque', 'vendedor01', **window) == estoque_summary(tables['estoque'], **window)['VENDEDOR01']
+    assert len(snapshot.derived) == 1
+    summary_of(snapshot, 'estoque', 'Gerência', **window)
+    assert len(snapshot.derived) == 1
+    summary_of(snapshot, 'estoque', 'Gerência', **card_windows(date(2026, 3, 16))['estoque'])
+    assert len(snapshot.derived) == 2
+    # Vendedor sem linhas no dataset recebe as métricas zeradas
+    assert summary_of(snapshot, 'estoque', 'ninguem', **window) == EMPTY['estoque']
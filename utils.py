@@ -1,15 +1,44 @@
 import os
-from google.cloud import bigquery
 import pandas as pd
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
 import numpy as np
+from functools import wraps
+from ingestion import has_day
 
-hoje = datetime.now()
+# Os DataFrames vindos do store são compartilhados entre sessões e nunca são alterados;
+# com copy-on-write, seleções de colunas e renames não copiam os dados
+pd.set_option('mode.copy_on_write', True)
 
-inicio_mes_vigente = datetime(hoje.year, hoje.month, 1)
+# Nomes das colunas exibidos nos relatórios
+LABELS_ESTOQUE = {'n_da_nota':'N. da Nota', 'valor_da_nota':'Valor da Nota', 'data_cotada':'Data Cotada', 'cliente':'Cliente', 'vendedor':'Vendedor', 'empresa':'Empresa', 'produto':'Produto', 'caracteristica':'Característica', 'cotado':'Cotado', 'estoque':'Estoque', 'pos_cotacao':'Pós-Cotação'}
+LABELS_INADIMPLENCIA = {'codigo_parceiro':'Código Parceiro', 'nome_parceiro':'Nome Parceiro', 'vendedor':'Vendedor', 'data_de_vencimento':'Data de Vencimento', 'numero_da_nota':'N. da Nota', 'descricao_oper':'Descrição da Operação', 'numero_parcela':'N. da Parcela', 'tipo_de_titulo':'Tipo de Título', 'dias_vencidos':'Dias Vencidos', 'valor_parcela':'Valor da Parcela', 'historico':'Histórico', 'codemp':'Empresa'}
+LABELS_COMISSAO = {'nufin':'N. Financeiro','numnota':'N. da Nota', 'dhbaixa':'Data da Baixa', 'dtfatur':'Data Faturada', 'dtvenc':'Data de Vencimento',  'diaatraso':'Dias Atrasado', 'parcela':'Parcela', 'codparc':'Cód. Parceiro', 'nomeparc':'Nome do Parceiro', 'vlrdesdob':'Valor do Desdobramento', 'comissao':'Comissão %', 'comiss':'Comissão', 'apelido':'Vendedor', 'codvend':'Cód. do Vendedor'}
 
-first_day_six_months_ago = (hoje - relativedelta(months=6)).replace(day=1)
+# Colunas auxiliares da ingestão que não aparecem nos relatórios
+INTERNAL_COLUMNS = ['dias_cotar_mask', 'dias_pedido_mask', 'contato_feito', 'fez_telemarketing', 'cotou', 'vendeu']
+
+# Motor dos relatórios: 'pandas' (as funções abaixo) ou 'duckdb' (as mesmas consultas em SQL,
+# em sql_reports.py). Escolhido pela variável de ambiente REPORT_ENGINE ou por set_report_engine()
+REPORT_ENGINES = ('pandas', 'duckdb')
+REPORT_ENGINE = os.environ.get('REPORT_ENGINE', 'pandas')
+
+def set_report_engine(engine):
+    global REPORT_ENGINE
+    if engine not in REPORT_ENGINES:
+        raise ValueError(f"Motor de relatórios '{engine}' não suportado.")
+    REPORT_ENGINE = engine
+
+def report_engine(index=None):
+    # Com o motor duckdb, a chamada vai para a função de mesmo nome em sql_reports e o
+    # resultado Arrow volta como DataFrame (index: coluna que o pandas devolve como índice)
+    def decorator(transform):
+        @wraps(transform)
+        def dispatch(*args, **kwargs):
+            if REPORT_ENGINE == 'duckdb':
+                import sql_reports
+                return sql_reports.to_frame(getattr(sql_reports, transform.__name__)(*args, **kwargs), index=index)
+            return transform(*args, **kwargs)
+        return dispatch
+    return decorator
 
 def format_numbers_br(df, cols):
     for col in cols:
@@ -18,139 +47,160 @@ def format_numbers_br(df, cols):
         )
     return df
 
+def filter_rows(df, mask):
+    # Evita copiar a tabela inteira quando a máscara não remove nenhuma linha
+    return df if mask.all() else df[mask]
+
 def connect_bigquery():
+    # Importado aqui: o google-cloud-bigquery leva ~0,6s para carregar e só é usado por quem
+    # consulta o BigQuery (não pela tela de login nem pelas réplicas em DATASET_MODE=worker)
+    from google.cloud import bigquery
     os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "googlecredentials.json"
     project_id = 'manchester-ai'
     cliente = bigquery.Client()
     return cliente
 
 
+@report_engine()
 def transform_df_estoque(df, start_date, end_date, name):
-    # Converte as datas para o tipo datetime64
-        print(df.columns)
+    # O DataFrame já chega tipado pela ingestão (ingestion.py) e é compartilhado entre as sessões:
+    # os filtros viram uma única máscara e o rename acontece só no final, sem alterar a entrada
         start_date = pd.to_datetime(start_date)
         end_date = pd.to_datetime(end_date)
     
-        df['data_cotada'] = pd.to_datetime(df['data_cotada'], format = '%d/%m/%Y')
-    # Filtra o DataFrame pelas datas escolhidas
-        df = df[(df['data_cotada'] >= start_date) & (df['data_cotada'] <= end_date)]
-    
-        df = df[df['pos_cotacao'] < 0] 
+    # Filtra o DataFrame pelas datas escolhidas e pelas cotações sem estoque
+        mask = (df['data_cotada'] >= start_date) & (df['data_cotada'] <= end_date) & (df['pos_cotacao'] < 0)
         # df = format_numbers_br(df = df, cols = ['valor_da_nota', 'cotado', 'estoque', 'pos_cotacao'])
-        df['n_da_nota'] = df['n_da_nota'].astype(str)
-        df.rename(columns={'n_da_nota':'N. da Nota', 'valor_da_nota':'Valor da Nota', 'data_cotada':'Data Cotada', 'cliente':'Cliente', 'vendedor':'Vendedor', 'empresa':'Empresa', 'produto':'Produto', 'caracteristica':'Característica', 'cotado':'Cotado', 'estoque':'Estoque', 'pos_cotacao':'Pós-Cotação'}, inplace = True)
         if name != 'Gerência':
-            df = df[df['Vendedor'] == name.upper()]
-            df.drop(columns = ['Vendedor'], inplace = True)
+            df = filter_rows(df, mask & (df['vendedor'] == name.upper())).drop(columns = ['vendedor'])
         else:
-            pass
-        return df
+            df = filter_rows(df, mask)
+        return df.rename(columns=LABELS_ESTOQUE)
     
+@report_engine()
 def transform_df_inadimplencia(df, start_date, end_date, name, checkbox_90_days):
-    # Converte as datas para o tipo datetime64
+    # O DataFrame já chega tipado pela ingestão (ingestion.py) e é compartilhado entre as sessões:
+    # os filtros viram uma única máscara e o rename acontece só no final, sem alterar a entrada
         start_date = pd.to_datetime(start_date)
         end_date = pd.to_datetime(end_date)
-        if 'valor_da_nota' in df.columns:
-            df.drop(columns=['valor_da_nota'], inplace=True)
-        # df.drop(columns=['valor_da_nota'], inplace=True)
-        df['data_de_vencimento'] = pd.to_datetime(df['data_de_vencimento'], format = '%d/%m/%Y')
     # Filtra o DataFrame pelas datas escolhidas
-        df = df[(df['data_de_vencimento'] >= start_date) & (df['data_de_vencimento'] <= end_date)]
-    
-        df['numero_da_nota'] = df['numero_da_nota'].astype(str)
-        df['codigo_parceiro'] = df['codigo_parceiro'].astype(str)
-        df['dias_vencidos'] = df['dias_vencidos'].astype(int)
-        df.rename(columns={'codigo_parceiro':'Código Parceiro', 'nome_parceiro':'Nome Parceiro', 'vendedor':'Vendedor', 'data_de_vencimento':'Data de Vencimento', 'numero_da_nota':'N. da Nota', 'descricao_oper':'Descrição da Operação', 'numero_parcela':'N. da Parcela', 'tipo_de_titulo':'Tipo de Título', 'dias_vencidos':'Dias Vencidos', 'valor_parcela':'Valor da Parcela', 'historico':'Histórico', 'codemp':'Empresa'}, inplace = True)
+        mask = (df['data_de_vencimento'] >= start_date) & (df['data_de_vencimento'] <= end_date)
         if checkbox_90_days:
-            df = df[(df['Dias Vencidos'] <= 90) & (df['Tipo de Título'] != 'INCLUIDO NO SERASA') & (df['Tipo de Título'] != 'PROTESTO')] 
+            mask &= (df['dias_vencidos'] <= 90) & (df['tipo_de_titulo'] != 'INCLUIDO NO SERASA') & (df['tipo_de_titulo'] != 'PROTESTO')
+        drop_columns = ['valor_da_nota']
         if name != 'Gerência':
-            df = df[df['Vendedor'] == name.upper()]
-            df.drop(columns = ['Vendedor'], inplace = True)
-        else:
-            pass
-        return df
+            mask &= df['vendedor'] == name.upper()
+            drop_columns.append('vendedor')
+        return filter_rows(df, mask).drop(columns = drop_columns, errors = 'ignore').rename(columns=LABELS_INADIMPLENCIA)
     
+@report_engine()
 def transform_df_contatos(df, name, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda):
-    df['codparc'] = df['codparc'].astype(str)
     # df.rename(columns={'codparc':'Código Parceiro', 'apelido':'Vendedor', 'nomeparc':'Nome do Parceiro', 'telemarketing_feito':'Fez telemarketing?', 'cotacao_feita':'Cotou?', 'contactou_ou_nao':'Fez contato esse mês?', 'ult_tele':'Último Telemarketing', 'ult_cotacao':'Última Cotação', 'ult_venda':'Última Venda', 'venda_feita':'Vendeu?', 'tempo_ultima_venda':'Dias desde Última Venda', 'dias_preferidos_cotar':'Dia Preferido para Contato', 'qtd_compras':'N de Compras', 'vlr_compras':'Valor das Compras', 'dias_preferidos_pedido':'Dia Preferido para Pedidos', 'vlr_gasto_mes_passado':'Valor Gasto Mês Passado', 'vlr_gasto_mes_atual':'Valor Gasto Mês Atual', 'elasticidade':'Elasticidade', 'vergalhao':'Vergalhão', 'cd':'C/D', 'arame':'Arame', 'prego':'Prego', 'estribo':'Estribo', 'coluna':'Coluna', 'tela_soldada':'Tela Soldada', 'trelica':'Treliça', 'radier':'Radier', 'bba':'BBA', 'cercamento':'Cercamento', 'perfil':'Perfil'}, inplace = True)
-    df['ult_venda'] = pd.to_datetime(df['ult_venda'], format='%d/%M/%Y')
-    df['ult_tele'] = pd.to_datetime(df['ult_tele'], format='%Y/%M/%d')
     if name != 'Gerência':
         df = df[(df['contactou_ou_nao'] == 'Não contactou') & (df['apelido'] == name.upper())]
         # df.drop(columns = ['apelido', 'cotacao_feita', 'telemarketing_feito', 'contactou_ou_nao', 'venda_feita', 'tempo_ultima_venda'], inplace = True)
-        df = df[['codparc', 'nomeparc', 'ult_tele', 'ult_cotacao', 'ult_venda']]
-    else:
-        if selectbox_vendedor:
-            df = df[df['apelido'] == selectbox_vendedor]
-        if selectbox_telemarketing:
-            df = df[df['telemarketing_feito'] == selectbox_telemarketing]
-        if selectbox_cotacao:
-            df = df[df['cotacao_feita'] == selectbox_cotacao]
-        if selectbox_venda:
-            df = df[df['venda_feita'] == selectbox_venda]
-    return df
+        return df[['codparc', 'nomeparc', 'ult_tele', 'ult_cotacao', 'ult_venda']]
+    df = filter_rows(df, manager_filter_mask(df, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda))
+    return df.drop(columns=INTERNAL_COLUMNS, errors='ignore')
+
+def manager_filter_mask(df, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda):
+    # Filtros da Gerência combinados em uma única máscara sobre o DataFrame de contatos
+    mask = pd.Series(True, index=df.index)
+    if selectbox_vendedor:
+        mask &= df['apelido'] == selectbox_vendedor
+    if selectbox_telemarketing:
+        mask &= df['telemarketing_feito'] == selectbox_telemarketing
+    if selectbox_cotacao:
+        mask &= df['cotacao_feita'] == selectbox_cotacao
+    if selectbox_venda:
+        mask &= df['venda_feita'] == selectbox_venda
+    return mask
+
+def contact_totals(df):
+    # Totais de contatos por vendedor: somas vetorizadas das colunas indicadoras da ingestão
+    return df.groupby('apelido', observed=True).agg(
+        Carteira=('codparc', 'size'),
+        Contatos=('contato_feito', 'sum'),
+        Fez_telemarketing=('fez_telemarketing', 'sum'),
+        Cotou=('cotou', 'sum'),
+        Vendeu=('vendeu', 'sum'),
+        Ultima_Venda=('tempo_ultima_venda', 'min')
+        )
 
-def transform_df_contatosagregados(df, name):
+@report_engine()
+def transform_df_contatosagregados(df, name, totals=None):
     # df['codparc'] = df['codparc'].astype(str)
     # df.rename(columns={'codparc':'Código Parceiro', 'apelido':'Vendedor', 'nomeparc':'Nome do Parceiro', 'telemarketing_feito':'Fez telemarketing?', 'cotacao_feita':'Cotou?', 'contactou_ou_nao':'Fez contato esse mês?', 'ult_tele':'Último Telemarketing', 'ult_cotacao':'Última Cotação', 'ult_venda':'Última Venda', 'venda_feita':'Vendeu?'}, inplace = True)
     # df = df[~df['tempo_ultima_venda'].isna()]
     # df = df[df['tempo_ultima_venda'] < 90]
-    df_agrupado = df.groupby('apelido').agg(
-        Carteira=('codparc', 'size'),
-        Contatos=('contactou_ou_nao', lambda x: (x == 'Contato feito').sum()),
-        Fez_telemarketing=('telemarketing_feito', lambda x: (x == 'Entrou em contato esse mês').sum()),
-        Cotou=('cotacao_feita', lambda x: (x == 'Cotou esse mês').sum()),
-        Vendeu=('venda_feita', lambda x: (x == 'Vendeu esse mês').sum()),
-        Ultima_Venda=('tempo_ultima_venda', 'min')
-        )
+    # totals pode vir pronto do snapshot (calculado uma vez por versão)
+    df_agrupado = contact_totals(df) if totals is None else totals
     df_agrupado = df_agrupado[(df_agrupado['Ultima_Venda'].notna() | df_agrupado['Ultima_Venda'] < 90) & (df_agrupado['Contatos'] != 0)]
-    df_agrupado.drop(columns = ['Ultima_Venda'], inplace = True)
-    df_agrupado['Faltam contatos'] = df_agrupado['Carteira'] - df_agrupado['Contatos']
-    df_agrupado['Porcentagem'] = (df_agrupado['Contatos'] / df_agrupado['Carteira']) * 100
+    df_agrupado = df_agrupado.drop(columns = ['Ultima_Venda'])
+    df_agrupado = df_agrupado.assign(**{'Faltam contatos': df_agrupado['Carteira'] - df_agrupado['Contatos'],
+                                        'Porcentagem': (df_agrupado['Contatos'] / df_agrupado['Carteira']) * 100})
     df_agrupado = df_agrupado.reset_index()
-    df_agrupado.rename(columns = {'apelido':'Vendedor', 'Fez_telemarketing':'Fez telemarketing', }, inplace = True)
-    df_agrupado.sort_values(by='Porcentagem', ascending = False, inplace = True)
-    return df_agrupado
+    df_agrupado = df_agrupado.rename(columns = {'apelido':'Vendedor', 'Fez_telemarketing':'Fez telemarketing', })
+    return df_agrupado.sort_values(by='Porcentagem', ascending = False)
 
-def transform_df_comissao(df, name, start_date, end_date, mes_vigente, selectbox_vendedor):
+@report_engine()
+def transform_df_comissao(df, name, start_date, end_date, mes_vigente, selectbox_vendedor, month_start):
     start_date = pd.to_datetime(start_date)
     end_date = pd.to_datetime(end_date)
-    df = df[(df['dhbaixa'] >= start_date) & (df['dhbaixa'] <= end_date)]
-    
-    df.rename(columns={'nufin':'N. Financeiro','numnota':'N. da Nota', 'dhbaixa':'Data da Baixa', 'dtfatur':'Data Faturada', 'dtvenc':'Data de Vencimento',  'diaatraso':'Dias Atrasado', 'parcela':'Parcela', 'codparc':'Cód. Parceiro', 'nomeparc':'Nome do Parceiro', 'vlrdesdob':'Valor do Desdobramento', 'comissao':'Comissão %', 'comiss':'Comissão', 'apelido':'Vendedor', 'codvend':'Cód. do Vendedor'}, inplace=True)
-    df.drop(columns=['numnota2'], inplace=True)
-    
-    df['N. Financeiro'] = df['N. Financeiro'].astype(str)
-    df['N. da Nota'] = df['N. da Nota'].astype(str)
-    df['Cód. Parceiro'] = df['Cód. Parceiro'].astype(str)
+    mask = (df['dhbaixa'] >= start_date) & (df['dhbaixa'] <= end_date)
     
     if mes_vigente:
-        df = df[df['Data da Baixa'] > inicio_mes_vigente]
-        
+        mask &= df['dhbaixa'] > pd.Timestamp(month_start)
+    
+    drop_columns = ['numnota2']
     if name != 'Gerência':
-            df = df[df['Vendedor'] == name.upper()]
-            df.drop(columns = ['Vendedor', 'Cód. do Vendedor'], inplace = True)
+            mask &= df['apelido'] == name.upper()
+            drop_columns += ['apelido', 'codvend']
     else:
         if selectbox_vendedor: 
-            df = df[df['Vendedor'] == selectbox_vendedor]                    
+            mask &= df['apelido'] == selectbox_vendedor
                         
-    return df
+    return filter_rows(df, mask).drop(columns=drop_columns, errors='ignore').rename(columns=LABELS_COMISSAO)
+
+def commission_cube(df):
+    # Cubo vendedor × mês da baixa: soma das comissões e número de baixas de cada célula.
+    # O vendedor fica como texto no índice, para que cubos de recortes diferentes (ex.: linhas
+    # novas de uma atualização) se somem alinhados
+    month = df['dhbaixa'].dt.to_period('M').dt.to_timestamp().rename('month')
+    cube = df.groupby([df['apelido'], month], observed=True).agg(comiss=('comiss', 'sum'), baixas=('comiss', 'size'))
+    return cube.set_axis(cube.index.set_levels(cube.index.levels[0].astype(object), level='apelido'))
 
-def transform_df_comissao_agregado(df, name):    
-    df['dhbaixa'] = pd.to_datetime(df['dhbaixa'])
-    df = df[['apelido', 'dhbaixa', 'comiss']]
-    df = df[df['dhbaixa'] >= first_day_six_months_ago]
-    df['year_month'] = df['dhbaixa'].dt.to_period('M')
-    df_grouped = df.groupby(['apelido', 'year_month'])['comiss'].sum().reset_index() 
-    df_pivot = df_grouped.pivot(index='apelido', columns='year_month', values='comiss').fillna(0)
+def commission_slice(cube, name, start=None, end=None):
+    # Recorte do cubo por vendedor (a Gerência vê todos) e por meses, sem voltar às linhas
+    mask = np.ones(len(cube), dtype=bool)
+    months = cube.index.get_level_values('month')
+    if name != 'Gerência':
+        mask &= cube.index.get_level_values('apelido') == name.upper()
+    if start is not None:
+        mask &= months >= pd.Timestamp(start)
+    if end is not None:
+        mask &= months <= pd.Timestamp(end)
+    return cube[mask]
+
+def commission_of_month(cube, name, month):
+    # Comissão do mês (primeiro dia do mês) do vendedor ou da empresa inteira
+    return float(commission_slice(cube, name, month, month)['comiss'].sum())
+
+@report_engine(index='apelido')
+def transform_df_comissao_agregado(df, name, window_start, cube=None):
+    # Janela móvel dos meses desde window_start (primeiro dia do mês), recortada do cubo do snapshot; sem o cubo, monta um
+    # só com as linhas recebidas (já recortadas por vendedor) dentro da janela
+    if cube is None:
+        window = commission_cube(df[df['dhbaixa'] >= pd.Timestamp(window_start)])
+    else:
+        window = commission_slice(cube, name, start=window_start)
+    df_pivot = window['comiss'].unstack('month', fill_value=0.0)
     df_pivot.columns = [f"{col.strftime('%Y-%m')}" for col in df_pivot.columns]
     return df_pivot
 
-def transform_df_vendas(df, name, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda, melhor_dia):
-    df['codparc'] = df['codparc'].astype(str)
+@report_engine()
+def transform_df_vendas(df, name, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda, melhor_dia, day):
     # df.rename(columns={'codparc':'Código Parceiro', 'apelido':'Vendedor', 'nomeparc':'Nome do Parceiro', 'telemarketing_feito':'Fez telemarketing?', 'cotacao_feita':'Cotou?', 'contactou_ou_nao':'Fez contato esse mês?', 'ult_tele':'Último Telemarketing', 'ult_cotacao':'Última Cotação', 'ult_venda':'Última Venda', 'venda_feita':'Vendeu?', 'tempo_ultima_venda':'Dias desde Última Venda', 'dias_preferidos_cotar':'Dia Preferido para Contato', 'qtd_compras':'N de Compras', 'vlr_compras':'Valor das Compras', 'dias_preferidos_pedido':'Dia Preferido para Pedidos', 'vlr_gasto_mes_passado':'Valor Gasto Mês Passado', 'vlr_gasto_mes_atual':'Valor Gasto Mês Atual', 'elasticidade':'Elasticidade', 'vergalhao':'Vergalhão', 'cd':'C/D', 'arame':'Arame', 'prego':'Prego', 'estribo':'Estribo', 'coluna':'Coluna', 'tela_soldada':'Tela Soldada', 'trelica':'Treliça', 'radier':'Radier', 'bba':'BBA', 'cercamento':'Cercamento', 'perfil':'Perfil'}, inplace = True)
-    df['ult_venda'] = pd.to_datetime(df['ult_venda'], format='%d/%M/%Y')
-    df['ult_tele'] = pd.to_datetime(df['ult_tele'], format='%Y/%M/%d')
     # df = format_numbers_br(df, ['elasticidade', 'vlr_compras', 'vlr_gasto_mes_atual', 'vlr_gasto_mes_passado', 'vergalhao', 'cd', 'arame', 'prego', 'estribo', 'coluna', 'tela_soldada', 'trelica', 'radier', 'bba', 'cercamento', 'perfil'])
     
     # if melhor_dia:
@@ -160,29 +210,26 @@ def transform_df_vendas(df, name, selectbox_vendedor, selectbox_telemarketing, s
         # lambda x: [int(dia) for dia in x.split(',')] if pd.notnull(x) else []
     # )
     
+    mask = pd.Series(True, index=df.index)
     if melhor_dia:
-    # Converte a coluna em listas de inteiros, ignorando valores None
-        df['dias_preferidos_cotar'] = df['dias_preferidos_cotar'].apply(
-        lambda x: [int(dia) for dia in x.split(',')] if pd.notnull(x) else []
-    )
-    # Filtra as linhas onde o dia atual está presente na lista de dias
-        df = df[df['dias_preferidos_cotar'].apply(lambda dias: hoje.day in dias)]
-        # st.write(df_filtrado.drop(columns='Dias para contato'))
-        # df = df[df['Dia Preferido para Contato'].contains()]
+    # Filtra as linhas onde o dia atual está presente na lista de dias, usando a máscara
+    # de bits montada na ingestão. O dia vem de quem chama (o mesmo do card da página inicial),
+    # e não da data de importação do módulo, que fica parada em um processo de longa duração
+        mask &= has_day(df['dias_cotar_mask'], day)
     
     
     if name != 'Gerência':
-        df = df[df['apelido'] == name.upper()]
+        mask &= df['apelido'] == name.upper()
         # df.drop(columns = ['apelido', 'cotacao_feita', 'telemarketing_feito', 'contactou_ou_nao', 'venda_feita', 'tempo_ultima_venda'], inplace = True)
     if name == 'Gerência':
-        if selectbox_vendedor:
-            df = df[df['apelido'] == selectbox_vendedor]
-        if selectbox_telemarketing:
-            df = df[df['telemarketing_feito'] == selectbox_telemarketing]
-        if selectbox_cotacao:
-            df = df[df['cotacao_feita'] == selectbox_cotacao]
-        if selectbox_venda:
-            df = df[df['venda_feita'] == selectbox_venda]
-    # else:
-        # pass
-    return df
+        mask &= manager_filter_mask(df, selectbox_vendedor, selectbox_telemarketing, selectbox_cotacao, selectbox_venda)
+    return filter_rows(df, mask).drop(columns=INTERNAL_COLUMNS, errors='ignore')
+
+
+# Porcentagem da carteira contactada, mostrada no Relatório de Contatos do vendedor
+# (os cards da página inicial usam as tabelas de summaries.py)
+def summary_contatos(df, name):
+    carteira = df['apelido'] == name.upper()
+    if not carteira.any():
+        return 0.0
+    return round((carteira & df['contato_feito']).sum() / carteira.sum() * 100, 2)